@@ -7,7 +7,7 @@ from airflow import DAG
 from data_pipeline.pipeline_manager import DataPipeline
 from utils.ELTL import OpenWeatherCurrentWeather
 
-pipeline = DataPipeline(OpenWeatherCurrentWeather())
+pipeline = DataPipeline(OpenWeatherCurrentWeather(), refresh_view=False)
 
 default_args = {
     'owner': 'airflow',
@@ -29,7 +29,12 @@ def scrape_weather_data_wrapper():
 
 def retrain_model_wrapper():
     from preparation.train_model import train_model
-    train_model()
+    train_model(mode='full')
+
+
+def warm_start_model_wrapper():
+    from preparation.train_model import train_model
+    train_model(mode='warm')
 
 
 def run_daily_weather_pipeline_wrapper():
@@ -47,14 +52,22 @@ def run_minutely_weather_pipeline_wrapper():
     run_weather_pipeline()
 
 
+def maintain_partitions_wrapper():
+    import os
+    from database.postgresql_functools import PostgresManager
+    retention_months = os.getenv('PARTITION_RETENTION_MONTHS')
+    PostgresManager().maintain_partitions(
+        months_ahead=int(os.getenv('PARTITION_MONTHS_AHEAD', '3')),
+        retention_months=int(retention_months) if retention_months else None)
+
+
 def extract_task():
     return pipeline.extract()
 
 
 def load_to_datalake_task(ti):
     data = ti.xcom_pull(task_ids='extract')
-    for data_dict in data:
-        pipeline.load_to_datalake(data_dict)
+    pipeline.load_to_datalake(data)
 
 
 def transform_task(ti):
@@ -104,13 +117,14 @@ with DAG(
     extract >> load_to_datalake >> transform >> load_to_data_warehouse
 
 
-# DAG for monthly model retraining
+# DAG for quarterly model retraining from scratch, dropping the trees added by the
+# monthly warm starts. It runs mid-month, away from the warm start writing the same model files.
 with DAG(
-        'monthly_model_retraining',
+        'quarterly_model_retraining',
         default_args=default_args,
-        description='A DAG to retrain the model',
-        schedule_interval='0 0 1 * *',
-) as dag_model_monthly:
+        description='A DAG to retrain the model from scratch',
+        schedule_interval='0 0 15 1,4,7,10 *',
+) as dag_model_quarterly:
     retrain_model_task = PythonOperator(
         task_id='retrain_model',
         python_callable=retrain_model_wrapper,
@@ -130,12 +144,12 @@ with DAG(
         python_callable=scrape_weather_data_wrapper,
     )
 
-    retrain_model_task = PythonOperator(
-        task_id='retrain_model',
-        python_callable=retrain_model_wrapper,
+    warm_start_model_task = PythonOperator(
+        task_id='warm_start_model',
+        python_callable=warm_start_model_wrapper,
     )
 
-    scrape_weather_data_task >> retrain_model_task
+    scrape_weather_data_task >> warm_start_model_task
 
 # DAG for hour pipeline runs
 with DAG(
@@ -178,3 +192,17 @@ with DAG(
     )
 
     run_minutely_weather_pipeline_task
+
+# DAG for partition maintenance
+with DAG(
+        'partition_maintenance',
+        default_args=default_args,
+        description='A DAG to create the coming partitions and archive the old ones',
+        schedule_interval='0 1 * * *',
+) as dag_partitions:
+    maintain_partitions_task = PythonOperator(
+        task_id='maintain_partitions',
+        python_callable=maintain_partitions_wrapper,
+    )
+
+    maintain_partitions_task
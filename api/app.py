@@ -1,23 +1,28 @@
 import base64
 import hashlib
 import os
-from datetime import datetime, timedelta
-from typing import Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, date as date_type
+from typing import Optional, List, Tuple, Dict
 
-import joblib
-import pandas as pd
 from dotenv import load_dotenv
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.wsgi import WSGIMiddleware
 from starlette.responses import PlainTextResponse
 
 from api.dash_app import dash_app
+from api.model_registry import ModelRegistry, ModelNotFoundError
+from data_pipeline.feature_store import FEATURE_EXPIRATION
 from database.mongodb_functools import MongoDBManager
-from database.postgresql_functools import PostgresManager, City, APIUsers
-from database.redis_functools import RedisManager
+from database.postgresql_async_functools import AsyncPostgresManager
+from database.postgresql_functools import City, APIUsers
+from database.redis_functools import AsyncRedisManager, RedisManager, CITIES_KEY, weather_key
+from utils.compact_model import CompactModel
+from utils.features import feature_key, features_from_record, features_frame
 
 load_dotenv()
 root_path = os.getenv('ROOT_PATH')
@@ -26,11 +31,32 @@ SECRET_KEY = os.getenv('API_SECRET_KEY')
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-app = FastAPI()
+# The ETL loads invalidate the cached entries they make stale, see CacheInvalidator
+CITIES_EXPIRATION = 7 * 86400
+WEATHER_EXPIRATION = 7 * 86400
+# Longest date range served by /weather, each day being a cache key
+MAX_WEATHER_DAYS = 366
 
-postgres_manager = PostgresManager()
+postgres_manager = AsyncPostgresManager()
 mongo_manager = MongoDBManager()
-redis_manager = RedisManager()
+redis_manager = AsyncRedisManager()
+# The registry checks the model version from its own thread-safe, synchronous client
+model_registry = ModelRegistry(RedisManager(), os.path.join(root_path or '', 'model'))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up the model registry so the first prediction does not pay the loading cost
+    try:
+        model_registry.refresh()
+    except Exception as e:
+        print(f"Model not loaded at startup: {e}")
+    yield
+    await postgres_manager.dispose()
+    await redis_manager.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 
@@ -45,6 +71,15 @@ class User(BaseModel):
     hashed_password: Optional[str] = None
 
 
+class PredictionItem(BaseModel):
+    city: str
+    date: str
+
+
+class BatchPredictionRequest(BaseModel):
+    items: List[PredictionItem]
+
+
 def verify_password(plain_password, hashed_password):
     hashed, salt = hashed_password.split(':')
     password_to_check = hashlib.sha512((plain_password + salt).encode('utf-8')).digest()
@@ -52,15 +87,16 @@ def verify_password(plain_password, hashed_password):
     return password_to_check == hashed
 
 
-def get_user(username: str) -> Optional[User]:
-    user = postgres_manager.fetch_record(APIUsers, {'username': username})
+async def get_user(username: str, session: AsyncSession) -> Optional[User]:
+    user = await postgres_manager.fetch_record(session, APIUsers, {'username': username})
     if user:
         return User(username=user.username, hashed_password=user.password)
     return None
 
 
-def authenticate_user(username: str, password: str) -> Optional[User]:
-    user = get_user(username)
+async def authenticate_user(username: str, password: str,
+                            session: AsyncSession) -> Optional[User]:
+    user = await get_user(username, session)
     if not user or not verify_password(password, user.hashed_password):
         return None
     return user
@@ -77,7 +113,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           session: AsyncSession = Depends(postgres_manager.get_session)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='Could not validate credentials',
@@ -88,7 +125,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         username: str = payload.get('sub')
         if username is None:
             raise credentials_exception
-        user = get_user(username)
+        user = await get_user(username, session)
         if user is None:
             raise credentials_exception
         return user
@@ -96,21 +133,105 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         raise credentials_exception
 
 
+def load_model() -> CompactModel:
+    """
+    Get the model from the in-process model registry.
+
+    :return: The compact model, predicting decoded labels.
+    :raise HTTPException: If the model file is not found.
+    """
+    try:
+        return model_registry.get()
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def get_weather_days(session: AsyncSession, city: str,
+                           days: List[date_type]) -> Dict[date_type, dict]:
+    """
+    Get the weather of a city on some days from the per-day Redis keys, reading
+    the missing days from the data warehouse with a single query over their span.
+    Days without data are cached as empty records so that they are not read again,
+    unless the whole span has no data, as for an unknown city.
+
+    :param session: Session of the request.
+    :param city: Name of the city.
+    :param days: Days of the weather data.
+    :return: Weather records by day, empty for the days without data.
+    """
+    keys = [weather_key(city, day) for day in days]
+
+    async def read() -> Dict[date_type, Optional[dict]]:
+        return dict(zip(days, await redis_manager.get_many(keys)))
+
+    async def lookup() -> Optional[Dict[date_type, dict]]:
+        cached = await read()
+        return cached if all(record is not None for record in cached.values()) else None
+
+    async def build() -> Dict[date_type, dict]:
+        cached = await read()
+        missing = [day for day, record in cached.items() if record is None]
+        rows = await postgres_manager.fetch_weather_data(session, city, min(missing), max(missing))
+        if not rows:
+            return {day: record or {} for day, record in cached.items()}
+        fetched = {min(missing) + timedelta(days=offset): {}
+                   for offset in range((max(missing) - min(missing)).days + 1)}
+        fetched.update({row.date: {
+            'date': row.date.isoformat(),
+            'max_temp': row.max_temp,
+            'min_temp': row.min_temp,
+            'rainfall': row.rainfall,
+            'humidity_9am': row.humidity_9am,
+            'humidity_3pm': row.humidity_3pm
+        } for row in rows})
+        await redis_manager.set_many({weather_key(city, day): record for day, record in fetched.items()},
+                                     expiration=WEATHER_EXPIRATION)
+        return {**cached, **fetched}
+
+    # A single request reads the missing days of a city at a time
+    return await redis_manager.single_flight(f"weather:{city}", lookup, build)
+
+
+async def get_features(session: AsyncSession,
+                       city_dates: List[Tuple[str, date_type]]) -> Dict[Tuple[str, date_type], dict]:
+    """
+    Get the feature vectors of (city, date) pairs from the Redis hashes of the
+    feature store, reading the missing ones from the weather_features table.
+
+    :param session: Session of the request.
+    :param city_dates: Pairs of city name and date.
+    :return: Feature vectors of the pairs found, by pair.
+    """
+    cached = await redis_manager.get_hashes([feature_key(city, day) for city, day in city_dates])
+    features = {city_date: vector for city_date, vector in zip(city_dates, cached) if vector}
+
+    missing = [city_date for city_date in city_dates if city_date not in features]
+    if missing:
+        rows = await postgres_manager.fetch_features(session, missing)
+        fetched = {(row.location, row.date): features_from_record(row) for row in rows}
+        await redis_manager.set_hashes({feature_key(city, day): vector
+                                        for (city, day), vector in fetched.items()},
+                                       expiration=FEATURE_EXPIRATION)
+        features.update(fetched)
+    return features
+
+
 @app.get('/health', response_class=PlainTextResponse)
 async def health_check():
     try:
         # Check database connection
-        assert postgres_manager.health_check()
+        assert await postgres_manager.health_check()
         assert mongo_manager.health_check()
-        assert redis_manager.health_check()
+        assert await redis_manager.health_check()
         return 'OK'
     except Exception:
         raise HTTPException(status_code=503, detail='Service Unavailable')
 
 
 @app.post('/token', response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),
+                                 session: AsyncSession = Depends(postgres_manager.get_session)):
+    user = await authenticate_user(form_data.username, form_data.password, session)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -125,123 +246,63 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 
 
 @app.get('/cities')
-async def get_cities():
-    # Try to get cities from Redis cache
-    cities_cache = redis_manager.get('all_cities')
-
-    if cities_cache:
-        return cities_cache
-
-    # If not in cache, fetch from database
-    cities = postgres_manager.fetch_table(City)
-    cities_data = [{'name': city.name, 'id': city.id} for city in cities]
-
-    # Cache the result in Redis
-    redis_manager.set('all_cities', cities_data, expiration=86400)
+async def get_cities(session: AsyncSession = Depends(postgres_manager.get_session)):
+    async def fetch_cities():
+        cities = await postgres_manager.fetch_table(session, City)
+        return [{'name': city.name, 'id': city.id} for city in cities]
 
-    return cities_data
+    # Get cities from Redis cache, a single request reads them from the database on a miss
+    return await redis_manager.get_or_set(CITIES_KEY, fetch_cities, expiration=CITIES_EXPIRATION)
 
 
 @app.get('/weather')
-async def get_weather(city: str, start_date: str, end_date: str):
+async def get_weather(city: str, start_date: str, end_date: str,
+                      session: AsyncSession = Depends(postgres_manager.get_session)):
     try:
         # Validate dates
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
         if start > end:
             raise ValueError('start_date must be before or equal to end_date')
+        if (end - start).days + 1 > MAX_WEATHER_DAYS:
+            raise ValueError(f"The date range must not exceed {MAX_WEATHER_DAYS} days")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    # Generate cache key
-    cache_key = f"weather:{city}:{start_date}:{end_date}"
-
-    # Try to get weather data from Redis cache
-    cached_weather = redis_manager.get(cache_key)
-
-    if cached_weather:
-        return cached_weather
-
-    # If not in cache, fetch from database
-    results = postgres_manager.fetch_weather_data(city, start_date, end_date)
-    weather_data = [{
-        'date': row.date,
-        'max_temp': row.max_temp,
-        'min_temp': row.min_temp,
-        'rainfall': row.rainfall,
-        'humidity_9am': row.humidity_9am,
-        'humidity_3pm': row.humidity_3pm
-    } for row in results]
+    # Assemble the range from the weather of each day, cached by day
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    weather = await get_weather_days(session, city, days)
+    weather_data = [weather[day] for day in days if weather[day]]
 
     if not weather_data:
         raise HTTPException(status_code=404,
                             detail=f"No weather data found for {city} between {start_date} and {end_date}")
 
-    # Cache the result in Redis
-    redis_manager.set(cache_key, weather_data, expiration=3600)
-
     return weather_data
 
 
 @app.get('/predict')
-async def predict_rain(date: str, city: str, current_user: User = Depends(get_current_user)):
+async def predict_rain(date: str, city: str, current_user: User = Depends(get_current_user),
+                       session: AsyncSession = Depends(postgres_manager.get_session)):
     try:
         # Validate date and get previous day
         try:
-            prediction_date = datetime.strptime(date, '%Y-%m-%d')
-            previous_day = (prediction_date - timedelta(days=1)).strftime('%Y-%m-%d')
+            prediction_date = datetime.strptime(date, '%Y-%m-%d').date()
+            previous_day = prediction_date - timedelta(days=1)
         except ValueError:
             raise HTTPException(status_code=400, detail='Invalid date format. Use YYYY-MM-DD.')
 
-        # Check if city exists
-        if not postgres_manager.fetch_record(City, {'name': city}):
-            raise HTTPException(status_code=404, detail=f"City '{city}' not found.")
-
-        # Try to get weather data from cache
-        cache_key = f"weather_data:{city}:{previous_day}"
-        weather_data = redis_manager.get(cache_key)
-
-        if not weather_data:
-            # If not in cache, fetch from database
-            result = postgres_manager.fetch_weather_data_for_city_and_date(city, previous_day)
-            weather_data_df = pd.DataFrame(
-                [{c.name: getattr(obj, c.name) for c in obj.__table__.columns} for obj in result])
-            if weather_data_df.empty:
-                raise HTTPException(status_code=404,
-                                    detail=f"No weather data found for {city} on {previous_day}.")
-
-            weather_data = weather_data_df.to_dict('records')[0]
-            redis_manager.set(cache_key, weather_data, expiration=3600)
-
-        # Prepare data for prediction
-        weather_data['rain_today'] = 'yes' if weather_data.get('rainfall', 0) >= 1 else 'no'
-        prediction_data = pd.DataFrame([weather_data])
-
-        # Get model and label encoder from cache or load from file
-        model = redis_manager.get_serializable_object('weather_prediction_model')
-        target_label_encoder = redis_manager.get_serializable_object('weather_label_encoder')
-
-        if model is None or target_label_encoder is None:
-            model_path = os.path.join(root_path, 'model', 'weather_prediction_model.joblib')
-            label_encoder_path = os.path.join(root_path, 'model', 'weather_label_encoder.joblib')
-            try:
-                if model is None:
-                    model = joblib.load(model_path)
-                    redis_manager.set_serializable_object('weather_prediction_model', model,
-                                                          expiration=86400)
-                if target_label_encoder is None:
-                    target_label_encoder = joblib.load(label_encoder_path)
-                    redis_manager.set_serializable_object('weather_label_encoder',
-                                                          target_label_encoder, expiration=86400)
-            except FileNotFoundError:
-                raise HTTPException(status_code=500,
-                                    detail='Model or label encoder file not found. Please ensure the model is trained.')
-
-        # Make prediction
-        prediction = model.predict(prediction_data)
-
-        # Decode prediction
-        decoded_prediction = target_label_encoder.inverse_transform(prediction)[0]
+        # Get the feature vector of the previous day from the feature store
+        features = (await get_features(session, [(city, previous_day)])).get((city, previous_day))
+        if features is None:
+            if not await postgres_manager.fetch_record(session, City, {'name': city}):
+                raise HTTPException(status_code=404, detail=f"City '{city}' not found.")
+            raise HTTPException(status_code=404,
+                                detail=f"No weather data found for {city} on {previous_day}.")
+        prediction_data = features_frame([features])
+
+        # Get the model from the model registry and make the prediction
+        decoded_prediction = load_model().predict(prediction_data)[0]
 
         return {
             'city': city,
@@ -255,4 +316,54 @@ async def predict_rain(date: str, city: str, current_user: User = Depends(get_cu
         raise HTTPException(status_code=500, detail=f'An unexpected error occurred: {str(e)}')
 
 
+@app.post('/predict/batch')
+async def predict_rain_batch(request: BatchPredictionRequest,
+                             current_user: User = Depends(get_current_user),
+                             session: AsyncSession = Depends(postgres_manager.get_session)):
+    try:
+        results: List[dict] = [{'city': item.city, 'date': item.date}
+                               for item in request.items]
+
+        # Validate dates and get previous days
+        previous_days = {}
+        for i, item in enumerate(request.items):
+            try:
+                prediction_date = datetime.strptime(item.date, '%Y-%m-%d').date()
+                previous_days[i] = prediction_date - timedelta(days=1)
+            except ValueError:
+                results[i]['error'] = 'Invalid date format. Use YYYY-MM-DD.'
+
+        # Get the feature vectors of every previous day at once from the feature store
+        city_dates = list({(request.items[i].city, day) for i, day in previous_days.items()})
+        features = await get_features(session, city_dates)
+
+        known_cities = set()
+        if len(features) < len(city_dates):
+            known_cities = {city.name for city in await postgres_manager.fetch_table(session, City)}
+        to_predict = []
+        for i, day in previous_days.items():
+            city = request.items[i].city
+            if (city, day) in features:
+                to_predict.append((i, features[(city, day)]))
+            elif city not in known_cities:
+                results[i]['error'] = f"City '{city}' not found."
+            else:
+                results[i]['error'] = f"No weather data found for {city} on {day}."
+
+        if to_predict:
+            # Build one feature matrix and run a single prediction over it
+            prediction_data = features_frame([vector for _, vector in to_predict])
+
+            predictions = load_model().predict(prediction_data)
+            for (i, _), prediction in zip(to_predict, predictions):
+                results[i]['rain_tomorrow'] = prediction
+
+        return {'results': results}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'An unexpected error occurred: {str(e)}')
+
+
 app.mount('/dashboard', WSGIMiddleware(dash_app.server))
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from database.redis_functools import RedisManager
+from utils.compact_model import CompactModel
+
+MODEL_KEY = 'weather_compact_model'
+
+
+class ModelNotFoundError(Exception):
+    """ Raised when the model has not been trained yet """
+
+
+class ModelRegistry:
+    """
+    In-process registry keeping the compact model in memory.
+
+    The registry checks at most every `check_interval` seconds whether a new model
+    was trained, using the version key written by `train_model.train_model` or the
+    modification time of the model file, and swaps the model at once.
+    """
+
+    def __init__(self, redis_manager: RedisManager, model_dir: str,
+                 check_interval: float = 5.0):
+        """
+        :param redis_manager: RedisManager holding the version of the model.
+        :param model_dir: Directory containing the compact artifact of the model.
+        :param check_interval: Minimum number of seconds between two version checks.
+        """
+        self.redis_manager = redis_manager
+        self.model_path = os.path.join(model_dir, f"{MODEL_KEY}.joblib")
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        # (model, version) swapped as a whole on reload
+        self._entry: Optional[Tuple[CompactModel, object]] = None
+
+    def get(self) -> CompactModel:
+        """
+        Get the current model, reloading it if a new version is available.
+
+        :return: The compact model, predicting decoded labels.
+        :raise ModelNotFoundError: If no model has been trained yet.
+        """
+        entry = self._entry
+        if entry is None or time.monotonic() - self._last_check >= self.check_interval:
+            entry = self.refresh()
+        return entry[0]
+
+    def refresh(self, force: bool = False) -> Tuple[CompactModel, object]:
+        """
+        Reload the model if its version changed.
+
+        :param force: Reload even if the version did not change.
+        :return: Tuple of the model and its version.
+        :raise ModelNotFoundError: If no model has been trained yet.
+        """
+        with self._lock:
+            version = self._current_version()
+            self._last_check = time.monotonic()
+            if not force and self._entry is not None and self._entry[1] == version:
+                return self._entry
+
+            try:
+                # The arrays are memory-mapped, only the pages read by predictions are loaded
+                model = CompactModel.load(self.model_path)
+            except FileNotFoundError:
+                raise ModelNotFoundError('Model file not found. Please ensure the model is trained.')
+            self._entry = (model, version)
+            return self._entry
+
+    def _current_version(self) -> object:
+        version = self.redis_manager.get(f"{MODEL_KEY}:version")
+        if version is not None:
+            return version
+        try:
+            return os.path.getmtime(self.model_path)
+        except OSError:
+            raise ModelNotFoundError('Model file not found. Please ensure the model is trained.')
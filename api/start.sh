@@ -3,5 +3,5 @@
 if [ "$API_DEBUG" = "true" ]; then
     exec uvicorn api.app:app --host "$API_HOST" --port "$API_PORT" --reload
 else
-    exec uvicorn api.app:app --host "$API_HOST" --port "$API_PORT"
+    exec uvicorn api.app:app --host "$API_HOST" --port "$API_PORT" --workers "${API_WORKERS:-1}"
 fi
@@ -0,0 +1,33 @@
+"""
+Benchmark of the BoM page parsers in pages per second.
+
+Usage:
+    python -m benchmarks.bench_bom_parser [fixtures_dir] [repeat]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+from preparation.data_from_web_scrapping import parse_page
+
+FIXTURES_DIR = Path(__file__).parents[1] / 'tests' / 'fixtures' / 'bom'
+
+
+def run_benchmark(fixtures_dir: str = str(FIXTURES_DIR), repeat: int = 200) -> None:
+    pages = [Path(fixtures_dir, name).read_bytes()
+             for name in sorted(os.listdir(fixtures_dir)) if name.endswith('.shtml')]
+
+    for parser in ['bs4', 'lxml']:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                parse_page(page, parser=parser)
+        duration = time.perf_counter() - start
+        print(f"{parser:>5}: {repeat * len(pages) / duration:.1f} pages/s")
+
+
+if __name__ == '__main__':
+    run_benchmark(sys.argv[1] if len(sys.argv) > 1 else str(FIXTURES_DIR),
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 200)
@@ -0,0 +1,107 @@
+"""
+Benchmark of the compact model artifact against the joblib pickle of the model
+pipeline: size on disk, load time and single-row prediction latency.
+
+The model files of the model directory are used when they exist, otherwise a
+model is fitted with the pipeline of train_model on synthetic feature vectors.
+
+Usage:
+    python -m benchmarks.bench_compact_model [model_dir] [rows]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from utils.compact_model import CompactModel, save_compact_model
+from utils.features import FEATURE_COLUMNS, CATEGORICAL_COLUMNS, features_frame
+
+DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+              'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+
+
+def make_features(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(20, 8, (rows, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    df['rainfall'] = rng.exponential(2, rows)
+    df.loc[rng.random(rows) < 0.1, 'humidity_3pm'] = np.nan
+    df['location'] = rng.choice(['Canberra', 'Sydney', 'Darwin', 'Melbourne', 'Brisbane City'], rows)
+    for column in CATEGORICAL_COLUMNS:
+        if column.startswith('wind'):
+            df[column] = rng.choice(DIRECTIONS, rows)
+    df['rain_today'] = np.where(df['rainfall'] >= 1, 'yes', 'no')
+    return df
+
+
+def fit_model(rows: int):
+    from sklearn.preprocessing import LabelEncoder
+    from preparation.train_model import create_preprocessor, create_model_pipeline, get_column_types
+
+    X = make_features(rows)
+    y = np.where(X['humidity_3pm'].fillna(50) + X['rainfall'] * 5 > 45, 'yes', 'no')
+    label_encoder = LabelEncoder()
+    pipeline = create_model_pipeline(create_preprocessor(*get_column_types(X)))
+    pipeline.fit(X, label_encoder.fit_transform(y))
+    pipeline.set_params(classifier__n_jobs=None)
+    return pipeline, label_encoder
+
+
+def time_ms(function, repeat: int) -> list:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def run_benchmark(model_dir: str = None, rows: int = 50000) -> None:
+    model_path = os.path.join(model_dir or '', 'weather_prediction_model.joblib')
+    label_path = os.path.join(model_dir or '', 'weather_label_encoder.joblib')
+    if model_dir and os.path.exists(model_path) and os.path.exists(label_path):
+        pipeline, label_encoder = joblib.load(model_path), joblib.load(label_path)
+    else:
+        print(f"Fitting a model on {rows} synthetic rows")
+        pipeline, label_encoder = fit_model(rows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, 'pipeline.joblib')
+        compact_path = os.path.join(directory, 'compact.joblib')
+        joblib.dump((pipeline, label_encoder), pickle_path)
+        save_compact_model(pipeline, label_encoder, compact_path)
+        print(f"{pipeline.named_steps['classifier'].n_estimators} trees, "
+              f"{sum(tree.tree_.node_count for tree in pipeline.named_steps['classifier'].estimators_)} nodes")
+        print(f"size: pickle {os.path.getsize(pickle_path) / 1e6:.1f} MB, "
+              f"compact {os.path.getsize(compact_path) / 1e6:.1f} MB")
+
+        pickle_load = time_ms(lambda: joblib.load(pickle_path), 5)
+        compact_load = time_ms(lambda: CompactModel.load(compact_path), 5)
+        print(f"load: pickle {statistics.median(pickle_load):.1f} ms, "
+              f"compact (memory-mapped) {statistics.median(compact_load):.1f} ms")
+
+        compact = CompactModel.load(compact_path)
+        features = make_features(200)
+        records = features.to_dict('records')
+        agreement = np.mean(label_encoder.inverse_transform(pipeline.predict(features))
+                            == compact.predict(features))
+        print(f"agreement of the predictions: {agreement:.1%}")
+
+        rows_iter = iter(records * 10)
+        pickle_latency = time_ms(lambda: label_encoder.inverse_transform(
+            pipeline.predict(features_frame([next(rows_iter)]))), 200)
+        rows_iter = iter(records * 10)
+        compact_latency = time_ms(lambda: compact.predict(features_frame([next(rows_iter)])), 200)
+        for name, latencies in (('pickle ', pickle_latency), ('compact', compact_latency)):
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"single-row prediction, {name}: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+
+if __name__ == '__main__':
+    run_benchmark(sys.argv[1] if len(sys.argv) > 1 else None,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
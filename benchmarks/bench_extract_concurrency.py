@@ -0,0 +1,95 @@
+"""
+Benchmark of the concurrent OpenWeather extraction against a local stub HTTP server.
+
+The stub server runs in a separate process and answers every request after a
+fixed delay to simulate the API round trip. Wall-clock time of the sequential
+extraction grows with the number of cities, while the concurrent extraction
+stays flat as long as the number of workers follows the number of cities and
+the CPU cost of each request on the client stays small compared to its latency.
+The requests go through an HTTP client without rate limit, the rate limit of the
+shared OpenWeather client would otherwise bound both extractions, and bypass the
+response cache, which would otherwise serve the concurrent extraction.
+
+Usage:
+    python -m benchmarks.bench_extract_concurrency
+"""
+
+import asyncio
+import json
+import multiprocessing
+import time
+from typing import List
+
+from utils.http_client import HttpClient
+from utils.openweather_functools import request_api, request_api_concurrently
+
+RESPONSE_DELAY = 0.2
+CITY_COUNTS = [5, 50, 100, 250, 500]
+
+
+async def handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    request_line = await reader.readline()
+    await reader.readuntil(b'\r\n\r\n')
+    await asyncio.sleep(RESPONSE_DELAY)
+
+    path = request_line.split()[1].decode('utf-8')
+    body = json.dumps({'path': path}).encode('utf-8')
+    writer.write(b'HTTP/1.1 200 OK\r\n'
+                 b'Content-Type: application/json\r\n'
+                 b'Connection: close\r\n'
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode('utf-8')
+                 + body)
+    await writer.drain()
+    writer.close()
+
+
+def serve(port_queue: multiprocessing.Queue) -> None:
+    async def main():
+        server = await asyncio.start_server(handle_request, '127.0.0.1', 0, backlog=2048)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def build_urls(port: int, n_cities: int) -> List[str]:
+    return [f"http://127.0.0.1:{port}/data/2.5/weather?lat={i}&lon={i}"
+            for i in range(n_cities)]
+
+
+def run_benchmark(sequential_limit: int = 5) -> None:
+    # Run the stub server in its own process so it does not share the GIL with the client
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue,), daemon=True)
+    server.start()
+    port = port_queue.get()
+
+    client = HttpClient(pool_maxsize=max(CITY_COUNTS))
+
+    print(f"{'cities':>8} {'sequential (s)':>16} {'concurrent (s)':>16}")
+    try:
+        for n_cities in CITY_COUNTS:
+            urls = build_urls(port, n_cities)
+
+            sequential = '-'
+            if n_cities <= sequential_limit:
+                start = time.perf_counter()
+                [request_api(url, use_cache=False, client=client) for url in urls]
+                sequential = f"{time.perf_counter() - start:.3f}"
+
+            start = time.perf_counter()
+            results = request_api_concurrently(urls, max_workers=n_cities,
+                                               use_cache=False, client=client)
+            concurrent = time.perf_counter() - start
+
+            # Results must come back in the same order as the requested URLs
+            assert [result['path'] for result in results] == \
+                   [url.split(str(port))[1] for url in urls]
+            print(f"{n_cities:>8} {sequential:>16} {concurrent:>16.3f}")
+    finally:
+        client.close()
+        server.terminate()
+
+
+if __name__ == '__main__':
+    run_benchmark()
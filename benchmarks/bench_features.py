@@ -0,0 +1,68 @@
+"""
+Benchmark of the feature building on a synthetic frame of weather data, against
+the former row-wise implementation of train_model.preprocess_data.
+
+The former implementation relied on the rows being read ordered by location and
+date, build_features sorts them itself and is also timed on shuffled rows.
+
+Usage:
+    python -m benchmarks.bench_features [rows] [cities]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.features import build_features
+
+
+def legacy_build_features(df: pd.DataFrame) -> pd.DataFrame:
+    df['rain_today'] = df['rainfall'].apply(lambda x: 'yes' if x >= 1 else 'no')
+    df['rain_tomorrow'] = df['rain_today'].shift(-1).apply(lambda x: 'yes' if x == 'yes' else 'no')
+    df = df.dropna(subset=['rain_today', 'rain_tomorrow'])
+    return df
+
+
+def make_weather(rows: int, cities: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    days = rows // cities
+    df = pd.DataFrame({
+        'location': np.repeat([f"City {i}" for i in range(cities)], days),
+        'date': np.tile(pd.date_range('1970-01-01', periods=days).date, cities),
+        'rainfall': np.where(rng.random(days * cities) < 0.05, np.nan,
+                             rng.exponential(2, days * cities)),
+    })
+    return df.sample(frac=1, random_state=0, ignore_index=True)
+
+
+def time_it(function, df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    function(df.copy())
+    return time.perf_counter() - start
+
+
+def run_benchmark(rows: int = 1_000_000, cities: int = 50) -> None:
+    df = make_weather(rows, cities)
+    print(f"{len(df)} rows, {cities} cities")
+
+    ordered = df.sort_values(['location', 'date'], ignore_index=True)
+    legacy = time_it(legacy_build_features, ordered)
+    vectorized = time_it(build_features, ordered)
+    shuffled = time_it(build_features, df)
+    print(f"row-wise apply, ordered rows : {legacy:.2f} s")
+    print(f"vectorized, ordered rows     : {vectorized:.2f} s ({legacy / vectorized:.1f}x)")
+    print(f"vectorized, shuffled rows    : {shuffled:.2f} s")
+
+    features = build_features(df)
+    print(f"memory of the rain columns: "
+          f"{features[['rain_today', 'rain_tomorrow']].memory_usage(deep=True).sum() / 1e6:.1f} MB "
+          f"as categoricals, "
+          f"{features[['rain_today', 'rain_tomorrow']].astype(object).memory_usage(deep=True).sum() / 1e6:.1f} MB "
+          f"as strings")
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 50)
@@ -0,0 +1,135 @@
+"""
+Benchmark of the ingestion of weatherAUS.csv: the columnar read of load_kaggle
+against the former read with pandas type inference and chained copies, then,
+with --load, COPY against the former to_sql into a scratch copy of the weather table.
+
+Each reader runs in its own process to measure its peak memory, read from /proc
+on Linux. A synthetic CSV of the size of the Kaggle dataset is generated when no
+path is given. Loading requires a database configured through the PG_* environment variables.
+
+Usage:
+    python -m benchmarks.bench_kaggle_ingestion [csv_path] [--load]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from preparation.data_from_kaggle import KAGGLE_COLUMNS, load_kaggle
+
+LOCATIONS = ['Canberra', 'Sydney', 'Darwin', 'Melbourne', 'Brisbane City']
+DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+              'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+
+
+def legacy_load_kaggle(locations, path):
+    return pd.read_csv(os.path.join(path, 'data', 'csv', 'weatherAUS.csv')) \
+        .drop(columns=['RainToday', 'RainTomorrow']) \
+        .rename(columns={column: name for column, (_, name) in KAGGLE_COLUMNS.items()}) \
+        .loc[lambda x: x['location'].isin(locations)] \
+        .replace('Brisbane', 'Brisbane City') \
+        .replace('NA', np.nan)
+
+
+def make_csv(path: str, rows: int = 145460, locations: int = 49) -> None:
+    rng = np.random.default_rng(0)
+    names = ['Brisbane'] + LOCATIONS[:-1] + [f"Location{i}" for i in range(locations - len(LOCATIONS))]
+    df = pd.DataFrame({'Date': np.tile(pd.date_range('2008-12-01', periods=rows // locations + 1)
+                                       .strftime('%Y-%m-%d'), locations)[:rows],
+                       'Location': np.repeat(names, rows // locations + 1)[:rows]})
+    for column, (column_type, _) in KAGGLE_COLUMNS.items():
+        if column in df:
+            continue
+        values = rng.choice(DIRECTIONS, rows) if str(column_type) == 'string' \
+            else rng.normal(20, 8, rows).round(1)
+        df[column] = np.where(rng.random(rows) < 0.1, 'NA', values.astype(str))
+    df['RainToday'] = np.where(df['Rainfall'].replace('NA', '0').astype(float) >= 1, 'Yes', 'No')
+    df['RainTomorrow'] = df['RainToday'].shift(-1, fill_value='No')
+    df.to_csv(os.path.join(path, 'data', 'csv', 'weatherAUS.csv'), index=False)
+
+
+def memory_status(field: str) -> float:
+    """ Memory of the process in MB from /proc, VmRSS for the current one, VmHWM for the peak """
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field)) / 1024
+
+
+def measure(reader, path, results) -> None:
+    # Reset the peak memory of the process, raised by the imports
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    baseline = memory_status('VmRSS')
+    start = time.perf_counter()
+    df = reader(LOCATIONS if reader is load_kaggle else LOCATIONS[:-1] + ['Brisbane'], path)
+    results.put((len(df), time.perf_counter() - start, memory_status('VmHWM') - baseline,
+                 df.memory_usage(deep=True).sum() / 1e6))
+
+
+def run_reader(reader, path):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=measure, args=(reader, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def run_load(path: str) -> None:
+    from dotenv import load_dotenv
+    from sqlalchemy import text
+    from database.postgresql_functools import PostgresManager, City
+    from utils.df_to_kaggle_format import transform_to_kaggle_format
+
+    load_dotenv()
+    postgres = PostgresManager()
+    df = load_kaggle(LOCATIONS, path)
+    # Resolve the locations against the cities of the database, whatever their IDs
+    cities = postgres.fetch_table(City)
+    df = df[df['location'].isin([city.name for city in cities])]
+    _, weather_9am, _ = transform_to_kaggle_format(df, postgres)
+
+    for name, load in (('to_sql', lambda: weather_9am.to_sql('bench_kaggle_weather', postgres.engine,
+                                                            if_exists='append', index=False)),
+                       ('COPY  ', lambda: postgres.copy_dataframe(weather_9am, 'bench_kaggle_weather'))):
+        with postgres.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS bench_kaggle_weather"))
+            connection.execute(text("CREATE TABLE bench_kaggle_weather "
+                                    "(LIKE weather INCLUDING DEFAULTS)"))
+        start = time.perf_counter()
+        load()
+        print(f"load of {len(weather_9am)} weather rows, {name}: {time.perf_counter() - start:.2f} s")
+    with postgres.engine.begin() as connection:
+        connection.execute(text("DROP TABLE bench_kaggle_weather"))
+
+
+def run_benchmark(csv_path: str = None, load: bool = False) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        if csv_path is None:
+            os.makedirs(os.path.join(directory, 'data', 'csv'))
+            make_csv(directory)
+            path = directory
+        else:
+            path = tempfile.mkdtemp(dir=directory)
+            os.makedirs(os.path.join(path, 'data', 'csv'))
+            os.symlink(os.path.abspath(csv_path), os.path.join(path, 'data', 'csv', 'weatherAUS.csv'))
+        size = os.path.getsize(os.path.join(path, 'data', 'csv', 'weatherAUS.csv'))
+        print(f"CSV of {size / 1e6:.1f} MB")
+
+        for name, reader in (('pandas inference', legacy_load_kaggle), ('columnar pyarrow', load_kaggle)):
+            rows, seconds, peak, frame = run_reader(reader, path)
+            print(f"read, {name}: {rows} rows in {seconds:.2f} s, "
+                  f"peak memory +{peak:.0f} MB, frame {frame:.1f} MB")
+
+        if load:
+            run_load(path)
+
+
+if __name__ == '__main__':
+    arguments = [argument for argument in sys.argv[1:] if argument != '--load']
+    run_benchmark(arguments[0] if arguments else None, '--load' in sys.argv[1:])
@@ -0,0 +1,51 @@
+"""
+Benchmark of the batch prediction endpoint against N single prediction calls.
+
+Requires a running API, configured through API_HOST, API_PORT, API_USER and
+API_PASSWORD as for the integration tests.
+
+Usage:
+    python -m benchmarks.bench_predict_batch [days]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from utils.api_endpoints import get_token, get_data, post_data
+
+
+def run_benchmark(days: int = 30) -> None:
+    load_dotenv()
+    base_url = f"http://{os.getenv('API_HOST')}:{os.getenv('API_PORT')}"
+    token = get_token(base_url, os.getenv('API_USER'), os.getenv('API_PASSWORD'))
+
+    cities = [city['name'] for city in get_data(base_url, 'cities', token, {})]
+    today = datetime.now()
+    items = [{'city': city, 'date': (today - timedelta(days=day)).strftime('%Y-%m-%d')}
+             for city in cities for day in range(days)]
+
+    start = time.perf_counter()
+    for item in items:
+        try:
+            get_data(base_url, 'predict', token, item)
+        except Exception:
+            # Missing weather data is part of the workload of both modes
+            pass
+    single_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = post_data(base_url, 'predict/batch', token, {'items': items})['results']
+    batch_duration = time.perf_counter() - start
+
+    predicted = sum('rain_tomorrow' in result for result in results)
+    print(f"{len(items)} predictions ({predicted} with weather data)")
+    print(f"single calls: {single_duration:.3f} s ({len(items) / single_duration:.1f} predictions/s)")
+    print(f"batch call:   {batch_duration:.3f} s ({len(items) / batch_duration:.1f} predictions/s)")
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
@@ -0,0 +1,44 @@
+"""
+Benchmark of the /predict latency percentiles.
+
+Requires a running API, configured through API_HOST, API_PORT, API_USER and
+API_PASSWORD as for the integration tests. Run it before and after a change
+of the prediction path to compare p50 and p99.
+
+Usage:
+    python -m benchmarks.bench_predict_latency [requests] [city]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.api_endpoints import get_token, get_data
+
+
+def run_benchmark(n_requests: int = 200, city: str = 'Brisbane City') -> None:
+    load_dotenv()
+    base_url = f"http://{os.getenv('API_HOST')}:{os.getenv('API_PORT')}"
+    token = get_token(base_url, os.getenv('API_USER'), os.getenv('API_PASSWORD'))
+    params = {'city': city, 'date': datetime.now().strftime('%Y-%m-%d')}
+
+    # Warm up the feature store cache so only the prediction path is measured
+    get_data(base_url, 'predict', token, params)
+
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        get_data(base_url, 'predict', token, params)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{n_requests} requests: p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+                  sys.argv[2] if len(sys.argv) > 2 else 'Brisbane City')
@@ -0,0 +1,82 @@
+"""
+Benchmark of the BoM scraper over a local directory of saved HTML pages.
+
+The directory is served by a local HTTP server, and every page is requested
+several times, to compare the sequential fetch, parse and concat loop with
+the concurrent fetch stage and the process pool parse stage.
+
+Usage:
+    python -m benchmarks.bench_scraper [fixtures_dir] [copies]
+"""
+
+import functools
+import multiprocessing
+import os
+import sys
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+
+from preparation import data_from_web_scrapping
+from preparation.data_from_web_scrapping import aggregate_weather_data, fetch_page_content, \
+    parse_html_content
+from utils.http_client import HttpClient
+
+FIXTURES_DIR = Path(__file__).parents[1] / 'tests' / 'fixtures' / 'bom'
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory: str, port_queue: multiprocessing.Queue) -> None:
+    server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                 functools.partial(QuietHandler, directory=directory))
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def sequential_aggregate(urls):
+    aggregated_df = pd.DataFrame()
+    for url in urls:
+        soup = fetch_page_content(url)
+        if soup:
+            aggregated_df = pd.concat([aggregated_df, parse_html_content(soup)],
+                                      ignore_index=True)
+    return aggregated_df
+
+
+def run_benchmark(fixtures_dir: str = str(FIXTURES_DIR), copies: int = 50) -> None:
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(fixtures_dir, port_queue), daemon=True)
+    server.start()
+    port = port_queue.get()
+
+    pages = sorted(name for name in os.listdir(fixtures_dir) if name.endswith('.shtml'))
+    urls = [f"http://127.0.0.1:{port}/{page}?copy={i}" for page in pages for i in range(copies)]
+
+    # Lift the rate limit of the shared BoM client, both stages run unthrottled
+    data_from_web_scrapping.bom_client = HttpClient()
+    try:
+        start = time.perf_counter()
+        sequential_df = sequential_aggregate(urls)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parallel_df = aggregate_weather_data(urls, requests_per_second=1000)
+        parallel = time.perf_counter() - start
+    finally:
+        server.terminate()
+
+    assert sequential_df.equals(parallel_df)
+    print(f"{len(urls)} pages, {len(parallel_df)} rows")
+    print(f"sequential: {sequential:.3f} s ({len(urls) / sequential:.1f} pages/s)")
+    print(f"parallel:   {parallel:.3f} s ({len(urls) / parallel:.1f} pages/s)")
+
+
+if __name__ == '__main__':
+    run_benchmark(sys.argv[1] if len(sys.argv) > 1 else str(FIXTURES_DIR),
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 50)
@@ -0,0 +1,104 @@
+"""
+Benchmark of range scans by city and date on the australian_meteorology_weather
+materialized view, against the former plain view joining on TO_CHAR and
+DATE_TRUNC expressions.
+
+The former view is recreated as a temporary view of the benchmark session.
+Requires a populated database, configured through the PG_* environment variables.
+
+Usage:
+    python -m benchmarks.bench_weather_view [queries] [days]
+"""
+
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database.postgresql_functools import PostgresManager
+
+LEGACY_VIEW = """
+CREATE TEMPORARY VIEW legacy_australian_meteorology_weather AS
+SELECT dw.id,
+       TO_CHAR(dw.date, 'YYYY-MM-DD') AS date,
+       c.name                         AS location,
+       dw.min_temp, dw.max_temp, dw.rainfall, dw.evaporation, dw.sunshine,
+       dw.wind_gust_dir, dw.wind_gust_speed,
+       w9.temp AS temp_9am, w9.humidity AS humidity_9am, w9.cloud AS cloud_9am,
+       w9.wind_dir AS wind_dir_9am, w9.wind_speed AS wind_speed_9am, w9.pressure AS pressure_9am,
+       w3.temp AS temp_3pm, w3.humidity AS humidity_3pm, w3.cloud AS cloud_3pm,
+       w3.wind_dir AS wind_dir_3pm, w3.wind_speed AS wind_speed_3pm, w3.pressure AS pressure_3pm
+FROM daily_weather dw
+         JOIN city c ON dw.city_id = c.id
+         LEFT JOIN weather w9 ON dw.city_id = w9.city_id
+    AND DATE_TRUNC('day', w9.date) = DATE_TRUNC('day', dw.date)
+    AND EXTRACT(HOUR FROM w9.date) = 9
+         LEFT JOIN weather w3 ON dw.city_id = w3.city_id
+    AND DATE_TRUNC('day', w3.date) = DATE_TRUNC('day', dw.date)
+    AND EXTRACT(HOUR FROM w3.date) = 15
+ORDER BY location, date
+"""
+
+RANGE_QUERY = ("SELECT * FROM {view} WHERE location = :city "
+               "AND date BETWEEN :start_date AND :end_date ORDER BY date")
+
+
+def time_queries(connection, view: str, workload) -> list:
+    durations = []
+    for city, start_date, end_date in workload:
+        start = time.perf_counter()
+        connection.execute(text(RANGE_QUERY.format(view=view)),
+                           {'city': city, 'start_date': start_date,
+                            'end_date': end_date}).fetchall()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def report(name: str, durations: list) -> None:
+    quantiles = statistics.quantiles(durations, n=100)
+    print(f"{name}: mean {statistics.mean(durations):.2f} ms, "
+          f"p50 {quantiles[49]:.2f} ms, p95 {quantiles[94]:.2f} ms")
+
+
+def run_benchmark(queries: int = 200, days: int = 30) -> None:
+    load_dotenv()
+    postgres = PostgresManager()
+    random.seed(0)
+
+    with postgres.engine.connect() as connection:
+        cities = connection.execute(
+            text('SELECT DISTINCT location FROM australian_meteorology_weather')).scalars().all()
+        first_date, last_date = connection.execute(
+            text('SELECT MIN(date), MAX(date) FROM australian_meteorology_weather')).one()
+        if not cities:
+            raise SystemExit('The australian_meteorology_weather view is empty')
+
+        span = max((last_date - first_date).days - days, 0)
+        workload = []
+        for _ in range(queries):
+            start_date = first_date + timedelta(days=random.randint(0, span))
+            workload.append((random.choice(cities), start_date, start_date + timedelta(days=days)))
+        legacy_workload = [(city, start_date.isoformat(), end_date.isoformat())
+                           for city, start_date, end_date in workload]
+
+        connection.execute(text(LEGACY_VIEW))
+        rows = connection.execute(text('SELECT COUNT(*) FROM australian_meteorology_weather')).scalar()
+        print(f"{rows} rows, {len(cities)} cities, {queries} range scans of {days} days")
+        report('plain view       ', time_queries(connection, 'legacy_australian_meteorology_weather',
+                                                 legacy_workload))
+        report('materialized view', time_queries(connection, 'australian_meteorology_weather',
+                                                 workload))
+        connection.rollback()
+
+    start = time.perf_counter()
+    postgres.refresh_weather_view()
+    print(f"concurrent refresh: {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 30)
@@ -0,0 +1,63 @@
+"""
+Load test of the API measuring the throughput of concurrent requests.
+
+Requires a running API, configured through API_HOST, API_PORT, API_USER and
+API_PASSWORD as for the integration tests. Restart the API with different
+values of API_WORKERS to compare how throughput scales with the number of
+uvicorn workers.
+
+Usage:
+    python -m benchmarks.load_test_api [requests] [endpoint]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from dotenv import load_dotenv
+
+from utils.api_endpoints import get_token
+
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32, 64]
+
+
+def run_load_test(n_requests: int = 500, endpoint: str = 'predict') -> None:
+    load_dotenv()
+    base_url = f"http://{os.getenv('API_HOST')}:{os.getenv('API_PORT')}"
+    token = get_token(base_url, os.getenv('API_USER'), os.getenv('API_PASSWORD'))
+    headers = {'Authorization': f"Bearer {token}"}
+
+    today = datetime.now()
+    params = {
+        'predict': {'city': 'Brisbane City', 'date': today.strftime('%Y-%m-%d')},
+        'weather': {'city': 'Brisbane City',
+                    'start_date': (today - timedelta(days=30)).strftime('%Y-%m-%d'),
+                    'end_date': today.strftime('%Y-%m-%d')},
+        'cities': {},
+    }[endpoint]
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(CONCURRENCY_LEVELS))
+    session.mount('http://', adapter)
+
+    def call(_):
+        return session.get(f"{base_url}/{endpoint}", headers=headers, params=params,
+                           timeout=30).status_code
+
+    print(f"workers: {os.getenv('API_WORKERS', '1')}, endpoint: /{endpoint}")
+    print(f"{'concurrency':>12} {'requests/s':>12} {'errors':>8}")
+    for concurrency in CONCURRENCY_LEVELS:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            status_codes = list(executor.map(call, range(n_requests)))
+            duration = time.perf_counter() - start
+        errors = sum(code != 200 for code in status_codes)
+        print(f"{concurrency:>12} {n_requests / duration:>12.1f} {errors:>8}")
+
+
+if __name__ == '__main__':
+    run_load_test(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+                  sys.argv[2] if len(sys.argv) > 2 else 'predict')
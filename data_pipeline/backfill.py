@@ -0,0 +1,258 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from data_pipeline.cache_invalidation import CacheInvalidator, LoadedRanges
+from data_pipeline.feature_store import FeatureStore
+from data_pipeline.pipeline_manager import WEATHER_VIEW_SOURCES
+from database.postgresql_functools import BackfillCheckpoint, month_ranges, next_month
+from utils.ELTL import OpenWeatherByCities, OpenWeatherDailyWeather, \
+    OpenWeatherTimestampWeather, OpenWeatherDailyAirPollution
+from utils.openweather_functools import request_api, get_response_cache
+
+logger = logging.getLogger(__name__)
+
+
+def date_to_timestamp(date_str: str, hour: int = 0) -> int:
+    """
+    Converts a date to the UNIX timestamp of the given hour of that day.
+
+    :param date_str: Date in the format 'YYYY-MM-DD'.
+    :param hour: Hour of the day.
+    :return: UNIX timestamp.
+    """
+    return int(datetime.strptime(date_str, '%Y-%m-%d').replace(hour=hour).timestamp())
+
+
+class WorkUnit(NamedTuple):
+    endpoint: str
+    date: str
+    latitude: float
+    longitude: float
+    # Day after the last date of the unit, for the endpoints serving ranges
+    end: Optional[str] = None
+
+
+class BackfillMetrics:
+    """ Progress and throughput of a backfill run """
+
+    def __init__(self):
+        self.total = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.rows_loaded = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """ Completed work units per second """
+        return self.completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'total': self.total,
+            'skipped': self.skipped,
+            'completed': self.completed,
+            'failed': self.failed,
+            'remaining': self.total - self.skipped - self.completed - self.failed,
+            'rows_loaded': self.rows_loaded,
+            'elapsed_seconds': round(self.elapsed, 1),
+            'units_per_second': round(self.throughput, 2),
+        }
+
+
+class BackfillEngine:
+    """
+    Resumable backfill of historical OpenWeather data.
+
+    The date range is split into work units per (endpoint, date, city). Units are
+    fetched concurrently through the rate-limited OpenWeather client, then loaded in batches
+    from the calling thread together with their checkpoint, in a single transaction,
+    so that a crashed run resumes where it stopped. Managers and their connections
+    are created once and reused for every unit.
+    """
+
+    # Endpoints of a unit and the parameters of their request for a given unit.
+    # Air pollution units cover the part of a month within the backfilled range,
+    # as the history endpoint serves ranges.
+    ENDPOINTS = {
+        'daily_weather': lambda unit: {'date': unit.date},
+        'weather_9am': lambda unit: {'dt': date_to_timestamp(unit.date, hour=9)},
+        'weather_3pm': lambda unit: {'dt': date_to_timestamp(unit.date, hour=15)},
+        'air_pollution': lambda unit: {'start': date_to_timestamp(unit.date),
+                                       'end': date_to_timestamp(unit.end)},
+    }
+    RANGE_ENDPOINTS = ('air_pollution',)
+
+    def __init__(self, max_workers: int = 8, batch_size: int = 100, log_every: int = 100):
+        """
+        :param max_workers: Maximum number of requests in flight at the same time.
+        :param batch_size: Number of completed units loaded in each transaction.
+        :param log_every: Number of completed units between two progress logs.
+        """
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.log_every = log_every
+        self.metrics = BackfillMetrics()
+        self.loaded = LoadedRanges()
+
+        self.managers: Dict[str, OpenWeatherByCities] = {
+            'daily_weather': OpenWeatherDailyWeather(date=''),
+            'weather_9am': OpenWeatherTimestampWeather(timestamp=0),
+            'weather_3pm': OpenWeatherTimestampWeather(timestamp=0),
+            'air_pollution': OpenWeatherDailyAirPollution(start=0, end=0),
+        }
+        reference_manager = self.managers['daily_weather']
+        self.cities: List[Tuple[float, float]] = list(zip(reference_manager.latitudes,
+                                                          reference_manager.longitudes))
+        self.postgres = reference_manager.data_warehouse_manager
+        BackfillCheckpoint.__table__.create(self.postgres.engine, checkfirst=True)
+
+    def plan(self, start_date: str, end_date: str,
+             endpoints: Optional[List[str]] = None) -> List[WorkUnit]:
+        """
+        Splits a date range into the work units not completed yet.
+
+        :param start_date: First date of the range (YYYY-MM-DD).
+        :param end_date: Last date of the range (YYYY-MM-DD).
+        :param endpoints: Endpoints to backfill, defaults to all of them.
+        :return: The pending work units.
+        """
+        endpoints = endpoints or list(self.ENDPOINTS)
+        days = [(day, None)
+                for day in pd.date_range(start_date, end_date, freq='D').strftime('%Y-%m-%d')]
+        months = month_ranges(start_date, end_date)
+
+        completed = {
+            (checkpoint.endpoint, checkpoint.date.strftime('%Y-%m-%d'),
+             checkpoint.latitude, checkpoint.longitude)
+            for checkpoint in self.postgres.fetch_table(BackfillCheckpoint)
+        }
+        units = [WorkUnit(endpoint, date, latitude, longitude, end)
+                 for endpoint in endpoints
+                 for date, end in (months if endpoint in self.RANGE_ENDPOINTS else days)
+                 for latitude, longitude in self.cities]
+        pending = [unit for unit in units if unit[:4] not in completed]
+
+        self.metrics.total += len(units)
+        self.metrics.skipped += len(units) - len(pending)
+        return pending
+
+    def fetch(self, unit: WorkUnit) -> Dict:
+        """
+        Requests the raw data of a work unit.
+
+        :param unit: The work unit to fetch.
+        :return: The raw data of the unit.
+        """
+        manager = self.managers[unit.endpoint]
+        params = {'lat': unit.latitude, 'lon': unit.longitude,
+                  **self.ENDPOINTS[unit.endpoint](unit)}
+        return request_api(manager.url_builder(params), timeout=manager.request_timeout)
+
+    def load(self, results: List[Tuple[WorkUnit, Dict]]) -> None:
+        """
+        Loads fetched work units to the datalake and the data warehouse, and records
+        their checkpoints in the same data warehouse transaction.
+
+        :param results: The work units and their raw data.
+        """
+        loaded_rows = []
+        try:
+            for endpoint, manager in self.managers.items():
+                raw_data = [data for unit, data in results if unit.endpoint == endpoint]
+                if not raw_data:
+                    continue
+                manager.load_batch_to_datalake(raw_data)
+
+                rows = []
+                for data in raw_data:
+                    transformed = manager.transform_data(data)
+                    rows.extend(transformed if isinstance(transformed, list) else [transformed])
+                manager.load_batch_to_data_warehouse(rows, commit=False)
+                self.metrics.rows_loaded += len(rows)
+                if manager.table_name in WEATHER_VIEW_SOURCES:
+                    loaded_rows.extend(rows)
+
+            # Units ending before the end of their month are fetched again by the next
+            # run, their checkpoint would skip the rest of the month
+            checkpoints = [unit._asdict() for unit, _ in results
+                           if unit.end is None or unit.end == next_month(
+                               pd.Timestamp(unit.date).date()).isoformat()]
+            if checkpoints:
+                self.postgres.bulk_upsert(BackfillCheckpoint, checkpoints, commit=False)
+            self.postgres.session.commit()
+        except Exception:
+            self.postgres.session.rollback()
+            raise
+        self.loaded.add_records(loaded_rows)
+
+        previous = self.metrics.completed
+        self.metrics.completed += len(results)
+        if self.metrics.completed // self.log_every > previous // self.log_every:
+            logger.info("Backfill progress: %s", self.metrics.as_dict())
+
+    def run(self, start_date: str, end_date: str,
+            endpoints: Optional[List[str]] = None) -> Dict[str, float]:
+        """
+        Backfills a date range, skipping the work units already completed.
+
+        :param start_date: First date of the range (YYYY-MM-DD).
+        :param end_date: Last date of the range (YYYY-MM-DD).
+        :param endpoints: Endpoints to backfill, defaults to all of them.
+        :return: The metrics of the run.
+        """
+        pending = iter(self.plan(start_date, end_date, endpoints))
+        self.postgres.create_partitions(pd.Timestamp(start_date).date(),
+                                        pd.Timestamp(end_date).date())
+        self.managers['daily_weather'].city_index.refresh()
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Keep a bounded number of units in flight instead of submitting them all
+            in_flight = {}
+            for unit in pending:
+                in_flight[executor.submit(self.fetch, unit)] = unit
+                if len(in_flight) < 2 * self.max_workers:
+                    continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                results.extend(self._collect(done, in_flight))
+                if len(results) >= self.batch_size:
+                    self.load(results)
+                    results = []
+
+            results.extend(self._collect(list(in_flight), in_flight))
+            if results:
+                self.load(results)
+
+        if self.metrics.completed:
+            self.postgres.refresh_weather_view()
+            feature_store = FeatureStore(self.postgres)
+            feature_store.refresh(since=pd.Timestamp(start_date).date())
+            CacheInvalidator(feature_store.redis_manager).invalidate(
+                self.loaded.by_city_name(self.managers['daily_weather'].city_index))
+
+        logger.info("Backfill finished: %s", self.metrics.as_dict())
+        logger.info("OpenWeather response cache: %s", get_response_cache().stats())
+        return self.metrics.as_dict()
+
+    def _collect(self, futures, in_flight) -> List[Tuple[WorkUnit, Dict]]:
+        results = []
+        for future in futures:
+            unit = in_flight.pop(future)
+            try:
+                results.append((unit, future.result()))
+            except Exception as e:
+                # Failed units are not checkpointed and will be retried by the next run
+                self.metrics.failed += 1
+                logger.warning("Backfill of %s failed: %s", unit, e)
+        return results
@@ -0,0 +1,99 @@
+"""
+This module contains the invalidation of the API cache after loads into the data warehouse
+"""
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from database.redis_functools import RedisManager, CITIES_KEY, DELETE_BATCH_SIZE, weather_key
+from utils.city_index import CityIndex
+
+logger = logging.getLogger(__name__)
+
+class LoadedRanges:
+    """ First and last days loaded into the data warehouse, by city ID """
+
+    def __init__(self):
+        self.ranges: Dict[int, Tuple[date, date]] = {}
+
+    def add(self, city_ids: Sequence[int], days: Sequence[Any]):
+        """
+        :param city_ids: IDs of the cities of the loaded rows.
+        :param days: Dates or datetimes of the loaded rows, as objects or ISO strings.
+        """
+        if len(city_ids) == 0:
+            return
+        df = pd.DataFrame({'city_id': pd.Series(city_ids, dtype='int64').to_numpy(),
+                           'day': pd.to_datetime(pd.Series(days), format='ISO8601').dt.date.to_numpy()})
+        for city_id, (first, last) in df.groupby('city_id')['day'].agg(['min', 'max']).iterrows():
+            if city_id in self.ranges:
+                first, last = min(first, self.ranges[city_id][0]), max(last, self.ranges[city_id][1])
+            self.ranges[int(city_id)] = (first, last)
+
+    def add_records(self, records: Iterable[Dict[str, Any]]):
+        """
+        :param records: Loaded records, the ones without a city ID or a date are ignored.
+        """
+        records = [record for record in records if 'city_id' in record and 'date' in record]
+        self.add([record['city_id'] for record in records], [record['date'] for record in records])
+
+    def by_city_name(self, city_index: CityIndex) -> Dict[str, Tuple[date, date]]:
+        """
+        :param city_index: Index of the cities, resolving their names.
+        :return: First and last days loaded, by city name.
+        """
+        names = city_index.city_names(list(self.ranges))
+        return dict(zip(names, self.ranges.values()))
+
+
+class CacheInvalidator:
+    """
+    Write-through invalidation of the entries cached by the API. Once rows are
+    committed into the data warehouse and visible through the weather view, the
+    keys of the loaded (city, day) pairs are deleted in one round trip, so that
+    the next request reads the new rows. The cache entries can then live long,
+    they are only as stale as the loads.
+    """
+
+    def __init__(self, redis_manager: Optional[RedisManager] = None):
+        """
+        :param redis_manager: RedisManager of the API cache.
+        """
+        self.redis_manager = redis_manager or RedisManager()
+
+    def invalidate(self, ranges: Optional[Dict[str, Tuple[date, date]]] = None,
+                   cities: bool = False) -> int:
+        """
+        Delete the cached weather of cities over date ranges.
+
+        :param ranges: First and last days loaded, by city name.
+        :param cities: Also delete the cached list of the cities, after loads of the city table.
+        :return: Number of keys invalidated.
+        """
+        ranges = ranges or {}
+        keys = [CITIES_KEY] if cities else []
+        keys += [weather_key(city, first + timedelta(days=offset))
+                 for city, (first, last) in ranges.items()
+                 for offset in range((last - first).days + 1)]
+        if not keys:
+            return 0
+        self.redis_manager.delete_many(keys)
+        logger.info("Cache invalidated: %d keys of %d cities", len(keys), len(ranges))
+        return len(keys)
+
+    def invalidate_all(self) -> int:
+        """
+        Delete the cached weather of every city and day, and the list of the cities,
+        after loads spanning the whole data warehouse.
+
+        :return: Number of keys invalidated.
+        """
+        keys = [key.decode() for key in self.redis_manager.redis_client.scan_iter(
+            match=weather_key('*', '*'), count=DELETE_BATCH_SIZE)]
+        keys.append(CITIES_KEY)
+        self.redis_manager.delete_many(keys)
+
+        logger.info("Cache invalidated: %d keys", len(keys))
+        return len(keys)
@@ -0,0 +1,94 @@
+"""
+This module contains the feature store of the rain prediction model
+"""
+import logging
+from datetime import date, timedelta
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from database.postgresql_functools import PostgresManager, WeatherFeatures, \
+    AustralianMeteorologyWeather
+from database.redis_functools import RedisManager
+from utils.features import build_features, feature_key, FEATURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Lifetime in seconds of the feature vectors cached in Redis, refresh replaces or
+# deletes the cached vectors it rebuilds
+FEATURE_EXPIRATION = 7 * 86400
+
+
+class FeatureStore:
+    """
+    Feature vectors of the rain prediction model per (city, date), built from the
+    australian_meteorology_weather view at the end of the ETL pipelines. They are
+    stored in the weather_features table, read by the training, and the ones of
+    the last days are cached in Redis hashes, read by the API.
+    """
+
+    def __init__(self, postgres: PostgresManager, redis_manager: Optional[RedisManager] = None,
+                 cache_days: int = 7, expiration: int = FEATURE_EXPIRATION):
+        """
+        :param postgres: PostgresManager reading the view and writing the feature table.
+        :param redis_manager: RedisManager caching the feature vectors.
+        :param cache_days: Number of past days whose feature vectors are cached in Redis.
+        :param expiration: Lifetime in seconds of the cached feature vectors.
+        """
+        self.postgres = postgres
+        self.redis_manager = redis_manager or RedisManager()
+        self.cache_days = cache_days
+        self.expiration = expiration
+
+    def read_weather(self, since: Optional[date] = None) -> pd.DataFrame:
+        """
+        :param since: Only read the days from this date, all of them if None.
+        :return: Weather data of the view, ordered by location and date.
+        """
+        query = f"SELECT * FROM {AustralianMeteorologyWeather.__tablename__}"
+        params = {}
+        if since is not None:
+            query += ' WHERE date >= :since'
+            params['since'] = since
+        query += ' ORDER BY location, date'
+        with self.postgres.engine.connect() as connection:
+            return pd.read_sql_query(text(query), connection, params=params)
+
+    def refresh(self, since: Optional[date] = None) -> int:
+        """
+        Rebuild the feature vectors of the days from a date, and of the day before
+        it whose target depends on them, then write them to the table and to Redis.
+
+        :param since: First day loaded in the data warehouse, all the days if None.
+        :return: Number of feature vectors written.
+        """
+        df = self.read_weather(since - timedelta(days=1) if since is not None else None)
+        if df.empty:
+            return 0
+        df = build_features(df.drop(columns=['id']))
+
+        # NULL rather than NaN in the table
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+        self.postgres.bulk_upsert(WeatherFeatures, records, update=True)
+
+        recent = date.today() - timedelta(days=self.cache_days)
+        self.redis_manager.set_hashes(
+            {feature_key(record['location'], record['date']):
+                {column: record[column] for column in FEATURE_COLUMNS}
+             for record in records if record['date'] >= recent},
+            expiration=self.expiration)
+        # Older vectors cached by the API on a miss would be stale
+        self.redis_manager.delete_many([feature_key(record['location'], record['date'])
+                                        for record in records if record['date'] < recent])
+
+        logger.info("Feature store refreshed: %d feature vectors since %s", len(records), since)
+        return len(records)
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    FeatureStore(PostgresManager()).refresh()
@@ -9,7 +9,8 @@ def run_air_pollution_pipeline():
 
 
 def run_weather_pipeline():
-    weather_manager = DataPipeline(OpenWeatherCurrentWeather())
+    # Runs every minute, the view is refreshed by the 9am/3pm and daily pipelines
+    weather_manager = DataPipeline(OpenWeatherCurrentWeather(), refresh_view=False)
     weather_manager.run()
 
 
@@ -1,6 +1,21 @@
+import pandas as pd
+
+from data_pipeline.cache_invalidation import CacheInvalidator, LoadedRanges
+from data_pipeline.feature_store import FeatureStore
+from database.postgresql_functools import City, DailyWeather, Weather
+
+# Tables read by the australian_meteorology_weather materialized view
+WEATHER_VIEW_SOURCES = (City, DailyWeather, Weather)
+
+
 class DataPipeline:
-    def __init__(self, openweather_manager):
+    def __init__(self, openweather_manager, refresh_view: bool = True):
         self.manager = openweather_manager
+        self.refresh_view = refresh_view
+        self.feature_store = FeatureStore(openweather_manager.data_warehouse_manager) \
+            if refresh_view else None
+        self.cache_invalidator = CacheInvalidator(self.feature_store.redis_manager) \
+            if refresh_view else None
 
     def extract(self):
         return self.manager.extract_data()
@@ -9,25 +24,53 @@ class DataPipeline:
         return self.manager.transform_data(data)
 
     def load_to_datalake(self, data):
-        self.manager.load_to_datalake(data)
+        if isinstance(data, list):
+            self.manager.load_batch_to_datalake(data)
+        else:
+            self.manager.load_to_datalake(data)
 
     def load_to_data_warehouse(self, data):
         if isinstance(data, list):
-            for data_transformed in data:
-                self.manager.load_to_data_warehouse(data_transformed)
-        else:
-            self.manager.load_to_data_warehouse(data)
+            # Flatten the transformed records so the whole batch lands in one transaction
+            return self.manager.load_batch_to_data_warehouse(self.loaded_records(data))
+        return self.manager.load_batch_to_data_warehouse([data])
 
     def run(self):
+        # Pick up cities added or modified since the last run
+        self.manager.city_index.refresh()
+
         # Extract
         data = self.extract()
 
-        for data_dict in data:
-            # Load to datalake
-            self.load_to_datalake(data_dict)
+        # Load to datalake
+        self.load_to_datalake(data)
+
+        # Transform
+        data_transformed = [self.transform(data_dict) for data_dict in data]
+
+        # Load
+        result = self.load_to_data_warehouse(data_transformed)
+
+        # Refresh the materialized view reading the loaded table, then the features built
+        # from it, and drop the entries of the API cache the new rows make stale
+        if self.refresh_view and self.manager.table_name in WEATHER_VIEW_SOURCES:
+            self.manager.data_warehouse_manager.refresh_weather_view()
+            self.feature_store.refresh(since=self.first_loaded_day(data_transformed))
+            loaded = LoadedRanges()
+            loaded.add_records(self.loaded_records(data_transformed))
+            self.cache_invalidator.invalidate(loaded.by_city_name(self.manager.city_index),
+                                              cities=self.manager.table_name is City)
+        return result
 
-            # Transform
-            data_transform = self.transform(data_dict)
+    @staticmethod
+    def loaded_records(data_transformed):
+        """ Transformed records, flattened """
+        return [record for records in data_transformed
+                for record in (records if isinstance(records, list) else [records])]
 
-            # Load
-            self.load_to_data_warehouse(data_transform)
+    @staticmethod
+    def first_loaded_day(data_transformed):
+        """ First day of the transformed records, None to rebuild every day """
+        days = [record['date'] for record in DataPipeline.loaded_records(data_transformed)
+                if 'date' in record]
+        return pd.to_datetime(days, format='ISO8601').min().date() if days else None
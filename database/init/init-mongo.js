@@ -9,4 +9,5 @@ db = db.getSiblingDB(process.env.MONGO_INITDB_DATABASE);
 db.createCollection("city");
 db.createCollection("weather");
 db.createCollection("daily_weather");
-db.createCollection("air_pollution");
\ No newline at end of file
+db.createCollection("air_pollution");
+db.city.createIndex({ lat: 1, lon: 1 });
\ No newline at end of file
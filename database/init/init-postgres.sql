@@ -46,9 +46,10 @@ CREATE TABLE IF NOT EXISTS city
     UNIQUE (latitude, longitude)
 );
 
+-- Weather tables are partitioned by month, see PostgresManager.maintain_partitions
 CREATE TABLE IF NOT EXISTS weather
 (
-    id         SERIAL PRIMARY KEY,
+    id         SERIAL,
     date       TIMESTAMP NOT NULL,
     temp       FLOAT,
     sunrise    TIME,
@@ -58,12 +59,15 @@ CREATE TABLE IF NOT EXISTS weather
     cloud      FLOAT,
     humidity   FLOAT,
     pressure   FLOAT,
-    city_id    INTEGER   NOT NULL REFERENCES city (id)
-);
+    city_id    INTEGER   NOT NULL REFERENCES city (id),
+    PRIMARY KEY (id, date),
+    CONSTRAINT uix_weather_city_date UNIQUE (city_id, date)
+) PARTITION BY RANGE (date);
+CREATE TABLE IF NOT EXISTS weather_default PARTITION OF weather DEFAULT;
 
 CREATE TABLE IF NOT EXISTS daily_weather
 (
-    id              SERIAL PRIMARY KEY,
+    id              SERIAL,
     date            TIMESTAMP NOT NULL,
     min_temp        FLOAT,
     max_temp        FLOAT,
@@ -72,12 +76,15 @@ CREATE TABLE IF NOT EXISTS daily_weather
     sunshine        FLOAT,
     wind_gust_dir   VARCHAR(255),
     wind_gust_speed FLOAT,
-    city_id         INTEGER   NOT NULL REFERENCES city (id)
-);
+    city_id         INTEGER   NOT NULL REFERENCES city (id),
+    PRIMARY KEY (id, date),
+    CONSTRAINT uix_daily_weather_city_date UNIQUE (city_id, date)
+) PARTITION BY RANGE (date);
+CREATE TABLE IF NOT EXISTS daily_weather_default PARTITION OF daily_weather DEFAULT;
 
 CREATE TABLE IF NOT EXISTS air_pollution
 (
-    id                 SERIAL PRIMARY KEY,
+    id                 SERIAL,
     date               TIMESTAMP NOT NULL,
     air_quality_index  INTEGER,
     co_concentration   FLOAT,
@@ -88,7 +95,51 @@ CREATE TABLE IF NOT EXISTS air_pollution
     pm25_concentration FLOAT,
     pm10_concentration FLOAT,
     nh3_concentration  FLOAT,
-    city_id            INTEGER   NOT NULL REFERENCES city (id)
+    city_id            INTEGER   NOT NULL REFERENCES city (id),
+    PRIMARY KEY (id, date),
+    CONSTRAINT uix_air_pollution_city_date UNIQUE (city_id, date)
+) PARTITION BY RANGE (date);
+CREATE TABLE IF NOT EXISTS air_pollution_default PARTITION OF air_pollution DEFAULT;
+
+CREATE TABLE IF NOT EXISTS backfill_checkpoint
+(
+    id           SERIAL PRIMARY KEY,
+    endpoint     VARCHAR(255) NOT NULL,
+    date         DATE         NOT NULL,
+    latitude     FLOAT        NOT NULL,
+    longitude    FLOAT        NOT NULL,
+    completed_at TIMESTAMP    NOT NULL DEFAULT NOW(),
+    UNIQUE (endpoint, date, latitude, longitude)
+);
+
+CREATE TABLE IF NOT EXISTS weather_features
+(
+    id              SERIAL PRIMARY KEY,
+    date            DATE         NOT NULL,
+    location        VARCHAR(255) NOT NULL,
+    min_temp        FLOAT,
+    max_temp        FLOAT,
+    rainfall        FLOAT,
+    evaporation     FLOAT,
+    sunshine        FLOAT,
+    wind_gust_dir   VARCHAR(255),
+    wind_gust_speed FLOAT,
+    temp_9am        FLOAT,
+    humidity_9am    FLOAT,
+    cloud_9am       FLOAT,
+    wind_dir_9am    VARCHAR(255),
+    wind_speed_9am  FLOAT,
+    pressure_9am    FLOAT,
+    temp_3pm        FLOAT,
+    humidity_3pm    FLOAT,
+    cloud_3pm       FLOAT,
+    wind_dir_3pm    VARCHAR(255),
+    wind_speed_3pm  FLOAT,
+    pressure_3pm    FLOAT,
+    rain_today      VARCHAR(3),
+    rain_tomorrow   VARCHAR(3),
+    updated_at      TIMESTAMP    NOT NULL DEFAULT NOW(),
+    CONSTRAINT uix_weather_features_location_date UNIQUE (location, date)
 );
 
 -- Insert initial users
@@ -97,10 +148,10 @@ VALUES ('${API_ADMIN_USER}', '${API_ADMIN_PASSWORD}'),
        ('${API_USER}', '${API_PASSWORD}')
 ON CONFLICT (username) DO NOTHING;
 
--- Create view
-CREATE OR REPLACE VIEW australian_meteorology_weather AS
+-- Create materialized view, refreshed at the end of each load pipeline
+CREATE MATERIALIZED VIEW IF NOT EXISTS australian_meteorology_weather AS
 SELECT dw.id,
-       TO_CHAR(dw.date, 'YYYY-MM-DD') AS date,
+       dw.date::DATE                  AS date,
        c.name                         AS location,
        dw.min_temp,
        dw.max_temp,
@@ -124,20 +175,46 @@ SELECT dw.id,
 FROM daily_weather dw
          JOIN
      city c ON dw.city_id = c.id
-         LEFT JOIN
-     weather w9 ON dw.city_id = w9.city_id
-         AND DATE_TRUNC('day', w9.date) = DATE_TRUNC('day', dw.date)
-         AND EXTRACT(HOUR FROM w9.date) = 9
-         LEFT JOIN
-     weather w3 ON dw.city_id = w3.city_id
-         AND DATE_TRUNC('day', w3.date) = DATE_TRUNC('day', dw.date)
-         AND EXTRACT(HOUR FROM w3.date) = 15
+         LEFT JOIN LATERAL
+     (SELECT w.temp, w.humidity, w.cloud, w.wind_dir, w.wind_speed, w.pressure
+      FROM weather w
+      WHERE w.city_id = dw.city_id
+        AND w.date >= DATE_TRUNC('day', dw.date) + INTERVAL '9 hours'
+        AND w.date < DATE_TRUNC('day', dw.date) + INTERVAL '10 hours'
+      ORDER BY w.date
+      LIMIT 1) w9 ON TRUE
+         LEFT JOIN LATERAL
+     (SELECT w.temp, w.humidity, w.cloud, w.wind_dir, w.wind_speed, w.pressure
+      FROM weather w
+      WHERE w.city_id = dw.city_id
+        AND w.date >= DATE_TRUNC('day', dw.date) + INTERVAL '15 hours'
+        AND w.date < DATE_TRUNC('day', dw.date) + INTERVAL '16 hours'
+      ORDER BY w.date
+      LIMIT 1) w3 ON TRUE
 ORDER BY location, date;
 
+-- A unique index is required to refresh the view concurrently
+CREATE UNIQUE INDEX IF NOT EXISTS uix_australian_meteorology_weather_id
+    ON australian_meteorology_weather (id);
+CREATE INDEX IF NOT EXISTS ix_australian_meteorology_weather_location_date
+    ON australian_meteorology_weather (location, date);
+
+-- Only the owner of the view can refresh it
+ALTER MATERIALIZED VIEW australian_meteorology_weather OWNER TO ${PG_USER};
+
 -- Grant privileges
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO ${PG_USER};
 GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO ${PG_USER};
 
+-- Partitions are created, detached and archived by the application user
+GRANT CREATE ON SCHEMA public TO ${PG_USER};
+ALTER TABLE weather OWNER TO ${PG_USER};
+ALTER TABLE weather_default OWNER TO ${PG_USER};
+ALTER TABLE daily_weather OWNER TO ${PG_USER};
+ALTER TABLE daily_weather_default OWNER TO ${PG_USER};
+ALTER TABLE air_pollution OWNER TO ${PG_USER};
+ALTER TABLE air_pollution_default OWNER TO ${PG_USER};
+
 -- Switch to Airflow database
 \c ${AIRFLOW_DB}
 
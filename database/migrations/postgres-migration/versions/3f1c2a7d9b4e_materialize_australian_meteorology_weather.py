@@ -0,0 +1,121 @@
+"""materialize australian_meteorology_weather
+
+Revision ID: 3f1c2a7d9b4e
+Revises:
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9b4e'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+WEATHER_COLUMNS = """
+       w{alias}.temp                  AS temp_{suffix},
+       w{alias}.humidity              AS humidity_{suffix},
+       w{alias}.cloud                 AS cloud_{suffix},
+       w{alias}.wind_dir              AS wind_dir_{suffix},
+       w{alias}.wind_speed            AS wind_speed_{suffix},
+       w{alias}.pressure              AS pressure_{suffix}"""
+
+MATERIALIZED_VIEW = """
+CREATE MATERIALIZED VIEW australian_meteorology_weather AS
+SELECT dw.id,
+       dw.date::DATE                  AS date,
+       c.name                         AS location,
+       dw.min_temp,
+       dw.max_temp,
+       dw.rainfall,
+       dw.evaporation,
+       dw.sunshine,
+       dw.wind_gust_dir,
+       dw.wind_gust_speed,""" + WEATHER_COLUMNS.format(alias=9, suffix='9am') + "," \
+    + WEATHER_COLUMNS.format(alias=3, suffix='3pm') + """
+FROM daily_weather dw
+         JOIN
+     city c ON dw.city_id = c.id
+         LEFT JOIN LATERAL
+     (SELECT w.temp, w.humidity, w.cloud, w.wind_dir, w.wind_speed, w.pressure
+      FROM weather w
+      WHERE w.city_id = dw.city_id
+        AND w.date >= DATE_TRUNC('day', dw.date) + INTERVAL '9 hours'
+        AND w.date < DATE_TRUNC('day', dw.date) + INTERVAL '10 hours'
+      ORDER BY w.date
+      LIMIT 1) w9 ON TRUE
+         LEFT JOIN LATERAL
+     (SELECT w.temp, w.humidity, w.cloud, w.wind_dir, w.wind_speed, w.pressure
+      FROM weather w
+      WHERE w.city_id = dw.city_id
+        AND w.date >= DATE_TRUNC('day', dw.date) + INTERVAL '15 hours'
+        AND w.date < DATE_TRUNC('day', dw.date) + INTERVAL '16 hours'
+      ORDER BY w.date
+      LIMIT 1) w3 ON TRUE
+ORDER BY location, date
+"""
+
+VIEW = """
+CREATE VIEW australian_meteorology_weather AS
+SELECT dw.id,
+       TO_CHAR(dw.date, 'YYYY-MM-DD') AS date,
+       c.name                         AS location,
+       dw.min_temp,
+       dw.max_temp,
+       dw.rainfall,
+       dw.evaporation,
+       dw.sunshine,
+       dw.wind_gust_dir,
+       dw.wind_gust_speed,""" + WEATHER_COLUMNS.format(alias=9, suffix='9am') + "," \
+    + WEATHER_COLUMNS.format(alias=3, suffix='3pm') + """
+FROM daily_weather dw
+         JOIN
+     city c ON dw.city_id = c.id
+         LEFT JOIN
+     weather w9 ON dw.city_id = w9.city_id
+         AND DATE_TRUNC('day', w9.date) = DATE_TRUNC('day', dw.date)
+         AND EXTRACT(HOUR FROM w9.date) = 9
+         LEFT JOIN
+     weather w3 ON dw.city_id = w3.city_id
+         AND DATE_TRUNC('day', w3.date) = DATE_TRUNC('day', dw.date)
+         AND EXTRACT(HOUR FROM w3.date) = 15
+ORDER BY location, date
+"""
+
+
+def upgrade() -> None:
+    # Databases created from init-postgres.sql already have the materialized view
+    if op.get_bind().execute(sa.text(
+            "SELECT 1 FROM pg_matviews WHERE matviewname = 'australian_meteorology_weather'")).scalar():
+        return
+
+    op.create_index('ix_weather_city_id_date', 'weather', ['city_id', 'date'],
+                    if_not_exists=True)
+    op.create_index('ix_daily_weather_city_id_date', 'daily_weather', ['city_id', 'date'],
+                    if_not_exists=True)
+
+    op.execute('DROP VIEW IF EXISTS australian_meteorology_weather')
+    op.execute(MATERIALIZED_VIEW)
+    op.create_index('uix_australian_meteorology_weather_id', 'australian_meteorology_weather',
+                    ['id'], unique=True)
+    op.create_index('ix_australian_meteorology_weather_location_date',
+                    'australian_meteorology_weather', ['location', 'date'])
+
+    # Only the owner of the view can refresh it
+    pg_user = os.getenv('PG_USER')
+    if pg_user:
+        op.execute(sa.text(
+            f'ALTER MATERIALIZED VIEW australian_meteorology_weather OWNER TO "{pg_user}"'))
+
+
+def downgrade() -> None:
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS australian_meteorology_weather')
+    op.execute(VIEW)
+    op.drop_index('ix_daily_weather_city_id_date', table_name='daily_weather')
+    op.drop_index('ix_weather_city_id_date', table_name='weather')
@@ -0,0 +1,46 @@
+"""unique city and date on weather tables
+
+Revision ID: 5a9e3c1b7d20
+Revises: c4d2f7a1e9b3
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9e3c1b7d20'
+down_revision: Union[str, None] = 'c4d2f7a1e9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('weather', 'daily_weather')
+
+
+def has_constraint(name: str) -> bool:
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = :name)"),
+        {'name': name}).scalar()
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        # Databases created from init-postgres.sql already have the constraint
+        if has_constraint(f"uix_{table}_city_date"):
+            continue
+        # Keep the last loaded row of each city and date, reloads duplicated them
+        op.execute(f"DELETE FROM {table} a USING {table} b "
+                   f"WHERE a.city_id = b.city_id AND a.date = b.date AND a.id < b.id")
+        # The unique index replaces the index on the same columns
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_city_id_date")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT uix_{table}_city_date "
+                   f"UNIQUE (city_id, date)")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS uix_{table}_city_date")
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_city_id_date ON {table} (city_id, date)")
@@ -0,0 +1,119 @@
+"""partition weather tables by month
+
+Revision ID: 8b5e0d4c6a21
+Revises: 3f1c2a7d9b4e
+Create Date: 2026-10-18 20:15:00.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b5e0d4c6a21'
+down_revision: Union[str, None] = '3f1c2a7d9b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('weather', 'daily_weather', 'air_pollution')
+VIEW = 'australian_meteorology_weather'
+
+# Number of months after the current one to create partitions for
+MONTHS_AHEAD = 3
+
+
+def next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def is_partitioned(table: str) -> bool:
+    return op.get_bind().execute(sa.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE relname = :table"), {'table': table}).scalar()
+
+
+def drop_view() -> tuple:
+    """ Drop the materialized view reading the tables, returning what is needed to recreate it """
+    bind = op.get_bind()
+    definition = bind.execute(sa.text(f"SELECT pg_get_viewdef('{VIEW}'::regclass, true)")).scalar()
+    indexes = bind.execute(sa.text(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = :view"), {'view': VIEW}).scalars().all()
+    owner = bind.execute(sa.text(
+        "SELECT matviewowner FROM pg_matviews WHERE matviewname = :view"), {'view': VIEW}).scalar()
+    op.execute(f"DROP MATERIALIZED VIEW {VIEW}")
+    return definition, indexes, owner
+
+
+def create_view(definition: str, indexes: list, owner: str) -> None:
+    op.execute(f"CREATE MATERIALIZED VIEW {VIEW} AS {definition}")
+    for index in indexes:
+        op.execute(index)
+    op.execute(f'ALTER MATERIALIZED VIEW {VIEW} OWNER TO "{owner}"')
+
+
+def swap_table(table: str, partitioned: bool, owner: str) -> None:
+    """
+    Replace a table by a partitioned (or plain) copy of it, holding the same rows.
+    The copy and its partitions are owned by the application user, which refreshes
+    the view and maintains the partitions.
+    """
+    old = f"{table}_swap"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER INDEX {table}_pkey RENAME TO {old}_pkey")
+    op.execute(f"DROP INDEX IF EXISTS ix_{table}_city_id_date")
+
+    if partitioned:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+                   f"PRIMARY KEY (id, date), FOREIGN KEY (city_id) REFERENCES city (id)) "
+                   f"PARTITION BY RANGE (date)")
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        op.execute(f'ALTER TABLE {table}_default OWNER TO "{owner}"')
+
+        # One partition per month from the oldest row to a few months from now
+        first = op.get_bind().execute(sa.text(
+            f"SELECT DATE_TRUNC('month', MIN(date))::DATE FROM {old}")).scalar()
+        month = date.today().replace(day=1)
+        for _ in range(MONTHS_AHEAD):
+            month = next_month(month)
+        end = next_month(month)
+        month = min(first or end, date.today().replace(day=1))
+        while month < end:
+            op.execute(f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+                       f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')")
+            op.execute(f'ALTER TABLE {table}_p{month:%Y%m} OWNER TO "{owner}"')
+            month = next_month(month)
+    else:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+                   f"PRIMARY KEY (id), FOREIGN KEY (city_id) REFERENCES city (id))")
+
+    # Keep the id sequence, linking it to the new table
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNER TO "{owner}"')
+    op.execute(f'ALTER TABLE {table} OWNER TO "{owner}"')
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    op.execute(f"DROP TABLE {old}")
+    op.execute(f"CREATE INDEX ix_{table}_city_id_date ON {table} (city_id, date)")
+
+
+def upgrade() -> None:
+    # Databases created from init-postgres.sql already have partitioned tables
+    tables = [table for table in TABLES if not is_partitioned(table)]
+    if not tables:
+        return
+
+    definition, indexes, owner = drop_view()
+    # Partitions are created by the application user
+    op.execute(f'GRANT CREATE ON SCHEMA public TO "{owner}"')
+    for table in tables:
+        swap_table(table, partitioned=True, owner=owner)
+    create_view(definition, indexes, owner)
+
+
+def downgrade() -> None:
+    definition, indexes, owner = drop_view()
+    for table in TABLES:
+        swap_table(table, partitioned=False, owner=owner)
+    create_view(definition, indexes, owner)
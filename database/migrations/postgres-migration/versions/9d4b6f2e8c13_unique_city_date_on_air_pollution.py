@@ -0,0 +1,39 @@
+"""unique city and date on air_pollution
+
+Revision ID: 9d4b6f2e8c13
+Revises: 5a9e3c1b7d20
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b6f2e8c13'
+down_revision: Union[str, None] = '5a9e3c1b7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created from init-postgres.sql already have the constraint
+    if op.get_bind().execute(sa.text(
+            "SELECT EXISTS (SELECT 1 FROM pg_constraint "
+            "WHERE conname = 'uix_air_pollution_city_date')")).scalar():
+        return
+    # Keep the last loaded row of each city and date, reloads duplicated them
+    op.execute("DELETE FROM air_pollution a USING air_pollution b "
+               "WHERE a.city_id = b.city_id AND a.date = b.date AND a.id < b.id")
+    # The unique index replaces the index on the same columns
+    op.execute("DROP INDEX IF EXISTS ix_air_pollution_city_id_date")
+    op.execute("ALTER TABLE air_pollution ADD CONSTRAINT uix_air_pollution_city_date "
+               "UNIQUE (city_id, date)")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE air_pollution DROP CONSTRAINT IF EXISTS uix_air_pollution_city_date")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_air_pollution_city_id_date "
+               "ON air_pollution (city_id, date)")
@@ -0,0 +1,52 @@
+"""create weather_features
+
+Revision ID: c4d2f7a1e9b3
+Revises: 8b5e0d4c6a21
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2f7a1e9b3'
+down_revision: Union[str, None] = '8b5e0d4c6a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+WEATHER_COLUMNS = ('min_temp', 'max_temp', 'rainfall', 'evaporation', 'sunshine',
+                   'wind_gust_dir', 'wind_gust_speed',
+                   'temp_9am', 'humidity_9am', 'cloud_9am', 'wind_dir_9am',
+                   'wind_speed_9am', 'pressure_9am',
+                   'temp_3pm', 'humidity_3pm', 'cloud_3pm', 'wind_dir_3pm',
+                   'wind_speed_3pm', 'pressure_3pm')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'weather_features',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('date', sa.Date, nullable=False),
+        sa.Column('location', sa.String(255), nullable=False),
+        *[sa.Column(column, sa.String(255) if 'dir' in column else sa.Float)
+          for column in WEATHER_COLUMNS],
+        sa.Column('rain_today', sa.String(3)),
+        sa.Column('rain_tomorrow', sa.String(3)),
+        sa.Column('updated_at', sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint('location', 'date', name='uix_weather_features_location_date'),
+        if_not_exists=True,
+    )
+
+    # The table is written by the ETL pipelines with the application user
+    pg_user = os.getenv('PG_USER')
+    if pg_user:
+        op.execute(f'GRANT ALL PRIVILEGES ON TABLE weather_features TO "{pg_user}"')
+        op.execute(f'GRANT ALL PRIVILEGES ON SEQUENCE weather_features_id_seq TO "{pg_user}"')
+
+
+def downgrade() -> None:
+    op.drop_table('weather_features')
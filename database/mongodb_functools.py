@@ -4,12 +4,29 @@ import os
 from typing import Dict, Any, List
 
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from pymongo.errors import ConnectionFailure, BulkWriteError
 
 load_dotenv()
 
 
+def document_key(document: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """
+    Values of fields of a document, as a query matching it. Nested fields and array
+    items are given with dots as in queries, e.g. 'data.0.dt'. Missing fields are left out.
+    """
+    key = {}
+    for field in fields:
+        value = document
+        try:
+            for part in field.split('.'):
+                value = value[int(part)] if isinstance(value, list) else value[part]
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+        key[field] = value
+    return key
+
+
 class MongoDBManager:
     """ MongoDB Manager class """
 
@@ -25,6 +42,7 @@ class MongoDBManager:
         )
 
         self.db = self.client[self.dbname]
+        self.indexed_fields = set()
 
     def health_check(self) -> bool:
         """Perform a health check on the MongoDB connection"""
@@ -61,6 +79,58 @@ class MongoDBManager:
         # Return True if a new document was inserted, False if an existing document was updated
         return result.upserted_id is not None
 
+    def ensure_index(self, collection_name: str, fields: List[str]):
+        """ Create an index on the given fields of a collection if not already done """
+        key = (collection_name, tuple(fields))
+        if not fields or key in self.indexed_fields:
+            return
+        self.db[collection_name].create_index([(field, ASCENDING) for field in fields])
+        self.indexed_fields.add(key)
+
+    def bulk_insert_documents(self, collection_name: str, documents: List[Dict[str, Any]],
+                              batch_size: int = 1000) -> int:
+        """
+        Insert many documents into a collection with unordered batches of insert_many.
+        Documents rejected as duplicates by a unique index are skipped.
+
+        :return: The number of inserted documents.
+        """
+        collection = self.db[collection_name]
+        inserted = 0
+        for start in range(0, len(documents), batch_size):
+            try:
+                result = collection.insert_many(documents[start:start + batch_size],
+                                                ordered=False)
+                inserted += len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Only tolerate duplicate key errors
+                if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                    raise e
+                inserted += e.details['nInserted']
+        return inserted
+
+    def bulk_upsert_documents(self, collection_name: str, documents: List[Dict[str, Any]],
+                              unique_fields: List[str], batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Insert many documents into a collection or update them if they already exist,
+        with unordered batches of upserts sent through bulk_write. The unique fields
+        are indexed first so that the upserts do not scan the collection.
+
+        :return: The number of 'inserted' and 'updated' documents.
+        """
+        collection = self.db[collection_name]
+        self.ensure_index(collection_name, unique_fields)
+        counts = {'inserted': 0, 'updated': 0}
+        for start in range(0, len(documents), batch_size):
+            operations = [
+                UpdateOne(document_key(document, unique_fields), {'$set': document}, upsert=True)
+                for document in documents[start:start + batch_size]
+            ]
+            result = collection.bulk_write(operations, ordered=False)
+            counts['inserted'] += result.upserted_count
+            counts['updated'] += result.matched_count
+        return counts
+
     def find_document(self, collection_name, query):
         """ Find a document in a collection """
         collection = self.db[collection_name]
@@ -0,0 +1,98 @@
+""" Asynchronous data warehouse access for the API """
+
+import os
+from datetime import date as date_type
+from typing import AsyncIterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database.postgresql_functools import AustralianMeteorologyWeather, WeatherFeatures
+
+load_dotenv()
+
+
+class AsyncPostgresManager:
+    """ Asynchronous Postgres Manager class with a pool of connections """
+
+    def __init__(self, pool_size: Optional[int] = None, max_overflow: Optional[int] = None,
+                 statement_timeout: Optional[int] = None):
+        """
+        :param pool_size: Number of connections kept open in the pool.
+        :param max_overflow: Number of connections allowed beyond the pool size.
+        :param statement_timeout: Maximum duration of a statement in milliseconds, 0 for no timeout.
+        """
+        self.user = os.getenv('PG_USER')
+        self.password = os.getenv('PG_PASSWORD')
+        self.host = os.getenv('PG_HOST')
+        self.port = os.getenv('PG_PORT')
+        self.dbname = os.getenv('POSTGRES_DB')
+
+        # 0 is a valid setting, no overflow or no timeout, only None falls back to the environment
+        self.pool_size = pool_size if pool_size is not None \
+            else int(os.getenv('PG_POOL_SIZE', '10'))
+        self.max_overflow = max_overflow if max_overflow is not None \
+            else int(os.getenv('PG_MAX_OVERFLOW', '20'))
+        self.statement_timeout = statement_timeout if statement_timeout is not None \
+            else int(os.getenv('PG_STATEMENT_TIMEOUT', '5000'))
+
+        self.engine = create_async_engine(
+            f"postgresql+asyncpg://{self.user}:{self.password}@{self.host}:{self.port}/{self.dbname}",
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_pre_ping=True,
+            connect_args={'server_settings': {'statement_timeout': str(self.statement_timeout)}}
+        )
+        self.sessionmaker = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+    async def get_session(self) -> AsyncIterator[AsyncSession]:
+        """ Provide a session for the duration of a request """
+        async with self.sessionmaker() as session:
+            yield session
+
+    async def health_check(self) -> bool:
+        """Perform a health check on the PostgreSQL connection"""
+        try:
+            async with self.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    async def dispose(self):
+        """ Close every connection of the pool """
+        await self.engine.dispose()
+
+    @staticmethod
+    async def fetch_record(session: AsyncSession, model, query):
+        """ Fetch a record from a table """
+        result = await session.execute(select(model).filter_by(**query).limit(1))
+        return result.scalars().first()
+
+    @staticmethod
+    async def fetch_table(session: AsyncSession, table):
+        """ Fetch all records from a table """
+        result = await session.execute(select(table))
+        return result.scalars().all()
+
+    @staticmethod
+    async def fetch_weather_data(session: AsyncSession, city: str, start_date: str, end_date: str):
+        """Fetch weather data for a specific city and date range from the australian_meteorology_weather table"""
+        result = await session.execute(select(AustralianMeteorologyWeather).filter(
+            AustralianMeteorologyWeather.location == city,
+            AustralianMeteorologyWeather.date.between(start_date, end_date)
+        ).order_by(AustralianMeteorologyWeather.date))
+        return result.scalars().all()
+
+    @staticmethod
+    async def fetch_features(session: AsyncSession, city_dates: List[Tuple[str, date_type]]):
+        """
+        Fetch the feature vectors of several (city, date) pairs at once from the
+        weather_features table.
+        """
+        if not city_dates:
+            return []
+        result = await session.execute(select(WeatherFeatures).filter(
+            tuple_(WeatherFeatures.location, WeatherFeatures.date).in_(city_dates)))
+        return result.scalars().all()
@@ -1,11 +1,15 @@
 """ Data warehouse """
 
+import io
 import os
-from typing import Type, Dict, Any
+from datetime import date as date_type, timedelta
+from typing import Type, Dict, Any, List, Optional, Iterable, Tuple
 
+import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, ForeignKey, Column, Integer, String, \
-    Float, Date, Time, DateTime, func, text, UniqueConstraint
+    Float, Date, Time, DateTime, func, text, UniqueConstraint, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -17,9 +21,12 @@ Base = declarative_base()
 class Weather(Base):
     """ Weather table """
     __tablename__ = 'weather'
+    # Reloads skip the rows already loaded, the partition key is part of the constraint
+    __table_args__ = (UniqueConstraint('city_id', 'date', name='uix_weather_city_date'),)
 
-    id = Column(Integer, primary_key=True)
-    date = Column(DateTime, nullable=False, unique=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Partition key, part of the primary key of the partitioned table
+    date = Column(DateTime, primary_key=True)
     temp = Column(Float)
     sunrise = Column(Time)
     sunset = Column(Time)
@@ -47,9 +54,12 @@ class Weather(Base):
 class DailyWeather(Base):
     """ Daily Weather table """
     __tablename__ = 'daily_weather'
+    # Reloads skip the rows already loaded, the partition key is part of the constraint
+    __table_args__ = (UniqueConstraint('city_id', 'date', name='uix_daily_weather_city_date'),)
 
-    id = Column(Integer, primary_key=True)
-    date = Column(Date, nullable=False, unique=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Partition key, part of the primary key of the partitioned table
+    date = Column(Date, primary_key=True)
     min_temp = Column(Float)
     max_temp = Column(Float)
     rainfall = Column(Float)
@@ -72,9 +82,12 @@ class DailyWeather(Base):
 class AirPollution(Base):
     """ Air Pollution table"""
     __tablename__ = 'air_pollution'
+    # Reloads skip the rows already loaded, the partition key is part of the constraint
+    __table_args__ = (UniqueConstraint('city_id', 'date', name='uix_air_pollution_city_date'),)
 
-    id = Column(Integer, primary_key=True)
-    date = Column(DateTime, nullable=False, unique=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Partition key, part of the primary key of the partitioned table
+    date = Column(DateTime, primary_key=True)
     air_quality_index = Column(Integer)
     co_concentration = Column(Float)
     no_concentration = Column(Float)
@@ -101,7 +114,7 @@ class AirPollution(Base):
 
 
 class AustralianMeteorologyWeather(Base):
-    """ Australian Meteorology Weather view """
+    """ Australian Meteorology Weather materialized view """
     __tablename__ = 'australian_meteorology_weather'
 
     id = Column(Integer, primary_key=True)
@@ -151,6 +164,46 @@ class AustralianMeteorologyWeather(Base):
                 f"Pressure3pm={self.pressure_3pm})>")
 
 
+class WeatherFeatures(Base):
+    """ Weather Features table, the feature vectors of the rain prediction model """
+    __tablename__ = 'weather_features'
+
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    location = Column(String, nullable=False)
+    min_temp = Column(Float)
+    max_temp = Column(Float)
+    rainfall = Column(Float)
+    evaporation = Column(Float)
+    sunshine = Column(Float)
+    wind_gust_dir = Column(String)
+    wind_gust_speed = Column(Float)
+    temp_9am = Column(Float)
+    humidity_9am = Column(Float)
+    cloud_9am = Column(Float)
+    wind_dir_9am = Column(String)
+    wind_speed_9am = Column(Float)
+    pressure_9am = Column(Float)
+    temp_3pm = Column(Float)
+    humidity_3pm = Column(Float)
+    cloud_3pm = Column(Float)
+    wind_dir_3pm = Column(String)
+    wind_speed_3pm = Column(Float)
+    pressure_3pm = Column(Float)
+    rain_today = Column(String)
+    rain_tomorrow = Column(String)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (UniqueConstraint('location', 'date', name='uix_weather_features_location_date'),)
+
+    def __repr__(self):
+        return (f"<WeatherFeatures(Date={self.date},"
+                f"Location={self.location},"
+                f"RainToday={self.rain_today},"
+                f"RainTomorrow={self.rain_tomorrow},"
+                f"UpdatedAt={self.updated_at})>")
+
+
 class City(Base):
     """ City table """
     __tablename__ = 'city'
@@ -170,6 +223,28 @@ class City(Base):
                 f"Longitude={self.longitude})>")
 
 
+class BackfillCheckpoint(Base):
+    """ Backfill Checkpoint table """
+    __tablename__ = 'backfill_checkpoint'
+
+    id = Column(Integer, primary_key=True)
+    endpoint = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    completed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (UniqueConstraint('endpoint', 'date', 'latitude', 'longitude',
+                                       name='uix_backfill_unit'),)
+
+    def __repr__(self):
+        return (f"<BackfillCheckpoint(Endpoint={self.endpoint},"
+                f"Date={self.date},"
+                f"Latitude={self.latitude},"
+                f"Longitude={self.longitude},"
+                f"CompletedAt={self.completed_at})>")
+
+
 class APIUsers(Base):
     """ API Users table """
     __tablename__ = 'api_users'
@@ -183,6 +258,44 @@ class APIUsers(Base):
                 f"Password={self.password})>")
 
 
+# Tables partitioned by month on their date column, with a default partition
+PARTITIONED_TABLES = (Weather.__tablename__, DailyWeather.__tablename__,
+                      AirPollution.__tablename__)
+
+
+def month_start(day: date_type) -> date_type:
+    """ First day of the month of a date """
+    return day.replace(day=1)
+
+
+def next_month(day: date_type) -> date_type:
+    """ First day of the month following a date """
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_ranges(start_date: str, end_date: str) -> List[Tuple[str, str]]:
+    """
+    Splits a date range into the parts of the months it covers.
+
+    :param start_date: First date of the range (YYYY-MM-DD).
+    :param end_date: Last date of the range (YYYY-MM-DD).
+    :return: First date and day after the last date of each part, the first and the
+        last parts being clamped to the range.
+    """
+    start = date_type.fromisoformat(start_date)
+    end = date_type.fromisoformat(end_date) + timedelta(days=1)
+    ranges, month = [], month_start(start)
+    while month < end:
+        ranges.append((max(month, start).isoformat(), min(next_month(month), end).isoformat()))
+        month = next_month(month)
+    return ranges
+
+
+def partition_name(table: str, month: date_type) -> str:
+    """ Name of the partition of a table holding a month """
+    return f"{table}_p{month:%Y%m}"
+
+
 class PostgresManager:
     """ Postgres Manager class """
 
@@ -243,6 +356,129 @@ class PostgresManager:
             self.session.rollback()
             raise e
 
+    def bulk_upsert(self, model: Type[Base], rows: Iterable[Dict[str, Any]],
+                    batch_size: int = 1000, update: bool = False,
+                    conflict_columns: Optional[List[str]] = None,
+                    commit: bool = True) -> Dict[str, int]:
+        """
+        Insert many records into the specified model's table in a single transaction
+        with multi-row INSERT ... ON CONFLICT statements sent in batches.
+        Keys of the rows that are not columns of the table are ignored.
+
+        :param model: Model of the table to insert into.
+        :param rows: Records to insert.
+        :param batch_size: Number of records sent in each INSERT statement.
+        :param update: Update the existing records on conflict instead of skipping them.
+        :param conflict_columns: Columns identifying a conflict, defaults to the columns
+            of the first unique constraint of the model.
+        :param commit: Commit the transaction, or leave it open for the caller.
+        :return: Number of 'inserted', 'updated' and 'skipped' records.
+        :raise ValueError: If the model has no unique constraint and no conflict columns are given.
+        """
+        columns = set(model.__table__.columns.keys())
+        rows = [{key: value for key, value in row.items() if key in columns} for row in rows]
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+        # Without a natural key, every record would count as inserted
+        if conflict_columns is None:
+            conflict_columns = next(
+                ([column.name for column in constraint.columns]
+                 for constraint in model.__table__.constraints
+                 if isinstance(constraint, UniqueConstraint)), None)
+            if conflict_columns is None:
+                raise ValueError(f"No unique constraint to identify the conflicts of "
+                                 f"{model.__tablename__}")
+
+        # xmax is 0 for freshly inserted rows and set for updated ones. System columns
+        # cannot be returned from partitioned tables, their updated rows are counted
+        # before the statement instead.
+        partitioned = model.__tablename__ in PARTITIONED_TABLES
+        inserted_flag = literal_column('TRUE') if partitioned else literal_column('xmax = 0')
+
+        try:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                if update:
+                    # A row cannot be updated twice by the same statement, keep the last one
+                    batch = list({tuple(row[column] for column in conflict_columns): row
+                                  for row in batch}.values())
+                    counts['skipped'] += len(rows[start:start + batch_size]) - len(batch)
+
+                statement = insert(model).values(batch)
+                existing = 0
+                if update:
+                    statement = statement.on_conflict_do_update(
+                        index_elements=conflict_columns,
+                        set_={column: statement.excluded[column] for column in batch[0]
+                              if column not in conflict_columns})
+                    if partitioned:
+                        existing = self.session.query(func.count()).select_from(model).filter(
+                            tuple_(*[model.__table__.c[column] for column in conflict_columns])
+                            .in_([tuple(row[column] for column in conflict_columns)
+                                  for row in batch])).scalar()
+                else:
+                    statement = statement.on_conflict_do_nothing(index_elements=conflict_columns)
+
+                inserted_flags = self.session.execute(
+                    statement.returning(inserted_flag)).scalars().all()
+                counts['inserted'] += sum(inserted_flags) - existing
+                counts['updated'] += len(inserted_flags) - sum(inserted_flags) + existing
+                counts['skipped'] += len(batch) - len(inserted_flags)
+
+            if commit:
+                self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            raise e
+        return counts
+
+    def copy_dataframe(self, df: pd.DataFrame, table: str, chunk_size: int = 50000,
+                       conflict_columns: Optional[List[str]] = None) -> int:
+        """
+        Append the rows of a DataFrame to a table with COPY FROM STDIN, serialized
+        to CSV one chunk at a time and sent in a single transaction. The columns of
+        the DataFrame must be columns of the table, missing values are written as NULL.
+        Without conflict columns, a row violating a unique constraint fails the whole copy.
+
+        :param df: Rows to copy.
+        :param table: Name of the table.
+        :param chunk_size: Number of rows serialized at a time.
+        :param conflict_columns: Columns of a unique constraint of the table. The rows are
+            then copied into a temporary table first, and the ones already in the table skipped.
+        :return: Number of rows added to the table.
+        """
+        columns = ', '.join(df.columns)
+        target = f"{table}_copy" if conflict_columns else table
+        statement = f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                if conflict_columns:
+                    cursor.execute(f"CREATE TEMPORARY TABLE {target} ON COMMIT DROP AS "
+                                   f"SELECT {columns} FROM {table} WITH NO DATA")
+                for start in range(0, len(df), chunk_size):
+                    buffer = io.StringIO()
+                    df.iloc[start:start + chunk_size].to_csv(buffer, index=False, header=False)
+                    if hasattr(cursor, 'copy'):
+                        # psycopg 3, the default driver of SQLAlchemy 2.1
+                        with cursor.copy(statement) as copy:
+                            copy.write(buffer.getvalue())
+                    else:
+                        buffer.seek(0)
+                        cursor.copy_expert(statement, buffer)
+                copied = len(df)
+                if conflict_columns:
+                    cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {target} "
+                                   f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING")
+                    copied = cursor.rowcount
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            raise e
+        finally:
+            connection.close()
+        return copied
+
     def fetch_record(self, model, query):
         """ Fetch a record from a table """
         return self.session.query(model).filter_by(**query).first()
@@ -256,11 +492,12 @@ class PostgresManager:
         self.session.delete(record)
         self.session.commit()
 
-    def fetch_city_record_by_coord(self, lat, lon):
-        """ Fetch the nearest record from table City based on latitude and longitude """
-        return (self.session.query(City)
-                .order_by(func.abs(City.latitude - lat), func.abs(City.longitude - lon))
-                .first())
+    def fetch_city_table_signature(self) -> Optional[str]:
+        """ Fetch a hash of the content of table City, changing whenever a city is modified """
+        return self.session.execute(text(
+            "SELECT md5(string_agg(id || ':' || name || ':' || latitude || ':' || longitude, ','"
+            " ORDER BY id)) FROM city"
+        )).scalar()
 
     def fetch_weather_data(self, city: str, start_date: str, end_date: str):
         """Fetch weather data for a specific city and date range  from the australian_meteorology_weather table"""
@@ -269,13 +506,147 @@ class PostgresManager:
             AustralianMeteorologyWeather.date.between(start_date, end_date)
         ).order_by(AustralianMeteorologyWeather.date).all()
 
-    def fetch_weather_data_for_city_and_date(self, city: str, date: str):
+    def fetch_features(self, city_dates: List[Tuple[str, date_type]]):
         """
-        Fetch weather data for a specific city and date from the australian_meteorology_weather table.
+        Fetch the feature vectors of several (city, date) pairs at once from the
+        weather_features table.
         """
-        return self.session.query(AustralianMeteorologyWeather).filter(
-            AustralianMeteorologyWeather.location == city,
-            AustralianMeteorologyWeather.date == date).all()
+        if not city_dates:
+            return []
+        return self.session.query(WeatherFeatures).filter(
+            tuple_(WeatherFeatures.location, WeatherFeatures.date).in_(city_dates)).all()
+
+    def fetch_partitions(self, table: str) -> Dict[str, date_type]:
+        """ Fetch the monthly partitions of a table, with the month each one holds """
+        names = self.session.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"), {'table': table}).scalars().all()
+        self.session.commit()
+        prefix = f"{table}_p"
+        return {name: date_type(int(name[len(prefix):len(prefix) + 4]),
+                                int(name[len(prefix) + 4:]), 1)
+                for name in names if name.startswith(prefix) and name[len(prefix):].isdigit()}
+
+    def create_partition(self, table: str, month: date_type) -> bool:
+        """
+        Create the partition of a table holding a month, moving the rows of that month
+        out of the default partition.
+
+        :param table: Name of the partitioned table.
+        :param month: Any day of the month.
+        :return: True if the partition was created, False if it already existed.
+        """
+        start, end = month_start(month), next_month(month)
+        name = partition_name(table, start)
+        bounds = {'start': start, 'end': end}
+        with self.engine.begin() as connection:
+            if connection.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar():
+                return False
+            # Fill the partition before attaching it, the check constraint spares
+            # the validation scan of the new partition
+            connection.execute(text(
+                f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+                f"CONSTRAINT {name}_bounds CHECK (date >= '{start}' AND date < '{end}'))"))
+            connection.execute(text(
+                f"WITH moved AS (DELETE FROM {table}_default "
+                f"WHERE date >= :start AND date < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"), bounds)
+            connection.execute(text(
+                f"ALTER TABLE {table} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+            connection.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+        return True
+
+    def create_partitions(self, start: date_type, end: date_type,
+                          tables: Iterable[str] = PARTITIONED_TABLES) -> List[str]:
+        """
+        Create the monthly partitions of tables between two dates, both months included.
+        Loaders call it before inserting historical data, so that rows land in their
+        partition instead of the default one.
+        """
+        created = []
+        for table in tables:
+            month = month_start(start)
+            while month <= end:
+                if self.create_partition(table, month):
+                    created.append(partition_name(table, month))
+                month = next_month(month)
+        return created
+
+    def split_default_partitions(self, tables: Iterable[str] = PARTITIONED_TABLES) -> List[str]:
+        """ Move the rows of the default partitions into their monthly partitions """
+        created = []
+        for table in tables:
+            months = self.session.execute(text(
+                f"SELECT DISTINCT DATE_TRUNC('month', date)::DATE FROM {table}_default")) \
+                .scalars().all()
+            self.session.commit()
+            created.extend(partition_name(table, month) for month in months
+                           if self.create_partition(table, month))
+        return created
+
+    def detach_partitions(self, before: date_type, tables: Iterable[str] = PARTITIONED_TABLES,
+                          archive_schema: Optional[str] = 'archive') -> List[str]:
+        """
+        Detach the monthly partitions holding only dates before a given date.
+
+        :param before: Partitions of the months ending before this date are detached.
+        :param tables: Names of the partitioned tables.
+        :param archive_schema: Schema the detached partitions are moved to,
+            or None to drop them.
+        :return: Names of the detached partitions.
+        """
+        detached = []
+        for table in tables:
+            for name, month in sorted(self.fetch_partitions(table).items()):
+                if next_month(month) > before:
+                    continue
+                with self.engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                    if archive_schema is None:
+                        connection.execute(text(f"DROP TABLE {name}"))
+                    else:
+                        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+                        connection.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+                detached.append(name)
+        return detached
+
+    def maintain_partitions(self, months_ahead: int = 3,
+                            retention_months: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        Create the partitions of the coming months, empty the default partitions and,
+        when a retention is given, archive the partitions older than it.
+
+        :param months_ahead: Number of months after the current one to create partitions for.
+        :param retention_months: Number of past months to keep, all of them if None.
+        :return: Names of the 'created' and 'detached' partitions.
+        """
+        today = date_type.today()
+        end = month_start(today)
+        for _ in range(months_ahead):
+            end = next_month(end)
+        created = self.create_partitions(today, end) + self.split_default_partitions()
+
+        detached = []
+        if retention_months is not None:
+            cutoff = month_start(today)
+            for _ in range(retention_months):
+                cutoff = month_start(cutoff - timedelta(days=1))
+            detached = self.detach_partitions(cutoff)
+        return {'created': created, 'detached': detached}
+
+    def refresh_weather_view(self, concurrently: bool = True):
+        """
+        Refresh the australian_meteorology_weather materialized view.
+        A concurrent refresh keeps the view readable while it is rebuilt.
+        """
+        with self.engine.connect() as connection:
+            connection.execute(text(
+                f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}"
+                f"{AustralianMeteorologyWeather.__tablename__}"))
+            connection.commit()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,107 @@
 import io
-import json
 import os
-from typing import Any, Optional
+from contextlib import contextmanager, asynccontextmanager
+from datetime import date
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Union
 
 import joblib
+import orjson
 import redis
+import redis.asyncio
+import zstandard
 from dotenv import load_dotenv
+from redis.client import Pipeline
+from redis.exceptions import LockError
+from redis.lock import Lock
 
 load_dotenv()
 
+# Serialized values from this size in bytes are compressed with zstd
+COMPRESSION_THRESHOLD = 1024
+# First bytes of a zstd frame, a JSON document never starts with them
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# Seconds a single-flight lock is held at most, and waited for at most
+LOCK_TIMEOUT = 10
+# Number of keys of each DEL command
+DELETE_BATCH_SIZE = 1000
 
-class RedisManager:
-    def __init__(self):
+# Key of the list of the cities served by the API
+CITIES_KEY = 'all_cities'
+
+
+def weather_key(city: str, day: Union[date, str]) -> str:
+    """
+    :param city: Name of the city.
+    :param day: Day of the weather data.
+    :return: Redis key of the weather of the city on that day.
+    """
+    return f"weather:{city}:{day}"
+
+
+# Expiration in seconds of all the keys, or of each key
+Expiration = Union[None, int, Dict[str, Optional[int]]]
+
+
+def key_expiration(expiration: Expiration, key: str) -> Optional[int]:
+    """ Expiration of a key, from the expiration of all the keys or of each key """
+    return expiration.get(key) if isinstance(expiration, dict) else expiration
+
+
+class BaseRedisManager:
+    """ Configuration and serialization shared by the Redis managers """
+
+    def __init__(self, compression_threshold: Optional[int] = COMPRESSION_THRESHOLD,
+                 compression_level: int = 3):
+        """
+        :param compression_threshold: Size in bytes from which serialized values are
+            compressed, None to never compress them.
+        :param compression_level: Level of the zstd compression.
+        """
         self.host = os.getenv('REDIS_HOST')
         self.port = os.getenv('REDIS_PORT')
         self.db = os.getenv('REDIS_DB')
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+
+    def serialize(self, value: Any) -> bytes:
+        """ Serialize a value to JSON with orjson, compressed with zstd if it is large """
+        data = orjson.dumps(value)
+        if self.compression_threshold is not None and len(data) >= self.compression_threshold:
+            return zstandard.compress(data, self.compression_level)
+        return data
+
+    @staticmethod
+    def deserialize(data: bytes) -> Any:
+        """ Deserialize a value serialized by serialize, compressed or not """
+        if data.startswith(ZSTD_MAGIC):
+            data = zstandard.decompress(data)
+        return orjson.loads(data)
+
+    def queue_set_hashes(self, pipeline, mappings: Dict[str, Dict[str, Any]],
+                         expiration: Expiration = None):
+        """ Queue the commands replacing hashes, with serialized field values, in a pipeline """
+        for key, mapping in mappings.items():
+            pipeline.delete(key)
+            pipeline.hset(key, mapping={field: self.serialize(value) for field, value in mapping.items()})
+            if key_expiration(expiration, key) is not None:
+                pipeline.expire(key, key_expiration(expiration, key))
+
+    def decode_hash(self, mapping: Dict[bytes, bytes]) -> Optional[Dict[str, Any]]:
+        """ Decode a hash read from Redis, None if it is missing """
+        if not mapping:
+            return None
+        return {field.decode(): self.deserialize(value) for field, value in mapping.items()}
+
+
+class RedisManager(BaseRedisManager):
+    def __init__(self, compression_threshold: Optional[int] = COMPRESSION_THRESHOLD,
+                 compression_level: int = 3):
+        """
+        :param compression_threshold: Size in bytes from which serialized values are
+            compressed, None to never compress them.
+        :param compression_level: Level of the zstd compression.
+        """
+        super().__init__(compression_threshold, compression_level)
         self.redis_client = redis.Redis(host=self.host, port=self.port, db=self.db)
 
     def health_check(self) -> bool:
@@ -24,22 +111,121 @@ class RedisManager:
         except redis.ConnectionError:
             return False
 
+    @contextmanager
+    def pipeline(self, transaction: bool = False) -> Iterator[Pipeline]:
+        """
+        Pipeline whose commands are sent in one round trip when the block exits
+        without error, and discarded otherwise.
+
+        :param transaction: Run the commands in a MULTI/EXEC transaction.
+        """
+        with self.redis_client.pipeline(transaction=transaction) as pipeline:
+            yield pipeline
+            pipeline.execute()
+
     def set(self, key: str, value: Any, expiration: Optional[int] = None):
         """Set a key-value pair in Redis"""
-        serialized_value = json.dumps(value)
-        self.redis_client.set(key, serialized_value, ex=expiration)
+        self.redis_client.set(key, self.serialize(value), ex=expiration)
 
     def get(self, key: str) -> Optional[Any]:
         """Get a value from Redis by key"""
         value = self.redis_client.get(key)
-        if value:
-            return json.loads(value)
-        return None
+        if value is None:
+            return None
+        return self.deserialize(value)
 
     def delete(self, key: str):
         """Delete a key from Redis"""
         self.redis_client.delete(key)
 
+    def delete_many(self, keys: List[str]):
+        """Delete several keys from Redis in one round trip"""
+        if not keys:
+            return
+        with self.pipeline() as pipeline:
+            for start in range(0, len(keys), DELETE_BATCH_SIZE):
+                pipeline.delete(*keys[start:start + DELETE_BATCH_SIZE])
+
+    def set_many(self, mapping: Dict[str, Any], expiration: Expiration = None):
+        """Set several key-value pairs in Redis in one round trip, expiring all or each key"""
+        if not mapping:
+            return
+        with self.pipeline() as pipeline:
+            for key, value in mapping.items():
+                pipeline.set(key, self.serialize(value), ex=key_expiration(expiration, key))
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values from Redis with one MGET, None for the missing ones"""
+        if not keys:
+            return []
+        return [None if value is None else self.deserialize(value)
+                for value in self.redis_client.mget(keys)]
+
+    def lock(self, key: str, timeout: int = LOCK_TIMEOUT) -> Lock:
+        """
+        Lock guarding the rebuild of a key, released automatically after timeout seconds
+        if its holder did not release it.
+        """
+        return self.redis_client.lock(f"lock:{key}", timeout=timeout)
+
+    def get_or_set(self, key: str, build: Callable[[], Any], expiration: Optional[int] = None,
+                   wait_timeout: float = LOCK_TIMEOUT) -> Any:
+        """
+        Get a value from Redis, building and setting it on a miss. Only one caller
+        builds a missing key at a time, the others wait for its lock and read the value
+        it set, or build it themselves if the lock is still held after wait_timeout seconds.
+
+        :param key: Key of the value.
+        :param build: Function building the value.
+        :param expiration: Expiration of the value in seconds.
+        :param wait_timeout: Maximum number of seconds to wait for the lock.
+        :return: The cached or built value.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock = self.lock(key)
+        acquired = lock.acquire(blocking_timeout=wait_timeout)
+        try:
+            # The previous holder of the lock may have set the value meanwhile
+            value = self.get(key)
+            if value is None:
+                value = build()
+                self.set(key, value, expiration=expiration)
+            return value
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except LockError:
+                    # The lock expired while building, another caller may hold it now
+                    pass
+
+    def set_hashes(self, mappings: Dict[str, Dict[str, Any]], expiration: Expiration = None):
+        """Set several hashes in Redis in one round trip, with serialized field values"""
+        if not mappings:
+            return
+        with self.pipeline() as pipeline:
+            self.queue_set_hashes(pipeline, mappings, expiration)
+
+    def set_hash(self, key: str, mapping: Dict[str, Any], expiration: Optional[int] = None):
+        """Set a hash in Redis, with serialized field values"""
+        self.set_hashes({key: mapping}, expiration=expiration)
+
+    def get_hashes(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Get several hashes from Redis in one round trip, None for the missing ones"""
+        if not keys:
+            return []
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hgetall(key)
+        return [self.decode_hash(mapping) for mapping in pipeline.execute()]
+
+    def get_hash(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a hash from Redis by key"""
+        return self.get_hashes([key])[0]
+
     def set_serializable_object(self, key: str, obj: Any, expiration: Optional[int] = None):
         """Set a serializable object in Redis"""
         obj_bytes = io.BytesIO()
@@ -55,5 +241,154 @@ class RedisManager:
         return joblib.load(io.BytesIO(obj_bytes))
 
 
+class AsyncRedisManager(BaseRedisManager):
+    """
+    Redis manager for asyncio code, such as the API handlers. Its commands are
+    awaited instead of blocking the event loop, over a connection pool shared by
+    all its callers.
+    """
+
+    def __init__(self, compression_threshold: Optional[int] = COMPRESSION_THRESHOLD,
+                 compression_level: int = 3, max_connections: Optional[int] = None):
+        """
+        :param compression_threshold: Size in bytes from which serialized values are
+            compressed, None to never compress them.
+        :param compression_level: Level of the zstd compression.
+        :param max_connections: Maximum number of connections of the pool.
+        """
+        super().__init__(compression_threshold, compression_level)
+        self.pool = redis.asyncio.ConnectionPool(host=self.host, port=self.port, db=self.db,
+                                                 max_connections=max_connections)
+        self.redis_client = redis.asyncio.Redis(connection_pool=self.pool)
+
+    async def health_check(self) -> bool:
+        """Perform a health check on the Redis connection"""
+        try:
+            return await self.redis_client.ping()
+        except redis.ConnectionError:
+            return False
+
+    async def close(self):
+        """Close the connections of the pool"""
+        await self.redis_client.aclose()
+        await self.pool.disconnect()
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncIterator[redis.asyncio.client.Pipeline]:
+        """
+        Pipeline whose commands are sent in one round trip when the block exits
+        without error, and discarded otherwise.
+
+        :param transaction: Run the commands in a MULTI/EXEC transaction.
+        """
+        async with self.redis_client.pipeline(transaction=transaction) as pipeline:
+            yield pipeline
+            await pipeline.execute()
+
+    async def set(self, key: str, value: Any, expiration: Optional[int] = None):
+        """Set a key-value pair in Redis"""
+        await self.redis_client.set(key, self.serialize(value), ex=expiration)
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a value from Redis by key"""
+        value = await self.redis_client.get(key)
+        if value is None:
+            return None
+        return self.deserialize(value)
+
+    async def delete(self, key: str):
+        """Delete a key from Redis"""
+        await self.redis_client.delete(key)
+
+    async def set_many(self, mapping: Dict[str, Any], expiration: Expiration = None):
+        """Set several key-value pairs in Redis in one round trip, expiring all or each key"""
+        if not mapping:
+            return
+        async with self.pipeline() as pipeline:
+            for key, value in mapping.items():
+                pipeline.set(key, self.serialize(value), ex=key_expiration(expiration, key))
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values from Redis with one MGET, None for the missing ones"""
+        if not keys:
+            return []
+        return [None if value is None else self.deserialize(value)
+                for value in await self.redis_client.mget(keys)]
+
+    def lock(self, key: str, timeout: int = LOCK_TIMEOUT) -> redis.asyncio.lock.Lock:
+        """
+        Lock guarding the rebuild of a key, released automatically after timeout seconds
+        if its holder did not release it.
+        """
+        return self.redis_client.lock(f"lock:{key}", timeout=timeout)
+
+    async def single_flight(self, key: str, lookup: Callable[[], Awaitable[Any]],
+                            build: Callable[[], Awaitable[Any]],
+                            wait_timeout: float = LOCK_TIMEOUT) -> Any:
+        """
+        Read a cache entry, rebuilding it on a miss in a single caller at a time.
+        The others wait for the lock of the entry and read the entry it set, or build
+        it themselves if the lock is still held after wait_timeout seconds.
+
+        :param key: Key of the lock.
+        :param lookup: Coroutine function reading the entry, None if it is missing.
+        :param build: Coroutine function building the entry and setting it in the cache.
+        :param wait_timeout: Maximum number of seconds to wait for the lock.
+        :return: The cached or built entry.
+        """
+        value = await lookup()
+        if value is not None:
+            return value
+
+        lock = self.lock(key)
+        acquired = await lock.acquire(blocking_timeout=wait_timeout)
+        try:
+            # The previous holder of the lock may have set the entry meanwhile
+            value = await lookup()
+            return value if value is not None else await build()
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except LockError:
+                    # The lock expired while building, another caller may hold it now
+                    pass
+
+    async def get_or_set(self, key: str, build: Callable[[], Awaitable[Any]],
+                         expiration: Optional[int] = None, wait_timeout: float = LOCK_TIMEOUT) -> Any:
+        """
+        Get a value from Redis, building and setting it on a miss in a single caller
+        at a time, see single_flight.
+
+        :param key: Key of the value.
+        :param build: Coroutine function building the value.
+        :param expiration: Expiration of the value in seconds.
+        :param wait_timeout: Maximum number of seconds to wait for the lock.
+        :return: The cached or built value.
+        """
+        async def build_and_set():
+            value = await build()
+            await self.set(key, value, expiration=expiration)
+            return value
+
+        return await self.single_flight(key, lambda: self.get(key), build_and_set, wait_timeout)
+
+    async def set_hashes(self, mappings: Dict[str, Dict[str, Any]], expiration: Expiration = None):
+        """Set several hashes in Redis in one round trip, with serialized field values"""
+        if not mappings:
+            return
+        async with self.pipeline() as pipeline:
+            self.queue_set_hashes(pipeline, mappings, expiration)
+
+    async def get_hashes(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Get several hashes from Redis in one round trip, None for the missing ones"""
+        if not keys:
+            return []
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hgetall(key)
+        return [self.decode_hash(mapping) for mapping in await pipeline.execute()]
+
+
 if __name__ == '__main__':
     redis_manager = RedisManager()
@@ -3,16 +3,23 @@
 python /app/preparation/city_from_openweather.py
 python /app/preparation/data_from_kaggle.py
 
-if [ ! -f /app/model/weather_prediction_model.joblib ] || [ ! -f /app/model/weather_label_encoder.joblib ]; then
+MODEL_DIR=/app/model
+
+if [ ! -f $MODEL_DIR/weather_prediction_model.joblib ] || [ ! -f $MODEL_DIR/weather_label_encoder.joblib ]; then
   python /app/preparation/train_model.py
-  timeout=300
-  while [ ! -f /app/model/weather_prediction_model.joblib ] || [ ! -f /app/model/weather_label_encoder.joblib ]; do
-      sleep 10
-      timeout=$((timeout - 10))
-      if [ $timeout -le 0 ]; then
-          exit 1
-      fi
-  done
+elif [ ! -f $MODEL_DIR/weather_compact_model.joblib ]; then
+  # Models trained before the compact artifact only need to be exported
+  python /app/utils/compact_model.py $MODEL_DIR
 fi
 
+timeout=300
+while [ ! -f $MODEL_DIR/weather_prediction_model.joblib ] || [ ! -f $MODEL_DIR/weather_label_encoder.joblib ] \
+  || [ ! -f $MODEL_DIR/weather_compact_model.joblib ]; do
+    sleep 10
+    timeout=$((timeout - 10))
+    if [ $timeout -le 0 ]; then
+        exit 1
+    fi
+done
+
 python /app/preparation/data_from_web_scrapping.py
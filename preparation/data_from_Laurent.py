@@ -1,72 +1,252 @@
-import json
+"""
+Streaming loader of the JSON Lines dumps of Laurent into MongoDB and the data warehouse.
+
+Lines are parsed and transformed in a background thread, in fixed-size batches,
+while the calling thread writes the previous batch: one bulk upsert into MongoDB
+and one multi-row insert into PostgreSQL per batch, the cities being resolved
+for the whole batch through the in-memory city index. Documents and rows already
+loaded by a previous run are updated or skipped, so the dumps can be loaded again.
+
+Usage:
+    python -m preparation.data_from_Laurent [batch_size]
+"""
+import logging
 import os
+import queue
+import sys
+import threading
+import time
+from datetime import date
+from itertools import islice
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Type
 
+import orjson
 from dotenv import load_dotenv
 
+from data_pipeline.cache_invalidation import CacheInvalidator
+from data_pipeline.feature_store import FeatureStore
 from database.mongodb_functools import MongoDBManager
 from database.postgresql_functools import PostgresManager, Weather, DailyWeather
+from utils.city_index import CityIndex
 from utils.openweather_functools import deg_to_cardinal, build_date_timestamp
 
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+QUEUE_SIZE = 4
+
+# Fields identifying a document of each dump in the datalake, so that reloads update them
+DAILY_WEATHER_KEY = ['lat', 'lon', 'date']
+TIMESTAMP_WEATHER_KEY = ['lat', 'lon', 'data.0.dt']
 
-def load_daily_weather(path, postgres, mongo):
-    with open(os.path.join(path, 'data', 'json', 'dataDailyAggregation.json'), 'r') as f:
+
+def iter_json_lines(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    :param file_path: Path of a JSON Lines file.
+    :return: Documents of the non-empty lines of the file.
+    """
+    with open(file_path, 'rb') as f:
         for line in f:
-            data = json.loads(line)
+            if line.strip():
+                yield orjson.loads(line)
 
-            mongo.insert_document('weather', data)
 
-            city_id = postgres.fetch_city_record_by_coord(
-                data['lat'],
-                data['lon']).id
+def iter_batches(iterable: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """
+    :param iterable: Items to group.
+    :param batch_size: Number of items of each batch, the last one may be smaller.
+    :return: Lists of consecutive items.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
 
-            weather = {'date': data['date'],
-                       'min_temp': data['temperature']['min'],
-                       'max_temp': data['temperature']['max'],
-                       'rainfall': data['precipitation']['total'],
-                       'wind_gust_dir': deg_to_cardinal(data['wind']['max']['direction']),
-                       'wind_gust_speed': data['wind']['max']['speed'],
-                       'city_id': city_id
-                       }
-            postgres.add_record(DailyWeather(**weather))
 
+def prefetch(iterable: Iterable[Any], queue_size: int = QUEUE_SIZE) -> Iterator[Any]:
+    """
+    Iterate over an iterable in a background thread, at most queue_size items ahead
+    of the consumer. Errors of the iterable are raised in the consumer, and the
+    thread stops when the consumer stops iterating.
+
+    :param iterable: Items to produce.
+    :param queue_size: Maximum number of items waiting for the consumer.
+    :return: Items of the iterable, in order.
+    """
+    items = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except Exception as e:
+            put((False, e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            has_item, item = items.get()
+            if not has_item:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def daily_weather_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """ Transform a document of dataDailyAggregation.json into a row of daily_weather """
+    return {'date': data['date'],
+            'min_temp': data['temperature']['min'],
+            'max_temp': data['temperature']['max'],
+            'rainfall': data['precipitation']['total'],
+            'wind_gust_dir': deg_to_cardinal(data['wind']['max']['direction']),
+            'wind_gust_speed': data['wind']['max']['speed'],
+            }
+
+
+def timestamp_weather_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """ Transform a document of dataWeatherTimeStamp.json into a row of weather """
+    current = data['data'][0]
+    return {'date': build_date_timestamp(timestamp=current['dt'],
+                                         timezone=3600,  # workaround
+                                         mode='datetime'),
+            'temp': current['temp'],
+            'sunrise': build_date_timestamp(timestamp=current['sunrise'],
+                                            timezone=data['timezone_offset'],
+                                            mode='hours'),
+            'sunset': build_date_timestamp(timestamp=current['sunset'],
+                                           timezone=data['timezone_offset'],
+                                           mode='hours'),
+            'wind_dir': deg_to_cardinal(current['wind_deg']),
+            'wind_speed': current['wind_speed'],
+            'cloud': current['clouds'],
+            'humidity': current['humidity'],
+            'pressure': current['pressure'],
+            }
+
+
+def parse_batches(file_path: str, transform: Callable[[Dict[str, Any]], Dict[str, Any]],
+                  batch_size: int = BATCH_SIZE) \
+        -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """
+    :param file_path: Path of a JSON Lines file.
+    :param transform: Function transforming a document into a row of the data warehouse.
+    :param batch_size: Number of lines of each batch.
+    :return: Batches of documents and of their rows, without their city.
+    """
+    for documents in iter_batches(iter_json_lines(file_path), batch_size):
+        yield documents, [transform(document) for document in documents]
 
-def load_timestamp_weather(path, postgres, mongo):
-    with open(os.path.join(path, 'data', 'json', 'dataWeatherTimeStamp.json'), 'r') as f:
-        for line in f:
-            data = json.loads(line)
-
-            mongo.insert_document('weather', data)
-
-            city_id = postgres.fetch_city_record_by_coord(
-                data['lat'],
-                data['lon']).id
-
-            weather = {'date': build_date_timestamp(timestamp=data['data'][0]['dt'],
-                                                    timezone=3600,  # workaround
-                                                    mode='datetime'),
-                       'temp': data['data'][0]['temp'],
-                       'sunrise': build_date_timestamp(timestamp=data['data'][0]['sunrise'],
-                                                       timezone=data['timezone_offset'],
-                                                       mode='hours'),
-                       'sunset': build_date_timestamp(timestamp=data['data'][0]['sunset'],
-                                                      timezone=data['timezone_offset'],
-                                                      mode='hours'),
-                       'wind_dir': deg_to_cardinal(data['data'][0]['wind_deg']),
-                       'wind_speed': data['data'][0]['wind_speed'],
-                       'cloud': data['data'][0]['clouds'],
-                       'humidity': data['data'][0]['humidity'],
-                       'pressure': data['data'][0]['pressure'],
-                       'city_id': city_id
-                       }
-            postgres.add_record(Weather(**weather))
+
+def load_batch(documents: List[Dict[str, Any]], rows: List[Dict[str, Any]], model: Type,
+               postgres: PostgresManager, mongo: MongoDBManager, city_index: CityIndex,
+               unique_fields: List[str]) -> int:
+    """
+    Write a batch of documents into MongoDB, upserted on their unique fields, and their
+    rows into the table of a model.
+
+    :return: Number of rows inserted into the data warehouse, the rows of a city and date
+        already in it are skipped.
+    """
+    mongo.bulk_upsert_documents('weather', documents, unique_fields, batch_size=len(documents))
+
+    city_ids = city_index.nearest_city_ids([document['lat'] for document in documents],
+                                           [document['lon'] for document in documents])
+    for row, city_id in zip(rows, city_ids):
+        row['city_id'] = int(city_id)
+
+    days = [row['date'][:10] for row in rows]
+    postgres.create_partitions(date.fromisoformat(min(days)), date.fromisoformat(max(days)),
+                               tables=[model.__tablename__])
+    # Rows of a city and date already loaded by a previous run are skipped
+    return postgres.bulk_upsert(model, rows, batch_size=len(rows),
+                                conflict_columns=['city_id', 'date'])['inserted']
+
+
+def stream_load(file_path: str, model: Type, transform: Callable[[Dict[str, Any]], Dict[str, Any]],
+                postgres: PostgresManager, mongo: MongoDBManager, city_index: CityIndex = None,
+                batch_size: int = BATCH_SIZE, parallel: bool = True,
+                unique_fields: List[str] = DAILY_WEATHER_KEY) -> Dict[str, float]:
+    """
+    Load a JSON Lines file into MongoDB and the table of a model, batch by batch.
+
+    :param file_path: Path of the JSON Lines file.
+    :param model: Model of the table to insert into.
+    :param transform: Function transforming a document into a row of the table.
+    :param postgres: PostgresManager of the data warehouse.
+    :param mongo: MongoDBManager of the raw documents.
+    :param city_index: Index of the cities, built from the data warehouse by default.
+    :param batch_size: Number of lines of each batch.
+    :param parallel: Parse the next batches in a background thread while loading.
+    :param unique_fields: Fields identifying a document in MongoDB, dotted for nested ones.
+    :return: Number of 'documents' read, of rows 'inserted', 'elapsed_seconds' and 'rows_per_second'.
+    """
+    if city_index is None:
+        # Every document belongs to its nearest city, however far it is
+        city_index = CityIndex(postgres, max_distance_km=float('inf'))
+
+    batches = parse_batches(file_path, transform, batch_size)
+    if parallel:
+        batches = prefetch(batches)
+
+    started_at = time.monotonic()
+    documents_count, inserted = 0, 0
+    for documents, rows in batches:
+        inserted += load_batch(documents, rows, model, postgres, mongo, city_index, unique_fields)
+        documents_count += len(documents)
+        logger.info(f"{os.path.basename(file_path)}: {documents_count} lines loaded")
+
+    elapsed = time.monotonic() - started_at
+    report = {'documents': documents_count,
+              'inserted': inserted,
+              'elapsed_seconds': round(elapsed, 2),
+              'rows_per_second': round(documents_count / elapsed, 1) if elapsed > 0 else 0.0}
+    logger.info(f"{os.path.basename(file_path)}: {report}")
+    return report
+
+
+def load_daily_weather(path, postgres, mongo, city_index=None, batch_size=BATCH_SIZE):
+    return stream_load(os.path.join(path, 'data', 'json', 'dataDailyAggregation.json'),
+                       DailyWeather, daily_weather_row, postgres, mongo, city_index, batch_size,
+                       unique_fields=DAILY_WEATHER_KEY)
+
+
+def load_timestamp_weather(path, postgres, mongo, city_index=None, batch_size=BATCH_SIZE):
+    return stream_load(os.path.join(path, 'data', 'json', 'dataWeatherTimeStamp.json'),
+                       Weather, timestamp_weather_row, postgres, mongo, city_index, batch_size,
+                       unique_fields=TIMESTAMP_WEATHER_KEY)
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     dir_path = Path(__file__).parents[1]
     load_dotenv()
     mongo_manager = MongoDBManager()
     postgres_manager = PostgresManager()
+    cities = CityIndex(postgres_manager, max_distance_km=float('inf'))
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else BATCH_SIZE
+
+    load_daily_weather(dir_path, postgres_manager, mongo_manager, cities, size)
+    load_timestamp_weather(dir_path, postgres_manager, mongo_manager, cities, size)
 
-    load_daily_weather(dir_path, postgres_manager, mongo_manager)
-    load_timestamp_weather(dir_path, postgres_manager, mongo_manager)
+    # Make the new data visible through the view, the feature store and the API cache
+    postgres_manager.refresh_weather_view()
+    feature_store = FeatureStore(postgres_manager)
+    feature_store.refresh()
+    CacheInvalidator(feature_store.redis_manager).invalidate_all()
@@ -1,63 +1,125 @@
+"""
+Loads the Kaggle weatherAUS.csv dataset into the data warehouse.
+
+The CSV is read block by block with the streaming pyarrow reader, keeping only
+the columns of the data warehouse with declared types, and each block is filtered
+on the locations before any pandas frame is built. The rows are then copied into the tables with COPY,
+through a temporary table skipping the cities and dates already loaded, as the script runs on every start.
+
+Usage:
+    python -m preparation.data_from_kaggle
+"""
+import logging
 import os
+import resource
+import time
 from pathlib import Path
 
-import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv
 from dotenv import load_dotenv
 
+from data_pipeline.cache_invalidation import CacheInvalidator, LoadedRanges
+from data_pipeline.feature_store import FeatureStore
 from database.postgresql_functools import PostgresManager
+from utils.city_index import CityIndex
 from utils.df_to_kaggle_format import transform_to_kaggle_format
 from utils.json_functools import load_from_json
 
+logger = logging.getLogger(__name__)
+
+# Columns of the CSV kept for the data warehouse, with their type and their name
+# in the data warehouse. RainToday and RainTomorrow are derived from the rainfall.
+KAGGLE_COLUMNS = {
+    'Date': (pa.date32(), 'date'),
+    'Location': (pa.string(), 'location'),
+    'MinTemp': (pa.float64(), 'min_temp'),
+    'MaxTemp': (pa.float64(), 'max_temp'),
+    'Rainfall': (pa.float64(), 'rainfall'),
+    'Evaporation': (pa.float64(), 'evaporation'),
+    'Sunshine': (pa.float64(), 'sunshine'),
+    'WindGustDir': (pa.string(), 'wind_gust_dir'),
+    'WindGustSpeed': (pa.float64(), 'wind_gust_speed'),
+    'WindDir9am': (pa.string(), 'wind_dir_9am'),
+    'WindDir3pm': (pa.string(), 'wind_dir_3pm'),
+    'WindSpeed9am': (pa.float64(), 'wind_speed_9am'),
+    'WindSpeed3pm': (pa.float64(), 'wind_speed_3pm'),
+    'Humidity9am': (pa.float64(), 'humidity_9am'),
+    'Humidity3pm': (pa.float64(), 'humidity_3pm'),
+    'Pressure9am': (pa.float64(), 'pressure_9am'),
+    'Pressure3pm': (pa.float64(), 'pressure_3pm'),
+    'Cloud9am': (pa.float64(), 'cloud_9am'),
+    'Cloud3pm': (pa.float64(), 'cloud_3pm'),
+    'Temp9am': (pa.float64(), 'temp_9am'),
+    'Temp3pm': (pa.float64(), 'temp_3pm'),
+}
+
+# Locations named differently in the dataset and in the data warehouse
+KAGGLE_LOCATIONS = {'Brisbane City': 'Brisbane'}
+
 
 def load_kaggle(locations, path):
-    df = pd.read_csv(os.path.join(path, 'data', 'csv', 'weatherAUS.csv')) \
-        .drop(columns=['RainToday', 'RainTomorrow']) \
-        .rename(columns={'Date': 'date',
-                         'Location': 'location',
-                         'MinTemp': 'min_temp',
-                         'MaxTemp': 'max_temp',
-                         'Rainfall': 'rainfall',
-                         'Evaporation': 'evaporation',
-                         'Sunshine': 'sunshine',
-                         'WindGustDir': 'wind_gust_dir',
-                         'WindGustSpeed': 'wind_gust_speed',
-                         'WindDir9am': 'wind_dir_9am',
-                         'WindDir3pm': 'wind_dir_3pm',
-                         'WindSpeed9am': 'wind_speed_9am',
-                         'WindSpeed3pm': 'wind_speed_3pm',
-                         'Humidity9am': 'humidity_9am',
-                         'Humidity3pm': 'humidity_3pm',
-                         'Pressure9am': 'pressure_9am',
-                         'Pressure3pm': 'pressure_3pm',
-                         'Cloud9am': 'cloud_9am',
-                         'Cloud3pm': 'cloud_3pm',
-                         'Temp9am': 'temp_9am',
-                         'Temp3pm': 'temp_3pm'}) \
-        .loc[lambda x: x['location'].isin(locations)] \
-        .replace('Brisbane', 'Brisbane City') \
-        .replace('NA', np.nan)
+    """
+    Reads the rows of weatherAUS.csv of some locations.
+
+    :param locations: Names of the locations to keep, as in the data warehouse.
+    :param path: Root directory of the project.
+    :return: Weather data in the Kaggle format, with the columns of the data warehouse.
+    """
+    names = {KAGGLE_LOCATIONS.get(location, location): location for location in locations}
+    location_names = pa.array(list(names))
+    reader = csv.open_csv(
+        os.path.join(path, 'data', 'csv', 'weatherAUS.csv'),
+        convert_options=csv.ConvertOptions(
+            include_columns=list(KAGGLE_COLUMNS),
+            column_types={column: column_type for column, (column_type, _) in KAGGLE_COLUMNS.items()},
+            null_values=['NA', ''],
+            strings_can_be_null=True))
+    # Filter each block as it is read, only the rows of the locations are kept in memory
+    table = pa.Table.from_batches(
+        [batch.filter(pc.is_in(batch.column('Location'), value_set=location_names))
+         for batch in reader],
+        schema=reader.schema)
+    df = table.rename_columns([KAGGLE_COLUMNS[column][1] for column in table.column_names]) \
+        .to_pandas(date_as_object=False)
+    df['location'] = df['location'].replace({name: location for name, location in names.items()
+                                             if name != location})
     return df
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     dir_path = Path(__file__).parents[1]
     load_dotenv()
     config = load_from_json(os.path.join(dir_path, 'config.json'))
-    locations_to_keep = config['locations']
-
-    # Workaround
-    locations_to_keep.remove('Brisbane City')
-    locations_to_keep.append('Brisbane')
+    started_at = time.perf_counter()
 
     postgres_manager = PostgresManager()
 
-    kaggle_weather_df = load_kaggle(locations_to_keep, dir_path)
+    kaggle_weather_df = load_kaggle(config['locations'], dir_path)
+    read_seconds = time.perf_counter() - started_at
 
     daily_weather, weather_9am, weather_3pm = (
         transform_to_kaggle_format(kaggle_weather_df, postgres_manager))
 
+    # Create the partitions of the loaded months, rows would land in the default one
+    postgres_manager.create_partitions(daily_weather['date'].min().date(),
+                                       daily_weather['date'].max().date())
+
     # Store the weather data to data warehouse
-    daily_weather.to_sql('daily_weather', postgres_manager.engine, if_exists='append', index=False)
-    weather_9am.to_sql('weather', postgres_manager.engine, if_exists='append', index=False)
-    weather_3pm.to_sql('weather', postgres_manager.engine, if_exists='append', index=False)
+    natural_key = ['city_id', 'date']
+    rows = postgres_manager.copy_dataframe(daily_weather, 'daily_weather', conflict_columns=natural_key)
+    rows += postgres_manager.copy_dataframe(weather_9am, 'weather', conflict_columns=natural_key)
+    rows += postgres_manager.copy_dataframe(weather_3pm, 'weather', conflict_columns=natural_key)
+    logger.info(f"{len(kaggle_weather_df)} days loaded as {rows} new rows: read in {read_seconds:.2f} s, "
+                f"loaded in {time.perf_counter() - started_at:.2f} s, "
+                f"peak memory {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    # Make the new data visible through the view, the feature store and the API cache
+    postgres_manager.refresh_weather_view()
+    feature_store = FeatureStore(postgres_manager)
+    feature_store.refresh(since=daily_weather['date'].min().date())
+    loaded = LoadedRanges()
+    loaded.add(daily_weather['city_id'], daily_weather['date'])
+    CacheInvalidator(feature_store.redis_manager).invalidate(loaded.by_city_name(CityIndex(postgres_manager)))
@@ -3,7 +3,9 @@ This script is used to scrape the Australian Bureau of Meteorology website
 """
 
 import re
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
 from itertools import product
 from typing import List
 from typing import Optional, Tuple
@@ -13,9 +15,17 @@ import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from lxml import html as lxml_html
 
-from database.postgresql_functools import PostgresManager
+from data_pipeline.cache_invalidation import CacheInvalidator, LoadedRanges
+from data_pipeline.feature_store import FeatureStore
+from database.postgresql_functools import PostgresManager, Weather, DailyWeather
+from utils.city_index import CityIndex
 from utils.df_to_kaggle_format import transform_to_kaggle_format
+from utils.http_client import HttpClient
+
+# Client shared by the single page requests, to reuse connections to the BoM website
+bom_client = HttpClient(calls_per_minute=120)
 
 
 def get_previous_month() -> str:
@@ -65,7 +75,7 @@ def fetch_page_content(url: str) -> Optional[BeautifulSoup]:
         or None if the request fails.
     """
     try:
-        response = requests.get(url, timeout=10)
+        response = bom_client.get(url, timeout=10)
         response.raise_for_status()  # Raise an exception for bad responses
         # Parse and return the HTML content
         bs = BeautifulSoup(response.content, 'lxml')
@@ -75,6 +85,40 @@ def fetch_page_content(url: str) -> Optional[BeautifulSoup]:
         return None
 
 
+def fetch_page_html(url: str, client: HttpClient) -> Optional[bytes]:
+    """
+    Fetches the raw HTML content from a given URL.
+
+    :param url: The URL from which to fetch the content.
+    :param client: Client shared between requests to reuse connections.
+    :returns: The raw HTML content, or None if the request fails.
+    """
+    try:
+        response = client.get(url, timeout=10)
+        response.raise_for_status()  # Raise an exception for bad responses
+        return response.content
+    except requests.RequestException as e:
+        # If request fails pass
+        return None
+
+
+def fetch_pages(urls: List[str], max_workers: int = 8,
+                requests_per_second: float = 2.0) -> List[Optional[bytes]]:
+    """
+    Fetches the HTML content of several URLs concurrently, over a shared client
+    with a rate limit per host.
+
+    :param urls: The URLs from which to fetch the content.
+    :param max_workers: Maximum number of requests in flight at the same time.
+    :param requests_per_second: Maximum number of requests per second sent to each host.
+    :returns: The raw HTML content of each URL, or None where the request failed.
+    """
+    with HttpClient(calls_per_minute=requests_per_second * 60,
+                    pool_maxsize=max_workers) as client:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda url: fetch_page_html(url, client), urls))
+
+
 def extract_simplified_information(html: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Extracts simplified location and date information from the HTML
@@ -95,6 +139,16 @@ def extract_simplified_information(html: str) -> Tuple[Optional[str], Optional[s
     return None, None  # Return a tuple of None if no match is found
 
 
+# Columns of the daily weather table of a BoM page
+COLUMNS = ['day', 'min_temp', 'max_temp', 'rainfall',
+           'evaporation', 'sunshine', 'wind_gust_dir',
+           'wind_gust_speed', 'wind_gust_time', 'temp_9am',
+           'humidity_9am', 'cloud_9am', 'wind_dir_9am',
+           'wind_speed_9am', 'pressure_9am', 'temp_3pm',
+           'humidity_3pm', 'cloud_3pm', 'wind_dir_3pm',
+           'wind_speed_3pm', 'pressure_3pm']
+
+
 def parse_html_content(soup: BeautifulSoup) -> pd.DataFrame:
     """
     Parses the HTML content with BeautifulSoup and extracts
@@ -129,15 +183,7 @@ def parse_html_content(soup: BeautifulSoup) -> pd.DataFrame:
     formatted_dates = [month_year_datetime.replace(day=int(day))
                        .strftime("%Y-%m-%d") for day in days]
 
-    # Define the columns for the DataFrame
-    columns = ['day', 'min_temp', 'max_temp', 'rainfall',
-               'evaporation', 'sunshine', 'wind_gust_dir',
-               'wind_gust_speed', 'wind_gust_time', 'temp_9am',
-               'humidity_9am', 'cloud_9am', 'wind_dir_9am',
-               'wind_speed_9am', 'pressure_9am', 'temp_3pm',
-               'humidity_3pm', 'cloud_3pm', 'wind_dir_3pm',
-               'wind_speed_3pm', 'pressure_3pm']
-    df = pd.DataFrame(data, columns=columns)
+    df = pd.DataFrame(data, columns=COLUMNS)
 
     # Drop unnecessary columns
     df.drop(['day', 'wind_gust_time'], axis=1, inplace=True)
@@ -148,22 +194,103 @@ def parse_html_content(soup: BeautifulSoup) -> pd.DataFrame:
     return df
 
 
-def aggregate_weather_data(urls: List[str]) -> pd.DataFrame:
+def parse_html_content_lxml(html: bytes) -> pd.DataFrame:
+    """
+    Parses the raw HTML content with lxml XPath queries and extracts the
+    weather data into a DataFrame, producing the same DataFrame as
+    `parse_html_content` several times faster.
+
+    :param html: Raw HTML content of the page.
+    :return: DataFrame containing the extracted weather data.
+    :raise ValueError: If the table cells do not fit the expected columns.
+    """
+    tree = lxml_html.fromstring(html)
+
+    # Extract the page header to get location and date information
+    header = tree.xpath('//div[contains(concat(" ", @class, " "), " content ")]//h1')[0]
+    location, date = extract_simplified_information(
+        lxml_html.tostring(header, encoding='unicode'))
+
+    # Pull the day indexes and every cell of the table body at once
+    rows = tree.xpath('//table[contains(concat(" ", @class, " "), " data ")]/tbody/tr')
+    days = np.array([int(row.findtext('th')) for row in rows])
+    cells = np.array([cell.text_content() for row in rows for cell in row.iterfind('td')],
+                     dtype=object)
+
+    # Empty cells are missing values, and a 'Calm' wind spans its direction and speed
+    cells[cells == '\xa0'] = np.nan
+    cells = np.insert(cells, np.flatnonzero(cells == 'Calm') + 1, -1)
+    if cells.size != len(rows) * len(COLUMNS):
+        raise ValueError(f"Unexpected table layout for {location} {date}")
+
+    df = pd.DataFrame(cells.reshape(len(rows), len(COLUMNS)).tolist(), columns=COLUMNS)
+
+    # Drop unnecessary columns
+    df.drop(['day', 'wind_gust_time'], axis=1, inplace=True)
+
+    # Offset the first day of the month by the day indexes
+    month_start = datetime.strptime(date, "%B %Y")
+    df['date'] = (pd.Timestamp(month_start) + pd.to_timedelta(days - 1, unit='D')) \
+        .strftime("%Y-%m-%d").tolist()
+    df['location'] = location
+
+    return df
+
+
+def parse_page(html: bytes, parser: str = 'lxml') -> pd.DataFrame:
+    """
+    Parses the raw HTML content of a page into a DataFrame of weather data.
+
+    :param html: Raw HTML content of the page.
+    :param parser: 'lxml' for the XPath parser, 'bs4' for the BeautifulSoup parser.
+    :return: DataFrame containing the extracted weather data.
+    :raise NotImplementedError: If the parser is neither 'lxml' nor 'bs4'.
+    """
+    if parser == 'lxml':
+        return parse_html_content_lxml(html)
+    elif parser == 'bs4':
+        return parse_html_content(BeautifulSoup(html, 'lxml'))
+    else:
+        raise NotImplementedError
+
+
+def parse_pages(pages: List[bytes], max_workers: Optional[int] = None,
+                parser: str = 'lxml') -> pd.DataFrame:
+    """
+    Parses the raw HTML content of several pages in a pool of processes
+    and concatenates the weather data once.
+
+    :param pages: Raw HTML content of the pages.
+    :param max_workers: Number of processes, defaults to the number of CPUs.
+    :param parser: 'lxml' for the XPath parser, 'bs4' for the BeautifulSoup parser.
+    :return: Aggregated DataFrame containing weather data from all pages.
+    """
+    if not pages:
+        return pd.DataFrame()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(partial(parse_page, parser=parser), pages, chunksize=8))
+    return pd.concat(frames, ignore_index=True)
+
+
+def aggregate_weather_data(urls: List[str], max_workers: int = 8,
+                           parse_workers: Optional[int] = None,
+                           requests_per_second: float = 2.0,
+                           parser: str = 'lxml') -> pd.DataFrame:
     """
     Aggregates weather data from multiple URLs into a single DataFrame.
+    Pages are fetched concurrently under a per-host rate limit, then parsed
+    in a pool of processes.
 
     :param urls: List of URLs to fetch and parse weather data from.
+    :param max_workers: Maximum number of requests in flight at the same time.
+    :param parse_workers: Number of parsing processes, defaults to the number of CPUs.
+    :param requests_per_second: Maximum number of requests per second sent to each host.
+    :param parser: 'lxml' for the XPath parser, 'bs4' for the BeautifulSoup parser.
     :return: Aggregated DataFrame containing weather data from all specified URLs.
     """
-    aggregated_df = pd.DataFrame()
-    for url in urls:
-        soup = fetch_page_content(url)
-        if soup:
-            # Extract weather data into a DataFrame
-            df_temp = parse_html_content(soup)
-            aggregated_df = pd.concat([aggregated_df, df_temp],
-                                      ignore_index=True)
-    return aggregated_df
+    pages = fetch_pages(urls, max_workers=max_workers, requests_per_second=requests_per_second)
+    return parse_pages([page for page in pages if page], max_workers=parse_workers,
+                       parser=parser)
 
 
 def scrap_weather_data(dates_to_scrape: List[str]) -> None:
@@ -194,10 +321,23 @@ def scrap_weather_data(dates_to_scrape: List[str]) -> None:
     daily_weather, weather_9am, weather_3pm = transform_to_kaggle_format(weather_scrapped,
                                                                          postgres)
 
-    # Store the weather data to data warehouse
-    daily_weather.to_sql('daily_weather', postgres.engine, if_exists='append', index=False)
-    weather_9am.to_sql('weather', postgres.engine, if_exists='append', index=False)
-    weather_3pm.to_sql('weather', postgres.engine, if_exists='append', index=False)
+    # Create the partitions of the loaded months, rows would land in the default one
+    postgres.create_partitions(daily_weather['date'].min().date(),
+                               daily_weather['date'].max().date())
+
+    # Store the weather data to data warehouse, the months scraped again replace
+    # the rows of their cities and dates
+    for model, df in ((DailyWeather, daily_weather), (Weather, weather_9am), (Weather, weather_3pm)):
+        postgres.bulk_upsert(model, df.astype(object).where(df.notna(), None).to_dict('records'),
+                             update=True)
+
+    # Make the new data visible through the view, the feature store and the API cache
+    postgres.refresh_weather_view()
+    feature_store = FeatureStore(postgres)
+    feature_store.refresh(since=daily_weather['date'].min().date())
+    loaded = LoadedRanges()
+    loaded.add(daily_weather['city_id'], daily_weather['date'])
+    CacheInvalidator(feature_store.redis_manager).invalidate(loaded.by_city_name(CityIndex(postgres)))
 
 
 if __name__ == '__main__':
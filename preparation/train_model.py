@@ -1,50 +1,150 @@
+import glob
+import logging
 import os
+import sys
+import time
 import warnings
 from pathlib import Path
-from typing import Tuple, List, Any
+from typing import Tuple, List, Any, Optional, Iterator, Dict
 
 import joblib
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
+from scipy.stats import randint
+from sqlalchemy import text, Float, String
 from sklearn.compose import ColumnTransformer
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
 from sklearn.impute import SimpleImputer
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import HalvingRandomSearchCV, RandomizedSearchCV
 from imblearn.over_sampling import RandomOverSampler
 from imblearn.pipeline import Pipeline as ImbPipeline
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, LabelEncoder
 
-from database.postgresql_functools import PostgresManager
+from data_pipeline.feature_store import FeatureStore
+from database.postgresql_functools import PostgresManager, WeatherFeatures
 from database.redis_functools import RedisManager
+from utils.compact_model import save_compact_model
+from utils.features import FEATURE_COLUMNS, TARGET_COLUMN
 
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
 
-def load_data(postgres: PostgresManager) -> pd.DataFrame:
+TRAINING_MODES = ('full', 'search', 'warm')
+
+# Search space of the hyperparameter search over the model pipeline
+PARAM_DISTRIBUTIONS = {
+    'classifier__n_estimators': randint(100, 400),
+    'classifier__max_depth': [None, 10, 20, 30],
+    'classifier__min_samples_split': randint(2, 20),
+    'classifier__min_samples_leaf': randint(1, 10),
+    'classifier__max_features': ['sqrt', 'log2'],
+}
+
+
+def downcast_chunk(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Load weather data from the PostgreSQL database.
+    Reduce the memory footprint of a chunk of feature vectors.
 
-    :param postgres: PostgresManager object for database connection.
-    :return: Raw weather data.
+    :param df: Chunk of the weather_features table.
+    :return: Chunk with float32 numbers, categorical strings and datetime dates.
     """
-    df = pd.read_sql_table('australian_meteorology_weather', postgres.engine)
-    df = df.drop(columns=['id'])
-    df = df.drop_duplicates()
-    df.columns = [str(col) for col in df.columns]
+    df = df.drop(columns=['id', 'updated_at'])
+    df['date'] = pd.to_datetime(df['date'])
+    # Use the declared column types, a chunk may hold only NULLs for a column
+    for column in WeatherFeatures.__table__.columns:
+        if column.name not in df.columns or column.name == 'date':
+            continue
+        if isinstance(column.type, Float):
+            df[column.name] = df[column.name].astype('float32')
+        elif isinstance(column.type, String):
+            df[column.name] = df[column.name].astype('category')
     return df
 
 
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
+def concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate chunks of weather data, keeping categorical columns categorical
+    even when their categories differ between chunks.
+
+    :param chunks: Chunks of downcast weather data.
+    :return: Concatenated weather data.
+    """
+    chunks = [chunk for chunk in chunks if not chunk.empty]
+    if not chunks:
+        return pd.DataFrame()
+    categorical_columns = chunks[0].select_dtypes(include=['category']).columns
+    for col in categorical_columns:
+        categories = sorted(set().union(*(chunk[col].cat.categories for chunk in chunks)))
+        for chunk in chunks:
+            chunk[col] = chunk[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def stream_features(postgres: PostgresManager, since: Optional[str] = None,
+                    chunksize: int = 50000) -> Iterator[pd.DataFrame]:
     """
-    Preprocess the weather data by creating target variables.
+    Stream the feature vectors of the feature store with a server-side cursor.
 
-    :param df: Raw weather data.
-    :return: Preprocessed weather data
+    :param postgres: PostgresManager object for database connection.
+    :param since: Only stream the days from this date (YYYY-MM-DD).
+    :param chunksize: Number of rows fetched at once.
+    :return: Iterator over downcast chunks of feature vectors.
     """
-    df['rain_today'] = df['rainfall'].apply(lambda x: 'yes' if x >= 1 else 'no')
-    df['rain_tomorrow'] = df['rain_today'].shift(-1).apply(lambda x: 'yes' if x == 'yes' else 'no')
-    df = df.dropna(subset=['rain_today', 'rain_tomorrow'])
+    query = f"SELECT * FROM {WeatherFeatures.__tablename__}"
+    params = {}
+    if since is not None:
+        query += ' WHERE date >= :since'
+        params['since'] = since
+    query += ' ORDER BY location, date'
+
+    with postgres.engine.connect().execution_options(stream_results=True,
+                                                     max_row_buffer=chunksize) as connection:
+        for chunk in pd.read_sql_query(text(query), connection, params=params,
+                                       chunksize=chunksize):
+            yield downcast_chunk(chunk)
+
+
+def load_data(postgres: PostgresManager, chunksize: int = 50000,
+              snapshot_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Load the feature vectors of the feature store.
+
+    When a snapshot directory is given, the data is cached as a Parquet snapshot
+    named after the max date it contains, and only the days from that date
+    are read from the database on the next load. The last day of the snapshot is
+    read again, as its target is only known once the next day is loaded.
+
+    :param postgres: PostgresManager object for database connection.
+    :param chunksize: Number of rows fetched at once.
+    :param snapshot_dir: Directory of the Parquet snapshot, no snapshot if None.
+    :return: Feature vectors and targets.
+    """
+    chunks, snapshot_path = [], None
+    since = None
+    if snapshot_dir is not None:
+        snapshots = sorted(glob.glob(os.path.join(snapshot_dir, 'features_snapshot_*.parquet')))
+        if snapshots:
+            snapshot_path = snapshots[-1]
+            since = Path(snapshot_path).stem.replace('features_snapshot_', '')
+            chunks.append(pd.read_parquet(snapshot_path))
+
+    chunks.extend(stream_features(postgres, since=since, chunksize=chunksize))
+    df = concat_chunks(chunks).drop_duplicates(subset=['location', 'date'], keep='last',
+                                               ignore_index=True)
+    df.columns = [str(col) for col in df.columns]
+
+    if snapshot_dir is not None and not df.empty:
+        max_date = df['date'].max().strftime('%Y-%m-%d')
+        new_snapshot_path = os.path.join(snapshot_dir, f"features_snapshot_{max_date}.parquet")
+        if new_snapshot_path != snapshot_path:
+            df.to_parquet(new_snapshot_path, index=False)
+            if snapshot_path is not None:
+                os.remove(snapshot_path)
     return df
 
 
@@ -55,7 +155,7 @@ def get_column_types(df: pd.DataFrame) -> Tuple[List[str], List[str]]:
     :param df: Input features.
     :return: Tuple of numerical and categorical column names
     """
-    numerical_columns = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
+    numerical_columns = df.select_dtypes(include=['number']).columns.tolist()
     categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
     return numerical_columns, categorical_columns
 
@@ -88,11 +188,12 @@ def create_preprocessor(numerical_columns: List[str],
     return preprocessor
 
 
-def create_model_pipeline(preprocessor: ColumnTransformer) -> ImbPipeline:
+def create_model_pipeline(preprocessor: ColumnTransformer, n_jobs: Optional[int] = -1) -> ImbPipeline:
     """
     Create the full model pipeline including preprocessor and classifier.
 
     :param preprocessor: Preprocessor for the data.
+    :param n_jobs: Number of cores fitting the trees, all of them if -1.
     :return: Full model pipeline.
     """
     return ImbPipeline([
@@ -102,26 +203,121 @@ def create_model_pipeline(preprocessor: ColumnTransformer) -> ImbPipeline:
             max_depth=None,
             min_samples_leaf=4,
             min_samples_split=9,
-            n_estimators=161
+            n_estimators=161,
+            n_jobs=n_jobs
         ))
     ])
 
 
+def search_model(pipeline: ImbPipeline, X: pd.DataFrame, y: pd.Series, strategy: str = 'halving',
+                 n_candidates: int = 20, cv: int = 3, n_jobs: int = -1) -> Tuple[ImbPipeline, Dict]:
+    """
+    Search the hyperparameters of the model pipeline, fitting the candidates in
+    parallel on a pool of processes, then refit the best one on all the data.
+
+    :param pipeline: Model pipeline whose hyperparameters are searched.
+    :param X: Features.
+    :param y: Encoded target.
+    :param strategy: 'halving' to evaluate the candidates on growing samples of
+        the data and keep the best ones at each round, 'random' to evaluate every
+        candidate on all the data.
+    :param n_candidates: Number of hyperparameter sets drawn, the budget of the search.
+    :param cv: Number of cross-validation folds.
+    :param n_jobs: Number of processes, all the cores if -1.
+    :return: Best model pipeline and its hyperparameters and cross-validated F1 score.
+    :raise ValueError: If the strategy is unknown.
+    """
+    # The candidates are fitted in parallel, each of them on a single core
+    pipeline.set_params(classifier__n_jobs=1)
+    if strategy == 'halving':
+        search = HalvingRandomSearchCV(pipeline, PARAM_DISTRIBUTIONS, n_candidates=n_candidates,
+                                       factor=3, cv=cv, scoring='f1', n_jobs=n_jobs,
+                                       random_state=0)
+    elif strategy == 'random':
+        search = RandomizedSearchCV(pipeline, PARAM_DISTRIBUTIONS, n_iter=n_candidates, cv=cv,
+                                    scoring='f1', n_jobs=n_jobs, random_state=0)
+    else:
+        raise ValueError(f"Unknown search strategy: {strategy}")
+
+    search.fit(X, y)
+    return search.best_estimator_, {'params': search.best_params_, 'cv_f1': float(search.best_score_)}
+
+
+def warm_start_model(pipeline: ImbPipeline, X: pd.DataFrame, y: pd.Series,
+                     n_estimators: int = 50, n_jobs: int = -1) -> ImbPipeline:
+    """
+    Add trees fitted on new data to a fitted model pipeline. The preprocessor is
+    left as fitted, so that the existing trees keep reading the same inputs.
+
+    :param pipeline: Fitted model pipeline.
+    :param X: New features.
+    :param y: New encoded target.
+    :param n_estimators: Number of trees added.
+    :param n_jobs: Number of cores fitting the trees, all of them if -1.
+    :return: The model pipeline with the added trees.
+    :raise ValueError: If the new data does not hold every class of the model.
+    """
+    classifier = pipeline.named_steps['classifier']
+    if set(np.unique(y)) != set(classifier.classes_):
+        raise ValueError('The new data does not hold every class of the model')
+
+    X_resampled, y_resampled = pipeline.named_steps['sampler'].fit_resample(
+        pipeline.named_steps['preprocessor'].transform(X), y)
+    classifier.set_params(warm_start=True, n_estimators=classifier.n_estimators + n_estimators,
+                          n_jobs=n_jobs)
+    classifier.fit(X_resampled, y_resampled)
+    classifier.set_params(warm_start=False)
+    return pipeline
+
+
+def split_holdout(df: pd.DataFrame, holdout_days: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split the last days of the data off to evaluate the model on.
+
+    :param df: Feature vectors and targets.
+    :param holdout_days: Number of last days held out.
+    :return: Tuple of the training data and the held out data.
+    """
+    if df.empty or holdout_days <= 0:
+        return df, df.iloc[:0]
+    cutoff = df['date'].max() - pd.Timedelta(days=holdout_days)
+    return df[df['date'] <= cutoff], df[df['date'] > cutoff]
+
+
+def evaluate_model(pipeline: ImbPipeline, X: pd.DataFrame, y: pd.Series) -> Dict[str, float]:
+    """
+    :param pipeline: Fitted model pipeline.
+    :param X: Features.
+    :param y: Encoded target, 1 for rain.
+    :return: Accuracy, precision, recall, F1 and ROC AUC of the model.
+    """
+    if X.empty:
+        return {}
+    predictions = pipeline.predict(X)
+    metrics = {'accuracy': accuracy_score(y, predictions),
+               'precision': precision_score(y, predictions, zero_division=0),
+               'recall': recall_score(y, predictions, zero_division=0),
+               'f1': f1_score(y, predictions, zero_division=0)}
+    if len(np.unique(y)) > 1:
+        metrics['roc_auc'] = roc_auc_score(y, pipeline.predict_proba(X)[:, 1])
+    return {name: float(value) for name, value in metrics.items()}
+
+
 def save_model(ser_obj: Any, path: str, redis_manager: RedisManager, redis_key: str) -> None:
     """
-    Save the model or encoder.
+    Save the model or encoder, then bump its version key.
 
     :param ser_obj: Model or encoder to save.
     :param path: Path to save the model or encoder.
     :param redis_manager: RedisManager for saving to Redis.
-    :param redis_key: Key to use when saving to Redis.
+    :param redis_key: Key of the version in Redis.
     :raise Exception: If an error occurs while saving.
     """
     try:
         joblib.dump(ser_obj, path)
 
         try:
-            redis_manager.set_serializable_object(redis_key, ser_obj, expiration=86400)
+            redis_manager.set(f"{redis_key}:version", time.time_ns())
         except Exception as e:
             raise Exception(f"An error occurred while saving to Redis: {str(e)}")
 
@@ -129,46 +325,114 @@ def save_model(ser_obj: Any, path: str, redis_manager: RedisManager, redis_key:
         raise Exception(f"An error occurred while saving: {str(e)}")
 
 
-def train_model() -> None:
+def train_model(mode: str = 'full', holdout_days: int = 30, strategy: str = 'halving',
+                n_candidates: int = 20, warm_start_estimators: int = 50) -> Dict[str, Any]:
     """
     Main function to orchestrate the model training process.
+
+    The last days of the data are held out to evaluate the model, they are
+    learned by the next warm start.
+
+    :param mode: 'full' to fit the model from scratch, 'search' to search its
+        hyperparameters first, 'warm' to add trees fitted on the days learned
+        since the last training to the current model.
+    :param holdout_days: Number of last days held out to evaluate the model.
+    :param strategy: Strategy of the hyperparameter search, 'halving' or 'random'.
+    :param n_candidates: Number of hyperparameter sets drawn by the search.
+    :param warm_start_estimators: Number of trees added by a warm start.
+    :return: Summary of the run, with its duration and the model metrics.
+    :raise ValueError: If the mode is unknown.
     """
+    if mode not in TRAINING_MODES:
+        raise ValueError(f"Unknown training mode: {mode}")
+    start = time.perf_counter()
     load_dotenv()
     root_path = os.getenv('ROOT_PATH', Path(__file__).resolve().parents[1])
+    label_path = os.path.join(root_path, 'model', 'weather_label_encoder.joblib')
+    model_path = os.path.join(root_path, 'model', 'weather_prediction_model.joblib')
 
     # Database connection
     postgres = PostgresManager()
     redis = RedisManager()
 
-    # Load and preprocess data
-    df = load_data(postgres)
-    df = preprocess_data(df)
-
-    # Prepare data for training
-    X = df.drop(['rain_tomorrow', 'date'], axis=1)
-    y = df['rain_tomorrow']
-
-    # Get column types
-    numerical_columns, categorical_columns = get_column_types(X)
-
-    # Create preprocessor and model pipeline
-    preprocessor = create_preprocessor(numerical_columns, categorical_columns)
-    pipeline = create_model_pipeline(preprocessor)
-
-    # Encode target variable
-    target_le = LabelEncoder()
-    y = pd.Series(target_le.fit_transform(y))
-
-    # Train model
-    pipeline.fit(X, y)
-
-    # Save the label encoder and the model
-    label_path = os.path.join(root_path, 'model', 'weather_label_encoder.joblib')
+    trained_until = None
+    if mode == 'warm' and os.path.exists(model_path) and os.path.exists(label_path):
+        pipeline, target_le = joblib.load(model_path), joblib.load(label_path)
+        trained_until = getattr(pipeline, 'trained_until_', None)
+    if mode == 'warm' and trained_until is None:
+        logger.warning('No model trained on known days to warm start, fitting one from scratch')
+        mode = 'full'
+
+    # Load the feature vectors, only the ones of the days learned since the last
+    # training for a warm start, building them on the first training
+    snapshot_dir = os.path.join(root_path, 'model')
+    if mode == 'warm':
+        since = (trained_until + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        df = concat_chunks(list(stream_features(postgres, since=since)))
+    else:
+        df = load_data(postgres, snapshot_dir=snapshot_dir)
+        if df.empty and FeatureStore(postgres, redis).refresh():
+            df = load_data(postgres, snapshot_dir=snapshot_dir)
+
+    # Prepare data for training, the target of the last day of each city is not known yet
+    df = df.dropna(subset=[TARGET_COLUMN])
+    train, holdout = split_holdout(df, holdout_days)
+    if train.empty:
+        logger.info('No new data to train the model on')
+        return {'mode': mode, 'rows': 0}
+    if mode == 'warm' and set(train[TARGET_COLUMN]) != set(target_le.classes_):
+        # Trees fitted on a single class would skew the forest, fit it on all the days instead
+        logger.warning('The days learned since the last training do not hold every class, '
+                       'fitting the model from scratch')
+        mode = 'full'
+        df = load_data(postgres, snapshot_dir=snapshot_dir).dropna(subset=[TARGET_COLUMN])
+        train, holdout = split_holdout(df, holdout_days)
+    X, X_holdout = train[FEATURE_COLUMNS], holdout[FEATURE_COLUMNS]
+
+    summary = {'mode': mode, 'rows': len(train)}
+    if mode == 'warm':
+        y = pd.Series(target_le.transform(train[TARGET_COLUMN]))
+        pipeline = warm_start_model(pipeline, X, y, n_estimators=warm_start_estimators)
+    else:
+        # Get column types
+        numerical_columns, categorical_columns = get_column_types(X)
+
+        # Create preprocessor and model pipeline
+        preprocessor = create_preprocessor(numerical_columns, categorical_columns)
+        pipeline = create_model_pipeline(preprocessor)
+
+        # Encode target variable
+        target_le = LabelEncoder()
+        y = pd.Series(target_le.fit_transform(train[TARGET_COLUMN]))
+
+        # Train model
+        if mode == 'search':
+            pipeline, search_summary = search_model(pipeline, X, y, strategy=strategy,
+                                                    n_candidates=n_candidates)
+            summary.update(search_summary)
+        else:
+            pipeline.fit(X, y)
+
+    # Predictions serve a few rows at a time, a pool of workers would only add latency
+    pipeline.set_params(classifier__n_jobs=None)
+    pipeline.trained_until_ = train['date'].max()
+    summary['n_estimators'] = pipeline.named_steps['classifier'].n_estimators
+    summary['metrics'] = evaluate_model(pipeline, X_holdout,
+                                        pd.Series(target_le.transform(holdout[TARGET_COLUMN])))
+
+    # Save the label encoder and the model, kept for the next warm start,
+    # then the compact artifact of both served by the API
     save_model(target_le, label_path, redis, 'weather_label_encoder')
-
-    model_path = os.path.join(root_path, 'model', 'weather_prediction_model.joblib')
     save_model(pipeline, model_path, redis, 'weather_prediction_model')
+    save_compact_model(pipeline, target_le,
+                       os.path.join(root_path, 'model', 'weather_compact_model.joblib'))
+    redis.set('weather_compact_model:version', time.time_ns())
+
+    summary['duration'] = time.perf_counter() - start
+    logger.info("Training run: %s", summary)
+    return summary
 
 
 if __name__ == '__main__':
-    train_model()
+    logging.basicConfig(level=logging.INFO)
+    train_model(sys.argv[1] if len(sys.argv) > 1 else 'full')
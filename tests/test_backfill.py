@@ -0,0 +1,19 @@
+import unittest
+
+from database.postgresql_functools import month_ranges
+
+
+class TestMonthRanges(unittest.TestCase):
+    def test_partial_months_are_clamped_to_the_range(self):
+        self.assertListEqual(month_ranges('2023-01-15', '2023-03-10'),
+                             [('2023-01-15', '2023-02-01'),
+                              ('2023-02-01', '2023-03-01'),
+                              ('2023-03-01', '2023-03-11')])
+
+    def test_range_within_a_month(self):
+        self.assertListEqual(month_ranges('2023-12-05', '2023-12-31'),
+                             [('2023-12-05', '2024-01-01')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from preparation.data_from_web_scrapping import parse_html_content, parse_html_content_lxml
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'bom' / 'IDCJDW2801.202401.shtml'
+
+
+class TestBomParser(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.html = FIXTURE.read_bytes()
+        cls.expected = parse_html_content(BeautifulSoup(cls.html, 'lxml'))
+
+    def test_lxml_parser_matches_beautifulsoup_parser(self):
+        pd.testing.assert_frame_equal(parse_html_content_lxml(self.html), self.expected)
+
+    def test_calm_wind_shifts_speed_column(self):
+        df = parse_html_content_lxml(self.html)
+        calm_day = df.loc[df['date'] == '2024-01-11'].iloc[0]
+        self.assertEqual(calm_day['wind_dir_9am'], 'Calm')
+        self.assertEqual(calm_day['wind_speed_9am'], -1)
+        self.assertEqual(calm_day['wind_dir_3pm'], 'Calm')
+        self.assertEqual(calm_day['wind_speed_3pm'], -1)
+
+    def test_header_and_missing_values(self):
+        df = parse_html_content_lxml(self.html)
+        self.assertEqual(len(df), 31)
+        self.assertTrue((df['location'] == 'Canberra').all())
+        self.assertEqual(df['date'].iloc[-1], '2024-01-31')
+        self.assertTrue(df['evaporation'].isna().all())
+        self.assertIs(df.loc[df['date'] == '2024-01-07', 'rainfall'].iloc[0], np.nan)
+
+
+if __name__ == '__main__':
+    unittest.main()
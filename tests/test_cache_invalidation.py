@@ -0,0 +1,22 @@
+import unittest
+from datetime import date
+
+from data_pipeline.cache_invalidation import LoadedRanges
+
+
+class TestLoadedRanges(unittest.TestCase):
+    def test_ranges_are_merged_by_city(self):
+        loaded = LoadedRanges()
+        loaded.add([2, 2, 3], ['2024-06-03', '2024-06-01T09:00:00', '2024-06-05'])
+        loaded.add([2], [date(2024, 6, 7)])
+        self.assertDictEqual(loaded.ranges, {2: (date(2024, 6, 1), date(2024, 6, 7)),
+                                             3: (date(2024, 6, 5), date(2024, 6, 5))})
+
+    def test_records_without_city_or_date_are_ignored(self):
+        loaded = LoadedRanges()
+        loaded.add_records([{'name': 'Perth'}, {'city_id': 4, 'date': '2024-06-02'}])
+        self.assertDictEqual(loaded.ranges, {4: (date(2024, 6, 2), date(2024, 6, 2))})
+
+
+if __name__ == '__main__':
+    unittest.main()
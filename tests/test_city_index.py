@@ -0,0 +1,62 @@
+import unittest
+from types import SimpleNamespace
+
+from utils.city_index import CityIndex
+
+
+class FakePostgresManager:
+    def __init__(self, cities):
+        self.cities = cities
+        self.fetch_count = 0
+
+    def fetch_city_table_signature(self):
+        return str([(city.id, city.latitude, city.longitude) for city in self.cities])
+
+    def fetch_table(self, table):
+        self.fetch_count += 1
+        return list(self.cities)
+
+
+def make_city(city_id, name, latitude, longitude):
+    return SimpleNamespace(id=city_id, name=name, latitude=latitude, longitude=longitude)
+
+
+class TestCityIndex(unittest.TestCase):
+    def setUp(self):
+        self.postgres = FakePostgresManager([
+            make_city(1, 'Canberra', -35.2975906, 149.1012676),
+            make_city(2, 'Sydney', -33.8698439, 151.2082848),
+            make_city(3, 'Melbourne', -37.8142454, 144.9631732),
+        ])
+        self.index = CityIndex(self.postgres, max_distance_km=50)
+
+    def test_nearest_city_uses_haversine_distance(self):
+        # Closer to Canberra in distance, but closer to Sydney in latitude alone
+        self.assertEqual(self.index.nearest_city_id(-34.9, 149.3), 1)
+        self.assertEqual(self.index.nearest_city_id(-33.87, 151.21), 2)
+
+    def test_nearest_city_ids_keeps_order(self):
+        city_ids = self.index.nearest_city_ids([-37.81, -35.29, -33.86], [144.96, 149.10, 151.20])
+        self.assertListEqual(city_ids.tolist(), [3, 1, 2])
+
+    def test_location_beyond_max_distance_raises(self):
+        with self.assertRaises(LookupError):
+            self.index.nearest_city_id(-12.46, 130.84)
+
+    def test_city_names(self):
+        self.assertListEqual(self.index.city_names([2, 1, 2]), ['Sydney', 'Canberra', 'Sydney'])
+        with self.assertRaises(LookupError):
+            self.index.city_names([4])
+
+    def test_index_is_rebuilt_only_when_cities_change(self):
+        self.index.nearest_city_id(-35.29, 149.10)
+        self.index.refresh()
+        self.assertEqual(self.postgres.fetch_count, 1)
+
+        self.postgres.cities.append(make_city(4, 'Darwin', -12.46, 130.84))
+        self.assertEqual(self.index.nearest_city_id(-12.46, 130.84), 4)
+        self.assertEqual(self.postgres.fetch_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from preparation.train_model import create_preprocessor, create_model_pipeline, get_column_types
+from utils.compact_model import CompactModel, save_compact_model
+
+
+def make_features(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'location': rng.choice(['Sydney', 'Darwin', 'Canberra'], rows).astype(object),
+        'humidity_3pm': np.where(rng.random(rows) < 0.1, np.nan, rng.uniform(20, 100, rows)),
+        'pressure_3pm': rng.normal(1015, 5, rows),
+        'sunshine': np.full(rows, np.nan),
+        'wind_dir_3pm': rng.choice(['N', 'E', 'S', 'W'], rows).astype(object),
+    })
+
+
+class TestCompactModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        X = make_features(2000)
+        y = np.where(X['humidity_3pm'].fillna(50) > 60, 'yes', 'no')
+        cls.label_encoder = LabelEncoder()
+        cls.pipeline = create_model_pipeline(create_preprocessor(*get_column_types(X)), n_jobs=1)
+        cls.pipeline.set_params(classifier__n_estimators=20)
+        cls.pipeline.fit(X, cls.label_encoder.fit_transform(y))
+
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'weather_compact_model.joblib')
+        save_compact_model(cls.pipeline, cls.label_encoder, path)
+        cls.model = CompactModel.load(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_predictions_match_the_pipeline(self):
+        X = make_features(300, seed=1)
+        np.testing.assert_allclose(self.model.predict_proba(X), self.pipeline.predict_proba(X),
+                                   atol=1e-6)
+        self.assertListEqual(self.model.predict(X).tolist(),
+                             self.label_encoder.inverse_transform(self.pipeline.predict(X)).tolist())
+
+    def test_unknown_and_missing_values_are_handled_like_the_pipeline(self):
+        X = make_features(4, seed=2)
+        X.loc[0, 'location'] = 'Perth'
+        X.loc[1, 'wind_dir_3pm'] = None
+        X.loc[2, 'pressure_3pm'] = np.nan
+        self.assertListEqual(self.model.predict(X).tolist(),
+                             self.label_encoder.inverse_transform(self.pipeline.predict(X)).tolist())
+
+    def test_columns_missing_in_training_are_dropped(self):
+        self.assertNotIn('sunshine', self.model.numerical_columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
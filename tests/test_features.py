@@ -0,0 +1,51 @@
+import unittest
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils.features import build_features, feature_key, features_frame, FEATURE_COLUMNS
+
+
+class TestFeatures(unittest.TestCase):
+    def test_build_features_sets_rain_today_and_rain_tomorrow(self):
+        df = pd.DataFrame({'location': ['Sydney'] * 3,
+                           'date': pd.date_range('2024-06-01', periods=3),
+                           'rainfall': [0.2, 3.0, np.nan]})
+        df = build_features(df)
+        self.assertListEqual(df['rain_today'].tolist(), ['no', 'yes', 'no'])
+        self.assertListEqual(df['rain_tomorrow'].tolist()[:2], ['yes', 'no'])
+        self.assertTrue(pd.isna(df['rain_tomorrow'].iloc[2]))
+        self.assertIsInstance(df['rain_today'].dtype, pd.CategoricalDtype)
+
+    def test_build_features_shifts_within_each_city(self):
+        df = pd.DataFrame({'location': ['Sydney', 'Darwin', 'Darwin', 'Sydney'],
+                           'date': [date(2024, 6, 2), date(2024, 6, 1),
+                                    date(2024, 6, 2), date(2024, 6, 1)],
+                           'rainfall': [5.0, 0.0, 0.0, 0.0]})
+        df = build_features(df)
+        self.assertListEqual(df['location'].tolist(), ['Darwin', 'Darwin', 'Sydney', 'Sydney'])
+        # The last day of Darwin does not take the first day of Sydney as next day
+        self.assertListEqual(df['rain_tomorrow'].isna().tolist(), [False, True, False, True])
+        self.assertListEqual(df['rain_tomorrow'].dropna().tolist(), ['no', 'yes'])
+
+    def test_build_features_leaves_target_missing_after_a_gap(self):
+        df = pd.DataFrame({'location': ['Sydney'] * 2,
+                           'date': [date(2024, 6, 1), date(2024, 6, 3)],
+                           'rainfall': [0.0, 5.0]})
+        self.assertTrue(build_features(df)['rain_tomorrow'].isna().all())
+
+    def test_features_frame_keeps_feature_columns_only(self):
+        frame = features_frame([{'location': 'Sydney', 'rainfall': None, 'rain_today': 'no',
+                                 'date': '2024-06-01'}])
+        self.assertListEqual(frame.columns.tolist(), FEATURE_COLUMNS)
+        self.assertTrue(np.isnan(frame.loc[0, 'rainfall']))
+        self.assertEqual(frame['min_temp'].dtype, np.float64)
+        self.assertEqual(frame.loc[0, 'rain_today'], 'no')
+
+    def test_feature_key(self):
+        self.assertEqual(feature_key('Sydney', date(2024, 6, 1)), 'features:Sydney:2024-06-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
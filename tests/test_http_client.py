@@ -0,0 +1,97 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.http_client import HttpClient, parse_retry_after
+from utils.rate_limiter import TokenBucket
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """ Answers 429 then 503 before succeeding, and counts the requests """
+    statuses = []
+    requests_count = 0
+    retry_after = '0'
+
+    def do_GET(self):
+        type(self).requests_count += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', self.retry_after)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FlakyHandler.requests_count = 0
+
+    def test_retries_on_429_and_5xx(self):
+        FlakyHandler.statuses = [429, 503]
+        with HttpClient(backoff_factor=0.01) as client:
+            response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FlakyHandler.requests_count, 3)
+
+    def test_returns_last_response_when_retries_are_exhausted(self):
+        FlakyHandler.statuses = [503, 503, 503]
+        with HttpClient(max_retries=1, backoff_factor=0.01) as client:
+            response = client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(FlakyHandler.requests_count, 2)
+        FlakyHandler.statuses = []
+
+    def test_long_retry_after_is_not_waited(self):
+        FlakyHandler.statuses, FlakyHandler.retry_after = [429], '120'
+        with HttpClient(max_backoff=1) as client:
+            start = time.monotonic()
+            response = client.get(self.url)
+        FlakyHandler.retry_after = '0'
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(FlakyHandler.requests_count, 1)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_rate_limit_per_host(self):
+        FlakyHandler.statuses = []
+        with HttpClient(calls_per_minute=600) as client:
+            start = time.monotonic()
+            for _ in range(3):
+                client.get(self.url)
+            # The calls of a minute can be sent at once
+            self.assertLess(time.monotonic() - start, 0.1)
+            self.assertEqual(client.rate_limiters[f"127.0.0.1:{self.server.server_address[1]}"]
+                             .capacity, 600)
+
+    def test_token_bucket_waits_once_empty(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        # Two tokens are available immediately, then one every 0.1 s
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from datetime import date
+
+from database.redis_functools import RedisManager, ZSTD_MAGIC, key_expiration, weather_key
+
+
+class TestRedisSerialization(unittest.TestCase):
+    def setUp(self):
+        self.redis_manager = RedisManager(compression_threshold=256)
+
+    def test_small_values_are_plain_json(self):
+        data = self.redis_manager.serialize({'name': 'Sydney', 'id': 2})
+        self.assertEqual(data, b'{"name":"Sydney","id":2}')
+        self.assertEqual(self.redis_manager.deserialize(data), {'name': 'Sydney', 'id': 2})
+
+    def test_large_values_are_compressed(self):
+        value = [{'date': '2024-06-01', 'rainfall': 1.5, 'humidity_3pm': None}] * 100
+        data = self.redis_manager.serialize(value)
+        self.assertTrue(data.startswith(ZSTD_MAGIC))
+        self.assertLess(len(data), 256)
+        self.assertEqual(self.redis_manager.deserialize(data), value)
+
+    def test_compression_can_be_disabled(self):
+        redis_manager = RedisManager(compression_threshold=None)
+        self.assertFalse(redis_manager.serialize(list(range(1000))).startswith(ZSTD_MAGIC))
+
+    def test_key_expiration(self):
+        self.assertEqual(key_expiration(60, 'all_cities'), 60)
+        self.assertEqual(key_expiration({'all_cities': 60}, 'all_cities'), 60)
+        self.assertIsNone(key_expiration({'all_cities': 60}, 'weather:Sydney:2024-06-01'))
+
+    def test_weather_key(self):
+        self.assertEqual(weather_key('Sydney', date(2024, 6, 1)), 'weather:Sydney:2024-06-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from utils.response_cache import ResponseCache, endpoint_ttl
+
+BASE_URL = 'https://api.openweathermap.org/'
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.directory.name, 'cache.sqlite'))
+
+    def tearDown(self):
+        self.cache.connection.close()
+        self.directory.cleanup()
+
+    def test_key_ignores_api_key_and_parameter_order(self):
+        url = f"{BASE_URL}data/2.5/weather?appid=abc&lat=1&lon=2"
+        self.cache.set(url, {'temp': 20})
+        self.assertEqual(self.cache.get(f"{BASE_URL}data/2.5/weather?lon=2&lat=1&appid=xyz"),
+                         {'temp': 20})
+        self.assertIsNone(self.cache.get(f"{BASE_URL}data/2.5/weather?lat=1&lon=3"))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'entries': 1})
+
+    def test_current_weather_expires(self):
+        url = f"{BASE_URL}data/2.5/weather?lat=1&lon=2"
+        self.cache.set(url, {'temp': 20})
+        with mock.patch('utils.response_cache.time.time', return_value=time.time() + 3600):
+            self.assertIsNone(self.cache.get(url))
+
+    def test_history_is_immutable_once_settled(self):
+        self.assertIsNone(endpoint_ttl(f"{BASE_URL}data/3.0/onecall/day_summary?date=2020-01-01"))
+        self.assertIsNone(endpoint_ttl(f"{BASE_URL}data/3.0/onecall/timemachine?dt=1577869200"))
+        recent = int(time.time())
+        self.assertEqual(endpoint_ttl(f"{BASE_URL}data/3.0/onecall/timemachine?dt={recent}"), 3600)
+        self.assertEqual(endpoint_ttl(f"{BASE_URL}data/2.5/forecast?lat=1"), 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_entries = 2
+        urls = [f"{BASE_URL}data/3.0/onecall/day_summary?date=2020-01-0{day}" for day in (1, 2, 3)]
+        self.cache.set(urls[0], {})
+        self.cache.set(urls[1], {})
+        self.cache.get(urls[0])
+        self.cache.set(urls[2], {})
+        self.cache._evict()
+        self.assertIsNotNone(self.cache.get(urls[0]))
+        self.assertIsNone(self.cache.get(urls[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from database.mongodb_functools import document_key
+from preparation.data_from_Laurent import iter_batches, prefetch, parse_batches, daily_weather_row, \
+    TIMESTAMP_WEATHER_KEY
+
+
+def failing_items():
+    yield 1
+    raise RuntimeError('corrupted line')
+
+
+class TestStreamingLoader(unittest.TestCase):
+    def test_iter_batches(self):
+        self.assertListEqual(list(iter_batches(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_prefetch_keeps_the_order(self):
+        self.assertListEqual(list(prefetch(range(100), queue_size=2)), list(range(100)))
+
+    def test_prefetch_raises_the_errors_of_the_producer(self):
+        items = prefetch(failing_items())
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(RuntimeError):
+            next(items)
+
+    def test_parse_batches(self):
+        line = (b'{"lat": -35.3, "lon": 149.1, "date": "2023-01-02", '
+                b'"temperature": {"min": 8.5, "max": 21.0}, "precipitation": {"total": 1.2}, '
+                b'"wind": {"max": {"speed": 9.3, "direction": 180}}}\n')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'daily.json')
+            with open(path, 'wb') as f:
+                f.write(line * 3 + b'\n')
+            batches = list(parse_batches(path, daily_weather_row, batch_size=2))
+        self.assertListEqual([len(documents) for documents, _ in batches], [2, 1])
+        self.assertDictEqual(batches[1][1][0], {'date': '2023-01-02', 'min_temp': 8.5, 'max_temp': 21.0,
+                                                'rainfall': 1.2, 'wind_gust_dir': 'S',
+                                                'wind_gust_speed': 9.3})
+
+    def test_document_key_of_nested_fields(self):
+        document = {'lat': -35.3, 'lon': 149.1, 'timezone_offset': 36000, 'data': [{'dt': 1262304000}]}
+        self.assertDictEqual(document_key(document, TIMESTAMP_WEATHER_KEY),
+                             {'lat': -35.3, 'lon': 149.1, 'data.0.dt': 1262304000})
+        self.assertDictEqual(document_key({'lat': -35.3}, TIMESTAMP_WEATHER_KEY), {'lat': -35.3})
+
+
+if __name__ == '__main__':
+    unittest.main()
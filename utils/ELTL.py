@@ -8,9 +8,10 @@ from dotenv import load_dotenv
 from database.mongodb_functools import MongoDBManager
 from database.postgresql_functools import PostgresManager, Base, City, Weather, DailyWeather, \
     AirPollution
+from utils.city_index import CityIndex
 from utils.json_functools import load_from_json
-from utils.openweather_functools import request_api, extract_lat_lon, build_date_timestamp, \
-    deg_to_cardinal
+from utils.openweather_functools import request_api_concurrently, extract_lat_lon, \
+    build_date_timestamp, deg_to_cardinal
 
 
 class OpenWeatherAPI(ABC):
@@ -21,6 +22,7 @@ class OpenWeatherAPI(ABC):
 
     datalake_manager = MongoDBManager()
     data_warehouse_manager = PostgresManager()
+    city_index = CityIndex(data_warehouse_manager)
 
     @abstractmethod
     def __init__(self):
@@ -32,16 +34,23 @@ class OpenWeatherAPI(ABC):
         self.collection_name: str = ''
         self.unique_fields: List[str] = []
         self.table_name = Base
+        # Maximum number of API requests in flight and timeout of each request in seconds
+        self.max_workers: int = int(os.getenv('OPENWEATHER_MAX_WORKERS', '10'))
+        self.request_timeout: float = float(os.getenv('OPENWEATHER_REQUEST_TIMEOUT', '10'))
+        # Number of records sent in each batch to the datalake and the data warehouse
+        self.batch_size: int = 1000
 
-    def url_builder(self) -> str:
+    def url_builder(self, params: Optional[Dict[str, Union[str, int, float]]] = None) -> str:
         """
         Constructs a URL with given base URL, endpoint, and parameters.
 
+        :param params: Parameters overriding the ones of the manager for this URL only.
         :return: The complete URL with parameters.
         """
         url = f"{self.base_url}{self.endpoint}?"
         param_str = "&".join(
-            [f"{key}={value}" for key, value in self.params.items() if value is not None])
+            [f"{key}={value}" for key, value in {**self.params, **(params or {})}.items()
+             if value is not None])
         return url + param_str
 
     @abstractmethod
@@ -73,6 +82,21 @@ class OpenWeatherAPI(ABC):
         except Exception as e:
             raise e
 
+    def load_batch_to_datalake(self, data: List[Dict]):
+        """
+        Loads a batch of raw data to the MongoDB datalake, upserting on the
+        unique fields if any.
+
+        :param data: The raw data to be loaded.
+        """
+        if self.unique_fields:
+            self.datalake_manager.bulk_upsert_documents(self.collection_name, data,
+                                                        self.unique_fields,
+                                                        batch_size=self.batch_size)
+        else:
+            self.datalake_manager.bulk_insert_documents(self.collection_name, data,
+                                                        batch_size=self.batch_size)
+
     def load_to_data_warehouse(self, data: Dict):
         """
         Loads the structured data to the PostgresSQL data warehouse.
@@ -84,6 +108,20 @@ class OpenWeatherAPI(ABC):
         except Exception as e:
             raise e
 
+    def load_batch_to_data_warehouse(self, data: List[Dict],
+                                     commit: bool = True) -> Dict[str, int]:
+        """
+        Loads a batch of structured data to the PostgresSQL data warehouse
+        in a single transaction.
+
+        :param data: The structured data to be loaded.
+        :param commit: Commit the transaction, or leave it open for the caller.
+        :return: Number of 'inserted', 'updated' and 'skipped' records.
+        """
+        return self.data_warehouse_manager.bulk_upsert(self.table_name, data,
+                                                       batch_size=self.batch_size,
+                                                       commit=commit)
+
 
 class OpenWeatherCity(OpenWeatherAPI):
     def __init__(self):
@@ -100,11 +138,13 @@ class OpenWeatherCity(OpenWeatherAPI):
         self.table_name = City
 
     def extract_data(self) -> List[Dict]:
-        data = []
+        urls = []
         for city in self.locations:
             self.params['q'] = f"{city},{self.country_code}"
-            data.append(request_api(self.url_builder())[0])
-        return data
+            urls.append(self.url_builder())
+        responses = request_api_concurrently(urls, max_workers=self.max_workers,
+                                             timeout=self.request_timeout)
+        return [response[0] for response in responses]
 
     def transform_data(self, data: Dict) -> Dict:
         return {
@@ -125,12 +165,13 @@ class OpenWeatherByCities(OpenWeatherAPI):
         self.latitudes, self.longitudes = extract_lat_lon(cities_info)
 
     def extract_data(self) -> List[Dict]:
-        data = []
+        urls = []
         for lat, lon in zip(self.latitudes, self.longitudes):
             self.params['lat'] = lat
             self.params['lon'] = lon
-            data.append(request_api(self.url_builder()))
-        return data
+            urls.append(self.url_builder())
+        return request_api_concurrently(urls, max_workers=self.max_workers,
+                                        timeout=self.request_timeout)
 
     def get_city_id(self, latitude: float, longitude: float) -> int:
         """
@@ -141,7 +182,7 @@ class OpenWeatherByCities(OpenWeatherAPI):
         :param longitude: The longitude of the location.
         :return: The city ID corresponding to the provided coordinates.
         """
-        city_id = self.data_warehouse_manager.fetch_city_record_by_coord(latitude, longitude).id
+        city_id = self.city_index.nearest_city_id(latitude, longitude)
         return city_id
 
     @abstractmethod
@@ -292,6 +333,7 @@ class OpenWeatherDailyAirPollution(OpenWeatherByCities):
 
     def transform_data(self, data: Dict) -> List[Dict]:
         structured_data = []
+        city_id = self.get_city_id(data['coord']['lat'], data['coord']['lon'])
         for i in range(len(data['list'])):
             structured_data.append({
                 'date': build_date_timestamp(data['list'][i]['dt'],
@@ -305,7 +347,7 @@ class OpenWeatherDailyAirPollution(OpenWeatherByCities):
                 'pm25_concentration': data['list'][i]['components']['pm2_5'],
                 'pm10_concentration': data['list'][i]['components']['pm10'],
                 'nh3_concentration': data['list'][i]['components']['nh3'],
-                'city_id': self.get_city_id(data['coord']['lat'], data['coord']['lon'])
+                'city_id': city_id
             })
         return structured_data
 
@@ -357,5 +399,17 @@ class OpenWeatherDailyAirPollution(OpenWeatherByCities):
         :param data: The structured data to be loaded.
         """
         formatted_datas = self.transform_data_to_multiple_dicts(data)
-        for formatted_data in formatted_datas:
-            self.datalake_manager.insert_document(self.collection_name, formatted_data)
+        self.datalake_manager.bulk_insert_documents(self.collection_name, formatted_datas,
+                                                    batch_size=self.batch_size)
+
+    def load_batch_to_datalake(self, data: List[Dict]):
+        """
+        Loads a batch of raw data to the MongoDB datalake.
+
+        :param data: The raw data to be loaded.
+        """
+        formatted_datas = []
+        for data_dict in data:
+            formatted_datas.extend(self.transform_data_to_multiple_dicts(data_dict))
+        self.datalake_manager.bulk_insert_documents(self.collection_name, formatted_datas,
+                                                    batch_size=self.batch_size)
@@ -1,6 +1,6 @@
 import os
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Any
 
 import requests
 from dotenv import load_dotenv
@@ -44,6 +44,25 @@ def get_data(base_url: str, endpoint: str, token: str, params: Dict[str, str]) -
         raise Exception(f"Failed to get data: {response.status_code} - {response.text}")
 
 
+def post_data(base_url: str, endpoint: str, token: str, payload: Any) -> Dict:
+    """
+    Post data to the API
+
+    :param base_url: The base URL of the API
+    :param endpoint: The endpoint to post data to
+    :param token: The token to authenticate with
+    :param payload: The JSON body to send to the endpoint
+    :return: The data from the endpoint
+    """
+    headers = {'Authorization': f"Bearer {token}"}
+
+    response = requests.post(f"{base_url}/{endpoint}", headers=headers, json=payload)
+    if response.status_code == 200:
+        return response.json()
+    else:
+        raise Exception(f"Failed to post data: {response.status_code} - {response.text}")
+
+
 if __name__ == '__main__':
     load_dotenv()
     base_url = f"http://{os.getenv('API_HOST')}:{os.getenv('API_PORT')}"
@@ -0,0 +1,128 @@
+"""
+This module contains an in-memory spatial index of the cities of the data warehouse
+"""
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from database.postgresql_functools import City
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class CityIndex:
+    """
+    Nearest city lookup over haversine distance, backed by a ball tree built
+    from the city table. The tree is built lazily on the first lookup and
+    rebuilt only when the content of the city table changes.
+    """
+
+    def __init__(self, postgres, max_distance_km: float = 50.0):
+        """
+        :param postgres: PostgresManager used to read the city table.
+        :param max_distance_km: Maximum distance in kilometers between a
+            coordinate and its nearest city.
+        """
+        self.postgres = postgres
+        self.max_distance_km = max_distance_km
+        self._lock = threading.Lock()
+        self._signature: Optional[str] = None
+        # (ball tree, city ids, city names) swapped as a whole on refresh
+        self._index = (None, np.empty(0, dtype=np.int64), [])
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuilds the index if the city table changed since the last build.
+
+        :param force: Rebuild the index even if the city table did not change.
+        :return: True if the index was rebuilt.
+        """
+        with self._lock:
+            signature = self.postgres.fetch_city_table_signature()
+            if not force and self._signature is not None and signature == self._signature:
+                return False
+
+            cities = self.postgres.fetch_table(City)
+            city_ids = np.array([city.id for city in cities], dtype=np.int64)
+            city_names = [city.name for city in cities]
+            tree = None
+            if cities:
+                coordinates = np.radians([[city.latitude, city.longitude] for city in cities])
+                tree = BallTree(coordinates, metric='haversine')
+
+            self._index = (tree, city_ids, city_names)
+            self._signature = signature
+            return True
+
+    def nearest_city_ids(self, latitudes: Sequence[float],
+                         longitudes: Sequence[float]) -> np.ndarray:
+        """
+        Finds the nearest city of each coordinate.
+
+        :param latitudes: The latitudes of the locations.
+        :param longitudes: The longitudes of the locations.
+        :return: The IDs of the nearest cities.
+        :raise LookupError: If no city lies within the maximum distance of a location.
+        """
+        if self._signature is None:
+            self.refresh()
+
+        coordinates = np.radians(np.column_stack([latitudes, longitudes]).astype(float))
+        city_ids, distances = self._query(coordinates)
+
+        # A location far from every known city may belong to a city added since the last build
+        if np.any(distances > self.max_distance_km) and self.refresh():
+            city_ids, distances = self._query(coordinates)
+
+        too_far = distances > self.max_distance_km
+        if np.any(too_far):
+            index = int(np.argmax(too_far))
+            raise LookupError(f"No city within {self.max_distance_km} km of "
+                              f"({latitudes[index]}, {longitudes[index]})")
+        return city_ids
+
+    def nearest_city_id(self, latitude: float, longitude: float) -> int:
+        """
+        Finds the nearest city of a coordinate.
+
+        :param latitude: The latitude of the location.
+        :param longitude: The longitude of the location.
+        :return: The ID of the nearest city.
+        :raise LookupError: If no city lies within the maximum distance of the location.
+        """
+        return int(self.nearest_city_ids([latitude], [longitude])[0])
+
+    def city_names(self, city_ids: Sequence[int]) -> List[str]:
+        """
+        Finds the names of cities from their IDs.
+
+        :param city_ids: The IDs of the cities.
+        :return: The names of the cities.
+        :raise LookupError: If an ID is not in the city table.
+        """
+        if self._signature is None:
+            self.refresh()
+
+        names = self._names_by_id()
+        # An unknown ID may belong to a city added since the last build
+        if any(int(city_id) not in names for city_id in city_ids) and self.refresh():
+            names = self._names_by_id()
+
+        unknown = [int(city_id) for city_id in city_ids if int(city_id) not in names]
+        if unknown:
+            raise LookupError(f"Unknown city IDs: {unknown}")
+        return [names[int(city_id)] for city_id in city_ids]
+
+    def _names_by_id(self):
+        _, city_ids, city_names = self._index
+        return dict(zip(city_ids.tolist(), city_names))
+
+    def _query(self, coordinates: np.ndarray):
+        tree, city_ids, _ = self._index
+        if tree is None or len(coordinates) == 0:
+            return (np.empty(len(coordinates), dtype=np.int64),
+                    np.full(len(coordinates), np.inf))
+        distances, indexes = tree.query(coordinates, k=1)
+        return city_ids[indexes[:, 0]], distances[:, 0] * EARTH_RADIUS_KM
@@ -0,0 +1,180 @@
+"""
+This module contains the compact inference artifact of the rain prediction model:
+the parameters of the preprocessor and the forest compiled to flat NumPy arrays,
+read by a predictor that only needs NumPy and pandas
+"""
+import os
+import sys
+from typing import Any, Dict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+
+def export_compact_model(pipeline: Any, label_encoder: Any) -> Dict[str, Any]:
+    """
+    Compile a fitted model pipeline of train_model to a compact artifact.
+
+    The preprocessor must impute then scale the numerical columns, and impute then
+    one-hot encode the categorical ones. The nodes of all the trees are laid out
+    one tree after the other, the children pointing to global node indices.
+
+    :param pipeline: Fitted pipeline of a ColumnTransformer and a random forest.
+    :param label_encoder: Fitted encoder of the target.
+    :return: Artifact of the model, a dictionary of arrays.
+    :raise ValueError: If the preprocessor does not have the expected steps.
+    """
+    preprocessor = pipeline.named_steps['preprocessor']
+    forest = pipeline.named_steps['classifier']
+    try:
+        numerical = preprocessor.named_transformers_['num']
+        categorical = preprocessor.named_transformers_['cat']
+        numerical_imputer, scaler = numerical.named_steps['imputer'], numerical.named_steps['scaler']
+        categorical_imputer, encoder = categorical.named_steps['imputer'], categorical.named_steps['onehot']
+    except (KeyError, AttributeError) as e:
+        raise ValueError(f"Unexpected preprocessor of the model: {e}")
+    columns = {name: list(columns) for name, _, columns in preprocessor.transformers_}
+
+    # The imputers drop the columns missing in all the training rows
+    medians = np.asarray(numerical_imputer.statistics_, dtype=np.float64)
+    numerical_kept = ~np.isnan(medians)
+    fills = np.asarray(categorical_imputer.statistics_, dtype=object)
+    categorical_kept = ~pd.isna(fills)
+
+    categories = []
+    for index, column_categories in enumerate(encoder.categories_):
+        drop = encoder.drop_idx_[index] if encoder.drop_idx_ is not None else None
+        categories.append(np.asarray([category for position, category in enumerate(column_categories)
+                                      if position != drop], dtype=object))
+
+    children_left, children_right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        internal = tree.children_left != -1
+        children_left.append(np.where(internal, tree.children_left + offset, -1))
+        children_right.append(np.where(internal, tree.children_right + offset, -1))
+        feature.append(tree.feature)
+        threshold.append(tree.threshold)
+        leaf_value = tree.value[:, 0, :]
+        value.append(leaf_value / leaf_value.sum(axis=1, keepdims=True))
+        roots.append(offset)
+        offset += tree.node_count
+
+    return {
+        'format_version': FORMAT_VERSION,
+        'numerical_columns': [column for column, kept in zip(columns['num'], numerical_kept) if kept],
+        'medians': medians[numerical_kept],
+        'means': np.asarray(scaler.mean_, dtype=np.float64),
+        'scales': np.asarray(scaler.scale_, dtype=np.float64),
+        'categorical_columns': [column for column, kept in zip(columns['cat'], categorical_kept)
+                                if kept],
+        'fills': fills[categorical_kept],
+        'categories': categories,
+        'children_left': np.concatenate(children_left).astype(np.int32),
+        'children_right': np.concatenate(children_right).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'value': np.concatenate(value).astype(np.float32),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'classes': np.asarray(label_encoder.classes_[forest.classes_.astype(int)], dtype=object),
+    }
+
+
+def save_compact_model(pipeline: Any, label_encoder: Any, path: str) -> None:
+    """
+    Export a fitted model pipeline and write it uncompressed, so that it can be memory-mapped.
+    The artifact replaces the previous one atomically, processes mapping the previous
+    one keep reading it.
+
+    :param pipeline: Fitted pipeline of a ColumnTransformer and a random forest.
+    :param label_encoder: Fitted encoder of the target.
+    :param path: Path of the artifact.
+    """
+    temporary_path = f"{path}.tmp"
+    joblib.dump(export_compact_model(pipeline, label_encoder), temporary_path)
+    os.replace(temporary_path, path)
+
+
+class CompactModel:
+    """
+    Predictor of the compact artifact, giving the same predictions as the
+    pipeline it was exported from. The trees of the forest are walked all at
+    once, one level at a time.
+    """
+
+    def __init__(self, artifact: Dict[str, Any]):
+        """
+        :param artifact: Artifact of the model, as exported by export_compact_model.
+        :raise ValueError: If the artifact has another format version.
+        """
+        if artifact.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact model format: {artifact.get('format_version')}")
+        # Plain views of the memory-mapped arrays, indexing a memmap is slower
+        self.__dict__.update({key: value.view(np.ndarray) if isinstance(value, np.memmap) else value
+                              for key, value in artifact.items()})
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r') -> 'CompactModel':
+        """
+        :param path: Path of the artifact.
+        :param mmap_mode: Memory-map the arrays of the artifact instead of reading them.
+        :return: Predictor of the artifact.
+        """
+        return cls(joblib.load(path, mmap_mode=mmap_mode))
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        :param df: Feature vectors.
+        :return: Inputs of the trees, as computed by the preprocessor of the pipeline.
+        """
+        numerical = df[self.numerical_columns].to_numpy(dtype=np.float64)
+        numerical = np.where(np.isnan(numerical), self.medians, numerical)
+        parts = [(numerical - self.means) / self.scales]
+
+        for column, fill, categories in zip(self.categorical_columns, self.fills, self.categories):
+            values = df[column].to_numpy(dtype=object)
+            values = np.where(pd.isna(values), fill, values)
+            # Unknown categories, like the dropped first one, are all zeros
+            parts.append(values[:, None] == categories[None, :])
+        return np.hstack(parts).astype(np.float32)
+
+    def predict_proba(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        :param df: Feature vectors.
+        :return: Probabilities of the classes, in the order of the classes attribute.
+        """
+        X = self.transform(df)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        while True:
+            left = self.children_left[nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.children_right[nodes]), nodes)
+        return self.value[nodes].mean(axis=1)
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        :param df: Feature vectors.
+        :return: Predicted labels.
+        """
+        return self.classes[np.argmax(self.predict_proba(df), axis=1)]
+
+
+if __name__ == '__main__':
+    # Export the model files of a directory, by default the model directory of the project
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model')
+    save_compact_model(joblib.load(os.path.join(model_dir, 'weather_prediction_model.joblib')),
+                       joblib.load(os.path.join(model_dir, 'weather_label_encoder.joblib')),
+                       os.path.join(model_dir, 'weather_compact_model.joblib'))
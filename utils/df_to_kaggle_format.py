@@ -2,33 +2,41 @@ import pandas as pd
 
 from database.postgresql_functools import City
 
+DAILY_WEATHER_COLUMNS = ['min_temp', 'max_temp', 'rainfall', 'evaporation', 'sunshine',
+                         'wind_gust_dir', 'wind_gust_speed']
+WEATHER_COLUMNS = ['wind_dir', 'wind_speed', 'humidity', 'pressure', 'cloud', 'temp']
+
 
 def transform_to_kaggle_format(df, postgres):
-    df['date'] = pd.to_datetime(df['date'])
-    df['city_id'] = df['location'].apply(
-        lambda name: postgres.fetch_record(City, {'name': name}).id)
-
-    daily_weather = df[['date', 'city_id', 'min_temp', 'max_temp', 'rainfall',
-                        'evaporation', 'sunshine', 'wind_gust_dir', 'wind_gust_speed']]
-
-    weather_9am = df.assign(date=lambda x: x['date'].apply(
-        lambda date: f"{date.strftime('%Y-%m-%d')} 09:00:00")) \
-        .rename(columns={'wind_dir_9am': 'wind_dir',
-                         'wind_speed_9am': 'wind_speed',
-                         'humidity_9am': 'humidity',
-                         'pressure_9am': 'pressure',
-                         'cloud_9am': 'cloud',
-                         'temp_9am': 'temp'}) \
-        [['date', 'city_id', 'wind_dir', 'wind_speed', 'humidity', 'pressure', 'cloud', 'temp']]
-
-    weather_3pm = df.assign(date=lambda x: x['date'].apply(
-        lambda date: f"{date.strftime('%Y-%m-%d')} 15:00:00")) \
-        .rename(columns={'wind_dir_3pm': 'wind_dir',
-                         'wind_speed_3pm': 'wind_speed',
-                         'humidity_3pm': 'humidity',
-                         'pressure_3pm': 'pressure',
-                         'cloud_3pm': 'cloud',
-                         'temp_3pm': 'temp'}) \
-        [['date', 'city_id', 'wind_dir', 'wind_speed', 'humidity', 'pressure', 'cloud', 'temp']]
+    """
+    Splits weather data in the Kaggle format into the daily_weather rows and the
+    9am and 3pm weather rows of the data warehouse.
+
+    :param df: Weather data in the Kaggle format.
+    :param postgres: PostgresManager used to resolve the city IDs.
+    :return: Tuple of the daily weather, 9am weather and 3pm weather DataFrames.
+    :raise ValueError: If a location is not a known city.
+    """
+    dates = pd.to_datetime(df['date'])
+
+    # Resolve every city ID from a single read of the city table
+    city_ids = df['location'].map({city.name: city.id for city in postgres.fetch_table(City)})
+    if city_ids.isna().any():
+        unknown_locations = df.loc[city_ids.isna(), 'location'].unique().tolist()
+        raise ValueError(f"Unknown locations: {unknown_locations}")
+    city_ids = city_ids.astype('int64')
+
+    daily_weather = df[DAILY_WEATHER_COLUMNS].assign(date=dates, city_id=city_ids) \
+        [['date', 'city_id'] + DAILY_WEATHER_COLUMNS]
+
+    weather_9am = df[[f"{column}_9am" for column in WEATHER_COLUMNS]] \
+        .set_axis(WEATHER_COLUMNS, axis=1) \
+        .assign(date=dates + pd.Timedelta(hours=9), city_id=city_ids) \
+        [['date', 'city_id'] + WEATHER_COLUMNS]
+
+    weather_3pm = df[[f"{column}_3pm" for column in WEATHER_COLUMNS]] \
+        .set_axis(WEATHER_COLUMNS, axis=1) \
+        .assign(date=dates + pd.Timedelta(hours=15), city_id=city_ids) \
+        [['date', 'city_id'] + WEATHER_COLUMNS]
 
     return daily_weather, weather_9am, weather_3pm
@@ -0,0 +1,82 @@
+"""
+This module contains the features of the rain prediction model, shared by the
+feature store, the model training and the API
+"""
+from datetime import date
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String
+
+from database.postgresql_functools import WeatherFeatures
+
+# Rainfall in millimeters from which a day counts as rainy
+RAIN_THRESHOLD = 1
+
+TARGET_COLUMN = 'rain_tomorrow'
+RAIN_CATEGORIES = ['no', 'yes']
+
+# Inputs of the model, in the order of the weather_features table
+FEATURE_COLUMNS = [column.name for column in WeatherFeatures.__table__.columns
+                   if column.name not in ('id', 'date', TARGET_COLUMN, 'updated_at')]
+CATEGORICAL_COLUMNS = [column for column in FEATURE_COLUMNS
+                       if isinstance(WeatherFeatures.__table__.columns[column].type, String)]
+NUMERICAL_COLUMNS = [column for column in FEATURE_COLUMNS if column not in CATEGORICAL_COLUMNS]
+
+
+def build_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the rain_today feature and the rain_tomorrow target of weather data.
+    The target of a day is the rain_today of the next day of the same city, and is
+    missing when that day is not in the data.
+
+    :param df: Weather data of the australian_meteorology_weather view.
+    :return: Weather data sorted by location and date, with the categorical
+        rain_today feature and rain_tomorrow target.
+    """
+    df = df.reset_index(drop=True)
+    days = pd.to_datetime(df['date'])
+    order = df[['location']].assign(day=days).sort_values(['location', 'day'], kind='stable').index
+    # Data read with ORDER BY location, date is already in order
+    if not (np.diff(order) > 0).all():
+        df = df.take(order).reset_index(drop=True)
+        days = days.take(order).reset_index(drop=True)
+
+    df['rain_today'] = pd.Categorical.from_codes(
+        np.where(df['rainfall'] >= RAIN_THRESHOLD, 1, 0), categories=RAIN_CATEGORIES)
+
+    by_location = df.groupby('location', sort=False, observed=True)
+    next_day = days.groupby(df['location'], sort=False, observed=True).shift(-1)
+    df['rain_tomorrow'] = by_location['rain_today'].shift(-1) \
+        .where(next_day - days == pd.Timedelta(days=1))
+    return df
+
+
+def feature_key(city: str, day: Union[date, str]) -> str:
+    """
+    :param city: Name of the city.
+    :param day: Day of the weather data.
+    :return: Redis key of the feature vector of the city on that day.
+    """
+    return f"features:{city}:{day}"
+
+
+def features_from_record(record: WeatherFeatures) -> Dict[str, Any]:
+    """
+    :param record: Record of the weather_features table.
+    :return: Feature vector of the record.
+    """
+    return {column: getattr(record, column) for column in FEATURE_COLUMNS}
+
+
+def features_frame(features: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Build the input of the model from feature vectors.
+
+    :param features: Feature vectors, read from Redis or from the weather_features table.
+    :return: DataFrame of the feature columns, with missing values as NaN.
+    """
+    return pd.DataFrame({column: np.array([vector.get(column) for vector in features],
+                                          dtype=np.float64 if column in NUMERICAL_COLUMNS else object)
+                         for column in FEATURE_COLUMNS})
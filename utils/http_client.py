@@ -0,0 +1,135 @@
+"""
+This module contains a pooled HTTP client with retries and rate limiting
+"""
+import email.utils
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from utils.rate_limiter import TokenBucket
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    """
+    HTTP client sharing a keep-alive connection pool between threads.
+
+    Requests answered with 429 or 5xx, and connection errors, are retried with a
+    jittered exponential backoff, waiting at least as long as the Retry-After header
+    of the response. Each host is limited to `calls_per_minute` requests, sent in
+    bursts of up to as many requests.
+    """
+
+    def __init__(self, calls_per_minute: Optional[float] = None, pool_maxsize: int = 10,
+                 max_retries: int = 5, backoff_factor: float = 0.5, max_backoff: float = 60.0):
+        """
+        :param calls_per_minute: Maximum number of requests per minute sent to each host,
+            unlimited if None.
+        :param pool_maxsize: Maximum number of connections kept alive for each host.
+        :param max_retries: Maximum number of retries of a request.
+        :param backoff_factor: Base delay of the exponential backoff in seconds.
+        :param max_backoff: Maximum delay between two attempts in seconds, a response
+            asking for a longer wait is returned instead of retried.
+        """
+        self.calls_per_minute = calls_per_minute
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.rate_limiters: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connections of the pool.
+        """
+        self.session.close()
+
+    def get(self, url: str, timeout: float = 10, **kwargs) -> requests.Response:
+        """
+        Sends a GET request, retrying it on 429, 5xx and connection errors.
+
+        :param url: The URL to request.
+        :param timeout: Timeout of each attempt in seconds.
+        :param kwargs: Additional arguments of requests.Session.get.
+        :return: The response of the last attempt.
+        :raise requests.RequestException: If the last attempt fails to connect.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(url)
+            try:
+                response = self.session.get(url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            delay = self.backoff_delay(attempt, response)
+            if delay > self.max_backoff:
+                # Waiting that long would block the calling worker, leave it to the caller
+                return response
+            time.sleep(delay)
+
+    def backoff_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """
+        Computes the delay before retrying a request, with full jitter.
+
+        :param attempt: Number of the failed attempt, starting at 0.
+        :param response: Response of the failed attempt, if any.
+        :return: Delay in seconds.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) \
+            if response is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _acquire(self, url: str) -> None:
+        if self.calls_per_minute is None:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self.rate_limiters:
+                # The quota is per minute, its calls can be sent at once
+                self.rate_limiters[host] = TokenBucket(self.calls_per_minute / 60,
+                                                       capacity=self.calls_per_minute)
+            rate_limiter = self.rate_limiters[host]
+        rate_limiter.acquire()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    :param value: Value of the header.
+    :return: Delay in seconds, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -1,28 +1,106 @@
 """
 This module contains utility functions for fetching and processing data
 """
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
-import requests
+from utils.http_client import HttpClient
+from utils.response_cache import ResponseCache
 
+_openweather_client: Optional[HttpClient] = None
+_openweather_client_lock = threading.Lock()
+_response_cache: Optional[ResponseCache] = None
 
-def request_api(url: str) -> Dict:
+
+def get_openweather_client() -> HttpClient:
+    """
+    Returns the HTTP client shared by every OpenWeather request, creating it on first use
+    with the rate limit of our plan (OPENWEATHER_CALLS_PER_MINUTE).
+
+    :return: The shared HTTP client.
+    """
+    global _openweather_client
+    with _openweather_client_lock:
+        if _openweather_client is None:
+            _openweather_client = HttpClient(
+                calls_per_minute=float(os.getenv('OPENWEATHER_CALLS_PER_MINUTE', '60')),
+                pool_maxsize=int(os.getenv('OPENWEATHER_MAX_WORKERS', '10')))
+        return _openweather_client
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the cache of OpenWeather responses, opening it on first use at
+    OPENWEATHER_CACHE_PATH.
+
+    :return: The shared response cache.
+    """
+    global _response_cache
+    with _openweather_client_lock:
+        if _response_cache is None:
+            root_path = os.getenv('ROOT_PATH', Path(__file__).resolve().parents[1])
+            _response_cache = ResponseCache(
+                os.getenv('OPENWEATHER_CACHE_PATH',
+                          os.path.join(root_path, 'data', 'cache', 'openweather.sqlite')),
+                max_entries=int(os.getenv('OPENWEATHER_CACHE_MAX_ENTRIES', '100000')))
+        return _response_cache
+
+
+def request_api(url: str, timeout: float = 10, use_cache: bool = True,
+                client: Optional[HttpClient] = None) -> Dict:
     """
     Requests data from the specified URL and returns the response as a dictionary.
-    Raises an exception for non-200 responses.
+    Responses are served from the response cache while they are fresh. Connections
+    are reused between requests, which are rate limited and retried on 429 and 5xx
+    responses. Raises an exception for non-200 responses.
 
     :param url: The URL from which to fetch the data.
+    :param timeout: Timeout of the request in seconds.
+    :param use_cache: Read and write the response cache.
+    :param client: HTTP client sending the request, the shared OpenWeather client by default.
     :return: The data retrieved from the API, parsed into a dictionary.
     :raises ConnectionError: If the API response status code is not 200.
     """
-    response = requests.get(url, timeout=10)
+    if use_cache:
+        data = get_response_cache().get(url)
+        if data is not None:
+            return data
+    response = (client or get_openweather_client()).get(url, timeout=timeout)
     if response.status_code == 200:
         data = response.json()
+        if use_cache:
+            get_response_cache().set(url, data)
         return data
     raise ConnectionError(f"Web server response: {response.status_code}")
 
 
+def request_api_concurrently(urls: List[str], max_workers: int = 10, timeout: float = 10,
+                             use_cache: bool = True,
+                             client: Optional[HttpClient] = None) -> List[Dict]:
+    """
+    Requests data from several URLs concurrently using a pool of threads.
+    Results are returned in the same order as the given URLs.
+
+    :param urls: The URLs from which to fetch the data.
+    :param max_workers: Maximum number of requests in flight at the same time.
+    :param timeout: Timeout of each request in seconds.
+    :param use_cache: Read and write the response cache.
+    :param client: HTTP client sending the requests, the shared OpenWeather client by default.
+    :return: The data retrieved from each URL, parsed into dictionaries.
+    :raises ConnectionError: If any API response status code is not 200.
+    """
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(
+            lambda url: request_api(url, timeout=timeout, use_cache=use_cache, client=client),
+            urls))
+
+
 def extract_lat_lon(data: List[Dict]) -> Tuple[List[float], List[float]]:
     """
     Extracts latitudes and longitudes for locations within
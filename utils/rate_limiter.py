@@ -0,0 +1,39 @@
+"""
+This module contains a thread-safe token bucket rate limiter
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` calls per second on average,
+    with bursts of up to `capacity` calls.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        :param rate: Number of tokens added to the bucket per second.
+        :param capacity: Maximum number of tokens held by the bucket.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes a token from the bucket, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,186 @@
+"""
+This module contains a persistent SQLite cache of OpenWeather API responses
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+# Time to live in seconds of the responses of each endpoint, None for immutable responses.
+# Responses of the other endpoints are not cached.
+ENDPOINT_TTLS: Dict[str, Optional[float]] = {
+    'geo/1.0/direct': 30 * 24 * 3600,
+    'data/2.5/weather': 5 * 60,
+    'data/2.5/air_pollution': 5 * 60,
+    'data/2.5/air_pollution/history': None,
+    'data/3.0/onecall/timemachine': None,
+    'data/3.0/onecall/day_summary': None,
+}
+
+# Historical data of the last days can still be revised, so it is only kept for this time
+RECENT_HISTORY_TTL = 3600
+RECENT_HISTORY_SECONDS = 2 * 24 * 3600
+
+# Number of writes between two checks of the number of cached responses
+EVICTION_INTERVAL = 100
+
+# Parameters left out of the cache key, as they do not change the response
+IGNORED_PARAMS = {'appid'}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a URL into its endpoint and sorted parameters, without the API key.
+
+    :param url: The URL to normalize.
+    :return: The normalized URL.
+    """
+    parsed = urlparse(url)
+    params = sorted((key, value) for key, value in parse_qsl(parsed.query)
+                    if key not in IGNORED_PARAMS)
+    return f"{parsed.netloc}{parsed.path}?{urlencode(params)}"
+
+
+def history_end(params: Dict[str, str]) -> Optional[float]:
+    """
+    :param params: Parameters of a request to a historical endpoint.
+    :return: UNIX timestamp of the end of the requested period, if known.
+    """
+    try:
+        if 'end' in params:
+            return float(params['end'])
+        if 'dt' in params:
+            return float(params['dt'])
+        if 'date' in params:
+            return datetime.strptime(params['date'], '%Y-%m-%d').timestamp() + 24 * 3600
+    except ValueError:
+        return None
+    return None
+
+
+def endpoint_ttl(url: str) -> Optional[float]:
+    """
+    Computes the time to live of the response of a URL.
+
+    :param url: The requested URL.
+    :return: Time to live in seconds, None if the response never changes,
+        0 if it must not be cached.
+    """
+    parsed = urlparse(url)
+    endpoint = parsed.path.lstrip('/')
+    if endpoint not in ENDPOINT_TTLS:
+        return 0
+    ttl = ENDPOINT_TTLS[endpoint]
+    if ttl is None:
+        end = history_end(dict(parse_qsl(parsed.query)))
+        if end is None or end > time.time() - RECENT_HISTORY_SECONDS:
+            return RECENT_HISTORY_TTL
+    return ttl
+
+
+class ResponseCache:
+    """
+    Cache of JSON responses keyed on the hash of their normalized URL, stored in SQLite
+    so that it is shared between processes and survives restarts. The least recently
+    used entries are evicted beyond `max_entries`, checked every EVICTION_INTERVAL writes.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        """
+        :param path: Path of the SQLite database, created if missing.
+        :param max_entries: Maximum number of cached responses.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, url TEXT NOT NULL, body TEXT NOT NULL, '
+            'expires_at REAL, accessed_at REAL NOT NULL)')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS ix_responses_accessed_at ON responses (accessed_at)')
+
+    @staticmethod
+    def key(url: str) -> str:
+        """
+        :param url: The requested URL.
+        :return: The cache key of the URL.
+        """
+        return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """
+        Returns the cached response of a URL, if it has not expired.
+
+        :param url: The requested URL.
+        :return: The cached response, or None on a miss.
+        """
+        key, now = self.key(url), time.time()
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT body, expires_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                self.misses += 1
+                return None
+            self.connection.execute(
+                'UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, url: str, data: Dict) -> None:
+        """
+        Caches the response of a URL for the time to live of its endpoint.
+
+        :param url: The requested URL.
+        :param data: The response to cache.
+        """
+        ttl = endpoint_ttl(url)
+        if ttl == 0:
+            return
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+        with self._lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (key, url, body, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.key(url), normalize_url(url), json.dumps(data), expires_at, now))
+            self._writes += 1
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        count = self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute(
+                'DELETE FROM responses WHERE key IN ('
+                'SELECT key FROM responses ORDER BY accessed_at LIMIT ?)',
+                (count - self.max_entries,))
+
+    def clear(self) -> None:
+        """
+        Removes every cached response.
+        """
+        with self._lock:
+            self.connection.execute('DELETE FROM responses')
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Number of hits, misses and cached responses.
+        """
+        with self._lock:
+            entries = self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}